@@ -0,0 +1,80 @@
+"""
+Async API Views
+
+These views run natively on the ASGI entry point (config/asgi.py). Database reads go
+through Django's async ORM, so a slow export or a long stream waits on the event loop
+instead of holding a worker, and many slow clients can share one process.
+"""
+
+from django.http import Http404, JsonResponse, StreamingHttpResponse
+from django.utils.http import content_disposition_header
+from django.views.decorators.http import require_GET
+from rest_framework.exceptions import ValidationError
+from rest_framework.utils.encoders import JSONEncoder
+
+from resources.models import Person
+from data_storage.models import Trial, Plot
+from data_storage.exports import EXPORT_FORMATS, aiter_observation_frames, aiter_encoded
+from api.serializers import PersonSerializer, PlotSerializer
+from api.responses import build_envelope
+from api.pagination import KsuidCursorPagination
+from api.streaming import astream_queryset
+from api.filters import filter_plots
+
+async def list_queryset(request, queryset, serializer_class):
+    """ Return a page of a queryset, or stream all of it as NDJSON """
+    try:
+        fields, expand = serializer_class.get_field_params(request.GET)
+        queryset = serializer_class.optimize_queryset(queryset, fields, expand)
+
+        if request.GET.get('stream', '').lower() in ('1', 'true', 'yes'):
+            return astream_queryset(queryset.order_by('pk'), serializer_class, fields=fields, expand=expand)
+
+        paginator = KsuidCursorPagination(request.GET)
+        page = await paginator.apaginate_queryset(queryset)
+    except ValidationError as exc:
+        return JsonResponse(exc.detail, status=400, encoder=JSONEncoder)
+
+    serializer = serializer_class(page, many=True, fields=fields, expand=expand)
+
+    return JsonResponse(build_envelope(serializer.data, paginator.get_pagination()), encoder=JSONEncoder)
+
+@require_GET
+async def person_list(request, format=None):
+    """ GET a page of people, or stream all of them as NDJSON """
+    return await list_queryset(request, Person.objects.all(), PersonSerializer)
+
+@require_GET
+async def plot_list(request, format=None):
+    """ GET a page of plots, or stream all of them as NDJSON """
+    try:
+        plots = filter_plots(Plot.objects.all(), request.GET)
+    except ValidationError as exc:
+        return JsonResponse(exc.detail, status=400, encoder=JSONEncoder)
+
+    return await list_queryset(request, plots, PlotSerializer)
+
+@require_GET
+async def observation_export(request, db_id, format=None):
+    """ GET the observations of a trial, optionally for one year, as a columnar file """
+    try:
+        trial = await Trial.objects.aget(db_id=db_id)
+    except Trial.DoesNotExist:
+        raise Http404('No Trial matches the given query.')
+
+    file_format = request.GET.get('fileFormat', 'parquet')
+    if file_format not in EXPORT_FORMATS:
+        return JsonResponse({'fileFormat': f"Expected one of {', '.join(EXPORT_FORMATS)}."}, status=400)
+
+    year = request.GET.get('year')
+    if year is not None and not year.isdigit():
+        return JsonResponse({'year': 'year must be an integer.'}, status=400)
+
+    frames = aiter_observation_frames(trial, year=year and int(year))
+
+    export = EXPORT_FORMATS[file_format]
+    response = StreamingHttpResponse(aiter_encoded(frames, file_format), content_type=export['content_type'])
+    response['Content-Disposition'] = content_disposition_header(True, f"{trial.name}.{export['extension']}")
+    response['X-Accel-Buffering'] = 'no'
+
+    return response
@@ -0,0 +1,33 @@
+"""
+API Conditional GET Helpers
+"""
+
+import hashlib
+
+from django.utils.decorators import method_decorator
+from django.views.decorators.http import condition
+
+from data_storage.models import get_table_versions
+
+def table_versions_condition(*models):
+    """
+    Decorate an APIView method with ETag / Last-Modified headers built from the
+    change counters of the given models. Matching If-None-Match or If-Modified-Since
+    requests are answered with a 304 after a single query on the version table.
+    """
+    def versions(request):
+        # Cached on the request so the etag and last-modified functions share one query
+        if not hasattr(request, '_table_versions'):
+            request._table_versions = get_table_versions(*models)
+        return request._table_versions
+
+    def etag(request, *args, **kwargs):
+        state = sorted((table, version) for table, (version, _) in versions(request).items())
+        key = f"{request.get_full_path()}|{request.META.get('HTTP_ACCEPT', '')}|{state}"
+        return hashlib.md5(key.encode()).hexdigest()
+
+    def last_modified(request, *args, **kwargs):
+        modified = [modified for _, modified in versions(request).values()]
+        return max(modified) if modified else None
+
+    return method_decorator(condition(etag_func=etag, last_modified_func=last_modified))
@@ -0,0 +1,49 @@
+"""
+API Query Filters
+"""
+
+from rest_framework.exceptions import ValidationError
+
+from config.enumerations import PlotType
+from data_storage.models import PlotCrop
+
+def split_param(params, name):
+    """ Return the comma separated values of a query parameter """
+    return [value for value in params.get(name, '').split(',') if value]
+
+def filter_plots(queryset, params):
+    """
+    Filter a Plot queryset on the trial_id, block, type, year, germplasm_id and
+    treatment_level_id query parameters. Each parameter takes a comma separated list of values.
+    """
+    trial_ids = split_param(params, 'trial_id')
+    blocks = split_param(params, 'block')
+    types = split_param(params, 'type')
+    years = split_param(params, 'year')
+    germplasm_ids = split_param(params, 'germplasm_id')
+    treatment_level_ids = split_param(params, 'treatment_level_id')
+
+    if trial_ids:
+        queryset = queryset.filter(trial_id__in=trial_ids)
+    if blocks:
+        queryset = queryset.filter(block__in=blocks)
+    if types:
+        unknown = [t for t in types if t not in PlotType.values]
+        if unknown:
+            raise ValidationError({'type': f"Unknown plot type(s): {', '.join(unknown)}."})
+        queryset = queryset.filter(type__in=types)
+
+    # Year, germplasm and treatment level all have to match the same plot crop record
+    plot_crops = PlotCrop.objects.all()
+    if years:
+        if not all(year.isdigit() for year in years):
+            raise ValidationError({'year': 'year must be an integer.'})
+        plot_crops = plot_crops.filter(plot_year__in=years)
+    if germplasm_ids:
+        plot_crops = plot_crops.filter(germplasm_id__in=germplasm_ids)
+    if treatment_level_ids:
+        plot_crops = plot_crops.filter(plottreatment__treatment_level_id__in=treatment_level_ids)
+    if years or germplasm_ids or treatment_level_ids:
+        queryset = queryset.filter(pk__in=plot_crops.values('plot_id'))
+
+    return queryset
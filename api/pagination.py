@@ -0,0 +1,95 @@
+"""
+API Pagination Classes
+"""
+
+import math
+
+from rest_framework.exceptions import ValidationError
+
+class KsuidCursorPagination:
+    """
+    Keyset pagination on the KSUID primary key of a model.
+    Pages resume from `db_id > pageToken` on the primary key index, so no
+    OFFSET is ever issued and deep pages cost the same as the first one.
+
+    Query parameters:
+        pageToken: the nextPageToken from the previous response
+        pageSize: number of records per page (1 - max_page_size)
+        includeCount: 'true' to run an exact COUNT(*) for totalCount/totalPages
+    """
+    page_token_query_param = 'pageToken'
+    page_size_query_param = 'pageSize'
+    count_query_param = 'includeCount'
+    default_page_size = 1000
+    max_page_size = 10000
+
+    def __init__(self, params):
+        self.params = params
+        self.page_token = params.get(self.page_token_query_param) or None
+        self.page_size = self.get_page_size()
+        self.include_count = params.get(self.count_query_param, '').lower() in ('1', 'true', 'yes')
+        self.next_page_token = None
+        self.total_count = None
+
+    def get_page_size(self):
+        """ Parse and bound the requested page size """
+        page_size = self.params.get(self.page_size_query_param)
+        if page_size is None:
+            return self.default_page_size
+        try:
+            page_size = int(page_size)
+        except ValueError:
+            raise ValidationError({self.page_size_query_param: 'pageSize must be an integer.'})
+        if not 1 <= page_size <= self.max_page_size:
+            raise ValidationError(
+                {self.page_size_query_param: f"pageSize must be between 1 and {self.max_page_size}."}
+            )
+        return page_size
+
+    def get_page_queryset(self, queryset):
+        """ Apply the page token and size, fetching one extra row to find out if there is a next page """
+        prefix = getattr(queryset.model._meta.pk, 'prefix', '')
+
+        if self.page_token is not None:
+            if prefix and not self.page_token.startswith(prefix):
+                raise ValidationError({self.page_token_query_param: 'Invalid page token.'})
+            queryset = queryset.filter(pk__gt=self.page_token)
+
+        return queryset.order_by('pk')[:self.page_size + 1]
+
+    def set_page(self, page):
+        """ Drop the extra row and remember where the next page starts """
+        if len(page) > self.page_size:
+            page = page[:self.page_size]
+            self.next_page_token = page[-1].pk
+
+        return page
+
+    def paginate_queryset(self, queryset):
+        """ Return the list of objects on the requested page """
+        if self.include_count:
+            # Counted before the keyset filter so it covers the whole result
+            self.total_count = queryset.count()
+
+        return self.set_page(list(self.get_page_queryset(queryset)))
+
+    async def apaginate_queryset(self, queryset):
+        """ Async version of paginate_queryset """
+        if self.include_count:
+            self.total_count = await queryset.acount()
+
+        return self.set_page([obj async for obj in self.get_page_queryset(queryset)])
+
+    def get_pagination(self):
+        """ Build the pagination block of the ApiResponse metadata """
+        total_pages = None
+        if self.total_count is not None:
+            total_pages = max(math.ceil(self.total_count / self.page_size), 1)
+
+        return {
+            "currentPageToken": self.page_token,
+            "nextPageToken": self.next_page_token,
+            "pageSize": self.page_size,
+            "totalCount": self.total_count,
+            "totalPages": total_pages
+        }
@@ -4,7 +4,37 @@ API Custom Response Classes
 
 from rest_framework.response import Response
 
-def ApiResponse(Response):
+def build_envelope(data, pagination=None):
+    """
+    Wrap result data in the standard metadata envelope
+    """
+    if pagination is None:
+        # Unpaginated results come back as a single page
+        count = len(data) if isinstance(data, list) else 1
+        pagination = {
+            "currentPage": 0,
+            "pageSize": count,
+            "totalCount": count,
+            "totalPages": 1
+        }
+
+    return {
+        "metadata": {
+            "datafiles": [],
+            "pagination": pagination,
+            "status": [
+                {
+                    "message": "Request accepted, response successful",
+                    "messageType": "INFO"
+                }
+            ],
+        },
+        "result": {
+            "data": data
+        }
+    }
+
+class ApiResponse(Response):
     """
     Define a standard response object across the project
     """
@@ -12,31 +42,13 @@ def ApiResponse(Response):
             self,
             status=None,
             data=None,
+            pagination=None,
             template_name=None,
-            headers=None, 
-            exception=False, 
+            headers=None,
+            exception=False,
             content_type=None
     ):
-        
-        response = {
-            "metadata": {
-                "datafiles": [],
-                "pagination": {
-                    "current_page": 0,
-                    "pageSize": 1000,
-                    "totalCount": 10,
-                    "totalPages": 1
-                },
-                "status": [
-                    {
-                        "message": "Request accepted, response successful",
-                        "messageType": "INFO"
-                    }
-                ],
-            },            
-            "result": {
-                "data": data
-            }
-        }
-    
-        super().__init__(response, status=status, template_name=template_name, headers=headers, exception=exception, content_type=content_type)
\ No newline at end of file
+
+        response = build_envelope(data, pagination)
+
+        super().__init__(response, status=status, template_name=template_name, headers=headers, exception=exception, content_type=content_type)
@@ -2,16 +2,200 @@
 API Serializers
 """
 
+from functools import partial
+
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Prefetch
 from rest_framework import serializers
-from resources.models import Person
-from data_storage.models import Plot
+from rest_framework.exceptions import ValidationError
+from resources.models import Person, Organization, Location
+from data_storage.models import Trial, Plot, TrialSummary, bump_table_version
+
+class DynamicFieldsModelSerializer(serializers.ModelSerializer):
+    """
+    ModelSerializer that takes `fields` and `expand` arguments to render a subset of
+    its fields and to inline related objects in place of their ids
+    """
+    expandable_fields = {}
+
+    def __init__(self, *args, fields=None, expand=None, **kwargs):
+        super().__init__(*args, **kwargs)
+
+        for name in expand or []:
+            self.fields[name] = self.expandable_fields[name](read_only=True)
+
+        if fields:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
+    @classmethod
+    def get_field_params(cls, params):
+        """ Parse and validate the ?fields= and ?expand= query parameters """
+        fields = [f for f in params.get('fields', '').split(',') if f]
+        expand = [f for f in params.get('expand', '').split(',') if f]
+
+        known = set(cls().fields)
+        unknown = [f for f in fields if f not in known]
+        if unknown:
+            raise ValidationError({'fields': f"Unknown field(s): {', '.join(unknown)}."})
+        unknown = [f for f in expand if f not in cls.expandable_fields]
+        if unknown:
+            raise ValidationError(
+                {'expand': f"Cannot expand {', '.join(unknown)}. Expandable fields: {', '.join(cls.expandable_fields)}."}
+            )
+
+        # Expanded relations are always rendered
+        if fields:
+            fields += [f for f in expand if f not in fields]
+
+        return fields, expand
+
+    @classmethod
+    def optimize_queryset(cls, queryset, fields=None, expand=None):
+        """
+        Only load the columns behind the requested fields and fetch the expanded
+        relations in the same query (forward relations) or one extra query (reverse relations)
+        """
+        model = queryset.model
+        expand = expand or []
+
+        for name in expand:
+            field = model._meta.get_field(name)
+            if field.many_to_one or field.one_to_one:
+                queryset = queryset.select_related(name)
+            else:
+                queryset = queryset.prefetch_related(name)
+
+        rendered = fields or list(cls().fields)
+        columns = [model._meta.pk.name]
+        for name in rendered:
+            try:
+                field = model._meta.get_field(name)
+            except FieldDoesNotExist:
+                continue
+            if field.concrete:
+                columns.append(name)
+            elif name not in expand:
+                # Reverse relations rendered as ids only need the related keys
+                related = field.related_model
+                queryset = queryset.prefetch_related(
+                    Prefetch(name, queryset=related.objects.only(related._meta.pk.name, field.field.name))
+                )
+
+        if fields:
+            queryset = queryset.only(*columns)
+
+        return queryset
+
+class OrganizationSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Organization
+        fields = '__all__'
+
+class LocationSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Location
+        fields = '__all__'
+
+class TrialSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Trial
+        fields = '__all__'
+
+class PlotChildSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Plot
+        fields = '__all__'
+
+class PersonSerializer(DynamicFieldsModelSerializer):
+
+    expandable_fields = {
+        'affiliation_id': OrganizationSerializer
+    }
 
-class PersonSerializer(serializers.ModelSerializer):
     class Meta:
         model = Person
         fields = '__all__'
 
-class PlotSerializer(serializers.ModelSerializer):
+class PersonBulkListSerializer(serializers.ListSerializer):
+    """
+    Validate a list of people row by row, keeping the valid rows instead of failing
+    the whole list, and upsert them on email in one statement
+    """
+
+    def to_internal_value(self, data):
+        self.rejected = []
+        valid = []
+        for i, item in enumerate(data):
+            try:
+                valid.append((i, self.child.run_validation(item)))
+            except ValidationError as exc:
+                self.rejected.append({'row': i, 'errors': exc.detail})
+
+        # Resolve every affiliation in one lookup
+        affiliation_ids = {row['affiliation_id'] for _, row in valid}
+        known = set(Organization.objects.filter(db_id__in=affiliation_ids).values_list('db_id', flat=True))
+
+        rows = {}
+        for i, row in valid:
+            if row['affiliation_id'] not in known:
+                self.rejected.append({'row': i, 'errors': {'affiliation_id': [f"Unknown organization '{row['affiliation_id']}'."]}})
+                continue
+            # The last row wins when an email appears more than once
+            rows[row['email']] = row
+        self.rejected.sort(key=lambda r: r['row'])
+
+        return list(rows.values())
+
+    def create(self, validated_data):
+        emails = [row['email'] for row in validated_data]
+        existing = set(Person.objects.filter(email__in=emails).values_list('email', flat=True))
+
+        people = [
+            Person(**{key: value for key, value in row.items() if key != 'affiliation_id'}, affiliation_id_id=row['affiliation_id'])
+            for row in validated_data
+        ]
+        people = Person.objects.bulk_create(
+            people,
+            batch_size=1000,
+            update_conflicts=True,
+            unique_fields=['email'],
+            update_fields=self.child.update_fields
+        )
+        # bulk_create skips the post_save signal
+        if people:
+            bump_table_version(Person)
+
+        self.created_count = len([row for row in validated_data if row['email'] not in existing])
+        self.updated_count = len(validated_data) - self.created_count
+
+        return people
+
+class PersonUpsertSerializer(serializers.ModelSerializer):
+    """
+    Person fields accepted by the bulk upsert, keyed on email
+    """
+    affiliation_id = serializers.CharField()
+
+    # Columns overwritten when the email already exists
+    update_fields = ['first_name', 'last_name', 'middle_initial', 'affiliation_id', 'orcid', 'phone_number']
+
+    class Meta:
+        model = Person
+        exclude = ['db_id']
+        extra_kwargs = {
+            'email': {'required': True, 'allow_null': False, 'validators': []}
+        }
+        list_serializer_class = PersonBulkListSerializer
+
+class PlotSerializer(DynamicFieldsModelSerializer):
+
+    expandable_fields = {
+        'trial_id': TrialSerializer,
+        'location_id': LocationSerializer,
+        'parent_plot_id': PlotChildSerializer,
+        'children': partial(PlotChildSerializer, many=True)
+    }
 
     children = serializers.PrimaryKeyRelatedField(many=True, queryset=Plot.objects.all())
 
@@ -30,4 +214,44 @@ class PlotSerializer(serializers.ModelSerializer):
         #     'type',
         #     'trial_id',
         #     'children'
-        # ]
\ No newline at end of file
+        # ]
+
+class PlotNodeSerializer(serializers.ModelSerializer):
+    """
+    Flat plot fields for building the plot hierarchy tree
+    """
+    class Meta:
+        model = Plot
+        fields = [
+            'db_id',
+            'label',
+            'type',
+            'block',
+            'row',
+            'column',
+            'width_m',
+            'length_m',
+            'parent_plot_id',
+            'location_id'
+        ]
+
+class TrialSummarySerializer(serializers.ModelSerializer):
+    """
+    Trial summary row with the mean and standard deviation derived from the running sums
+    """
+    mean = serializers.FloatField(read_only=True)
+    std = serializers.FloatField(read_only=True)
+
+    class Meta:
+        model = TrialSummary
+        fields = [
+            'year',
+            'variable_id',
+            'treatment_level_id',
+            'germplasm_id',
+            'n',
+            'mean',
+            'std',
+            'min_value',
+            'max_value'
+        ]
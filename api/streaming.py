@@ -0,0 +1,84 @@
+"""
+API Streaming Responses
+"""
+
+import json
+from itertools import islice
+
+from django.http import StreamingHttpResponse
+from rest_framework.renderers import BaseRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+NDJSON_MEDIA_TYPE = 'application/x-ndjson'
+
+class NDJSONRenderer(BaseRenderer):
+    """
+    Render a list of records as newline delimited JSON, one record per line
+    """
+    media_type = NDJSON_MEDIA_TYPE
+    format = 'ndjson'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        if not isinstance(data, list):
+            data = [data]
+        return ''.join(json.dumps(record, cls=JSONEncoder) + '\n' for record in data).encode(self.charset)
+
+def wants_stream(request):
+    """ Check if the client asked for a streamed response """
+    if request.query_params.get('stream', '').lower() in ('1', 'true', 'yes'):
+        return True
+    return getattr(request, 'accepted_renderer', None) is not None and request.accepted_renderer.format == 'ndjson'
+
+def iter_ndjson(queryset, serializer_class, chunk_size=2000, **serializer_kwargs):
+    """
+    Yield NDJSON lines for a queryset, serializing one database chunk at a time
+    """
+    rows = queryset.iterator(chunk_size=chunk_size)
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            break
+        data = serializer_class(chunk, many=True, **serializer_kwargs).data
+        yield ''.join(json.dumps(record, cls=JSONEncoder) + '\n' for record in data)
+
+def stream_queryset(queryset, serializer_class, chunk_size=2000, **serializer_kwargs):
+    """
+    Stream every record of a queryset as NDJSON without building the full result list
+    """
+    response = StreamingHttpResponse(
+        iter_ndjson(queryset, serializer_class, chunk_size=chunk_size, **serializer_kwargs),
+        content_type=NDJSON_MEDIA_TYPE
+    )
+    response['X-Accel-Buffering'] = 'no'
+
+    return response
+
+async def aiter_ndjson(queryset, serializer_class, chunk_size=2000, **serializer_kwargs):
+    """
+    Async version of iter_ndjson, reading the queryset with the async ORM
+    """
+    chunk = []
+    async for obj in queryset.aiterator(chunk_size=chunk_size):
+        chunk.append(obj)
+        if len(chunk) == chunk_size:
+            data = serializer_class(chunk, many=True, **serializer_kwargs).data
+            yield ''.join(json.dumps(record, cls=JSONEncoder) + '\n' for record in data)
+            chunk = []
+    if chunk:
+        data = serializer_class(chunk, many=True, **serializer_kwargs).data
+        yield ''.join(json.dumps(record, cls=JSONEncoder) + '\n' for record in data)
+
+def astream_queryset(queryset, serializer_class, chunk_size=2000, **serializer_kwargs):
+    """
+    Stream every record of a queryset as NDJSON from an async view
+    """
+    response = StreamingHttpResponse(
+        aiter_ndjson(queryset, serializer_class, chunk_size=chunk_size, **serializer_kwargs),
+        content_type=NDJSON_MEDIA_TYPE
+    )
+    response['X-Accel-Buffering'] = 'no'
+
+    return response
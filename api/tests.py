@@ -1,3 +1,96 @@
+from django.db import connection
 from django.test import TestCase
+from rest_framework.test import APIClient
+
+from resources.models import State, Address, Organization, Person, Project, Location
+from data_storage.models import Trial, Treatment, TreatmentLevel, CommonName, Germplasm
+from data_storage.models import Plot, PlotCrop, PlotTreatment
+from api.filters import filter_plots
 
 # Create your tests here.
+class PlotFilterTests(TestCase):
+    """
+    Server side filtering on the plot list and the indexes backing it
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        state = State.objects.create(name='Test State', abbreviation='TS')
+        address = Address.objects.create(
+            name='Test Address', address_line_1='1 Test Rd.', city='Test', state_id=state, postal_code='12345'
+        )
+        org = Organization.objects.create(
+            name='Test Org', abbreviation='TST', address_id=address, ror_id='https://ror.org/0test0000'
+        )
+        person = Person.objects.create(first_name='Test', last_name='Person', middle_initial='T', affiliation_id=org)
+        project = Project.objects.create(name='Test Project', description='Test', funding='Test')
+        location = Location.objects.create(name='test_location', latitude=0, longitude=0, type='trial')
+        cls.trial = Trial.objects.create(
+            name='test_trial', location_id=location, manager_id=person, project_id=project,
+            affiliation_id=org, establishment_year=2024
+        )
+
+        common_name = CommonName.objects.create(name='Test Crop')
+        cls.germplasm = [
+            Germplasm.objects.create(name=f'test_germ_{i}', type='crop', common_name_id=common_name, genus='Zea')
+            for i in range(2)
+        ]
+        treatment = Treatment.objects.create(name='Test Treatment', type='other', description='Test')
+        cls.levels = [TreatmentLevel.objects.create(treatment_id=treatment, level=f'level_{i}') for i in range(2)]
+
+        for block in range(1, 4):
+            for i in range(1, 5):
+                plot = Plot.objects.create(
+                    trial_id=cls.trial, label=f'b{block}_p{i}', type='main plot', block=str(block),
+                    width_m=1, length_m=1
+                )
+                Plot.objects.create(
+                    trial_id=cls.trial, label=f'b{block}_p{i}.1', type='split plot', block=str(block),
+                    width_m=1, length_m=1, parent_plot_id=plot
+                )
+                plot_crop = PlotCrop.objects.create(plot_id=plot, germplasm_id=cls.germplasm[i % 2], plot_year=2024)
+                PlotTreatment.objects.create(plot_crop_id=plot_crop, treatment_level_id=cls.levels[block % 2])
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def get_labels(self, **params):
+        response = self.client.get('/api/plots', params)
+        self.assertEqual(response.status_code, 200)
+        return sorted(plot['label'] for plot in response.json()['result']['data'])
+
+    def test_filter_trial_block_and_type(self):
+        labels = self.get_labels(trial_id=self.trial.db_id, block='2', type='split plot')
+        self.assertEqual(labels, ['b2_p1.1', 'b2_p2.1', 'b2_p3.1', 'b2_p4.1'])
+
+    def test_filter_plot_crop_year_germplasm_and_treatment_level(self):
+        labels = self.get_labels(
+            trial_id=self.trial.db_id, year='2024',
+            germplasm_id=self.germplasm[0].db_id, treatment_level_id=self.levels[0].db_id
+        )
+        self.assertEqual(labels, ['b2_p2', 'b2_p4'])
+        self.assertEqual(self.get_labels(trial_id=self.trial.db_id, year='2025'), [])
+
+    def test_invalid_filters(self):
+        self.assertEqual(self.client.get('/api/plots', {'type': 'subplot'}).status_code, 400)
+        self.assertEqual(self.client.get('/api/plots', {'year': 'last'}).status_code, 400)
+
+    def test_filters_use_indexes(self):
+        """ Query plan regression test, the filters must be answered from the composite indexes """
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE data_storage_plot, data_storage_plotcrop, data_storage_plottreatment')
+            cursor.execute('SET LOCAL enable_seqscan = off')
+
+        plan = filter_plots(Plot.objects.all(), {'trial_id': self.trial.db_id, 'block': '1'}).explain()
+        self.assertIn('plot_trial_block_idx', plan)
+
+        plan = filter_plots(Plot.objects.all(), {'trial_id': self.trial.db_id, 'type': 'main plot'}).explain()
+        self.assertIn('plot_trial_type_idx', plan)
+
+        plan = filter_plots(
+            Plot.objects.all(), {'year': '2024', 'germplasm_id': self.germplasm[0].db_id}
+        ).explain()
+        self.assertIn('plot_crop_year_germplasm_idx', plan)
+
+        plan = filter_plots(Plot.objects.all(), {'treatment_level_id': self.levels[0].db_id}).explain()
+        self.assertIn('plot_treatment_level_idx', plan)
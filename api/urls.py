@@ -3,7 +3,7 @@ API Router URLs
 """
 
 from django.urls import path
-from . import views
+from . import views, async_views
 from rest_framework.urlpatterns import format_suffix_patterns
 
 app_name = 'api'
@@ -12,7 +12,18 @@ urlpatterns = [
     # path('', views.ApiRoot.as_view(), name='api_root'),
     path('people', views.PersonList.as_view(), name='list_people'),
     path('people/<str:db_id>', views.PersonDetail.as_view(), name='list_person'),
-    path('plots', views.PlotList.as_view(), name='list_plots')
+    path('plots', views.PlotList.as_view(), name='list_plots'),
+    path('trials/<str:db_id>/plot-tree', views.PlotTree.as_view(), name='plot_tree'),
+    path('trials/<str:db_id>/observations/export', views.ObservationExport.as_view(), name='export_observations'),
+    path('trials/<str:db_id>/phenotypes', views.PhenotypeMatrix.as_view(), name='phenotype_matrix'),
+    path('trials/<str:db_id>/summaries', views.TrialSummaryList.as_view(), name='trial_summaries'),
+    path('trials/<str:db_id>/analysis', views.TrialAnalysis.as_view(), name='trial_analysis'),
+    path('germplasm/resolve', views.GermplasmResolve.as_view(), name='resolve_germplasm'),
+    path('observations/batch', views.ObservationBatch.as_view(), name='batch_observations'),
+    # Async variants for long running reads, served natively under ASGI
+    path('async/people', async_views.person_list, name='async_list_people'),
+    path('async/plots', async_views.plot_list, name='async_list_plots'),
+    path('async/trials/<str:db_id>/observations/export', async_views.observation_export, name='async_export_observations')
 ]
 
 # Formatting api url suffixes
@@ -2,20 +2,35 @@
 API Views
 """
 
-from django.shortcuts import render
-from django.http import HttpResponse, JsonResponse
+from django.shortcuts import render, get_object_or_404
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.utils.http import content_disposition_header
 from django.views.decorators.csrf import csrf_exempt
 from rest_framework.views import APIView
 from rest_framework import status
 from rest_framework.decorators import api_view
 from rest_framework.response import Response
 from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer, BrowsableAPIRenderer
 # from drf_spectacular.utils import extend_schema
 
-from resources.models import Person
-from data_storage.models import Plot
-from api.serializers import PersonSerializer, PlotSerializer
+from resources.models import Person, Organization, Location
+from data_storage.models import Trial, Plot, PlotCrop, PlotTreatment, Observation, Germplasm, Treatment, TreatmentLevel
+from data_storage.models import TrialSummary
+from data_storage.hierarchy import build_plot_tree
+from data_storage.ingest import ingest_observations
+from data_storage.exports import EXPORT_FORMATS, iter_observation_frames, iter_encoded, write_frame
+from data_storage.summaries import trial_summaries
+from data_storage.matrix import MATRIX_AGGREGATIONS, MATRIX_MODELS, phenotype_matrix
+from data_storage.analysis import trial_analysis
+from data_storage.germplasm import resolve_germplasm
+from api.serializers import PersonSerializer, PersonUpsertSerializer, PlotSerializer, PlotNodeSerializer
+from api.serializers import TrialSummarySerializer
 from api.responses import ApiResponse
+from api.pagination import KsuidCursorPagination
+from api.streaming import NDJSONRenderer, wants_stream, stream_queryset
+from api.conditional import table_versions_condition
+from api.filters import filter_plots
 
 # Create your API views here.
 
@@ -68,21 +83,43 @@ class PersonList(APIView):
     """
     Get all objects in the Person table
     """
+    renderer_classes = [JSONRenderer, BrowsableAPIRenderer, NDJSONRenderer]
 
+    @table_versions_condition(Person, Organization)
     def get(self, request, format=None):
-        """ GET the list of all the people """
-        people = Person.objects.all()
-        serializer = PersonSerializer(people, many=True)
+        """ GET a page of people, or stream all of them as NDJSON """
+        fields, expand = PersonSerializer.get_field_params(request.query_params)
+        people = PersonSerializer.optimize_queryset(Person.objects.all(), fields, expand)
 
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        if wants_stream(request):
+            return stream_queryset(people.order_by('pk'), PersonSerializer, fields=fields, expand=expand)
+
+        paginator = KsuidCursorPagination(request.query_params)
+        people = paginator.paginate_queryset(people)
+        serializer = PersonSerializer(people, many=True, fields=fields, expand=expand)
+
+        return ApiResponse(data=serializer.data, pagination=paginator.get_pagination(), status=status.HTTP_200_OK)
     
     def post(self, request, format=None):
-        """ POST a list of people """
-        serializer = PersonSerializer(request.data)
-        if serializer.is_valid():
-            serializer.save()
-            return Response(serializer.data, status=status.HTTP_201_CREATED)
-        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        """ POST a list of people, creating new records and updating existing ones by email """
+        rows = request.data if isinstance(request.data, list) else [request.data]
+        serializer = PersonUpsertSerializer(data=rows, many=True)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        serializer.save()
+        report = {
+            'created': serializer.created_count,
+            'updated': serializer.updated_count,
+            'rejected': len(serializer.rejected),
+            'errors': serializer.rejected
+        }
+
+        if not serializer.rejected:
+            return Response(report, status=status.HTTP_201_CREATED)
+        if serializer.validated_data:
+            return Response(report, status=status.HTTP_207_MULTI_STATUS)
+        return Response(report, status=status.HTTP_400_BAD_REQUEST)
     
 
 class PersonDetail(APIView):
@@ -95,11 +132,13 @@ class PersonDetail(APIView):
             return Person.objects.get(db_id=db_id)
         except Person.DoesNotExist:
             return Response(status=status.HTTP_410_GONE)
-                
+
+    @table_versions_condition(Person, Organization)
     def get(self, request, db_id, format=None):
         """ GET the details for one person """
+        fields, expand = PersonSerializer.get_field_params(request.query_params)
         person = self.get_object(db_id)
-        serializer = PersonSerializer(person)
+        serializer = PersonSerializer(person, fields=fields, expand=expand)
 
         return Response(serializer.data, status=status.HTTP_200_OK)
 
@@ -121,12 +160,200 @@ class PersonDetail(APIView):
     
 class PlotList(APIView):
     """
-    Get a list of all the plots
+    Get a list of all the plots, filtered by trial_id, block, type, year, germplasm_id
+    or treatment_level_id
     """
+    renderer_classes = [JSONRenderer, BrowsableAPIRenderer, NDJSONRenderer]
 
+    @table_versions_condition(Plot, Trial, Location, PlotCrop, PlotTreatment)
     def get(self, request, format=None):
-        plots = Plot.objects.all()
-        serializer = PlotSerializer(plots, many=True)
+        """ GET a page of plots, or stream all of them as NDJSON """
+        fields, expand = PlotSerializer.get_field_params(request.query_params)
+        plots = filter_plots(Plot.objects.all(), request.query_params)
+        plots = PlotSerializer.optimize_queryset(plots, fields, expand)
 
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        if wants_stream(request):
+            return stream_queryset(plots.order_by('pk'), PlotSerializer, fields=fields, expand=expand)
+
+        paginator = KsuidCursorPagination(request.query_params)
+        plots = paginator.paginate_queryset(plots)
+        serializer = PlotSerializer(plots, many=True, fields=fields, expand=expand)
+
+        return ApiResponse(data=serializer.data, pagination=paginator.get_pagination(), status=status.HTTP_200_OK)
+
+
+class PlotTree(APIView):
+    """
+    Get the nested main plot -> split plot hierarchy of a trial
+    """
+
+    @table_versions_condition(Trial, Plot)
+    def get(self, request, db_id, format=None):
+        """ GET every plot of a trial in one query and nest them by parent plot """
+        trial = get_object_or_404(Trial, db_id=db_id)
+        plots = Plot.objects.filter(trial_id=trial).order_by('label')
+        nodes = PlotNodeSerializer(plots, many=True).data
+        tree = build_plot_tree([dict(node) for node in nodes])
+
+        return ApiResponse(data=tree, status=status.HTTP_200_OK)
+
+class ObservationExport(APIView):
+    """
+    Export a trial's observations as a Parquet, Arrow IPC or CSV file
+    """
+
+    @table_versions_condition(Trial, Plot, PlotCrop, PlotTreatment, Observation, Germplasm, Treatment, TreatmentLevel)
+    def get(self, request, db_id, format=None):
+        """ GET the observations of a trial, optionally for one year, as a columnar file """
+        trial = get_object_or_404(Trial, db_id=db_id)
+
+        file_format = request.query_params.get('fileFormat', 'parquet')
+        if file_format not in EXPORT_FORMATS:
+            return Response(
+                {'fileFormat': f"Expected one of {', '.join(EXPORT_FORMATS)}."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        year = request.query_params.get('year')
+        if year is not None and not year.isdigit():
+            return Response({'year': 'year must be an integer.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        # Chunks are read, encoded and sent one at a time, the season never sits in memory whole
+        frames = iter_observation_frames(trial, year=year and int(year))
+        export = EXPORT_FORMATS[file_format]
+        response = StreamingHttpResponse(iter_encoded(frames, file_format), content_type=export['content_type'])
+        response['Content-Disposition'] = content_disposition_header(True, f"{trial.name}.{export['extension']}")
+        response['X-Accel-Buffering'] = 'no'
+
+        return response
+
+class PhenotypeMatrix(APIView):
+    """
+    Get a trial's plot crop x variable phenotype matrix as JSON, or as a CSV, Parquet or Arrow IPC file
+    """
+
+    @table_versions_condition(Trial, *MATRIX_MODELS)
+    def get(self, request, db_id, format=None):
+        """ GET the matrix of a trial, optionally for one year, reducing repeated measurements with ?aggregate= """
+        trial = get_object_or_404(Trial, db_id=db_id)
+
+        file_format = request.query_params.get('fileFormat', 'json')
+        if file_format != 'json' and file_format not in EXPORT_FORMATS:
+            return Response(
+                {'fileFormat': f"Expected one of json, {', '.join(EXPORT_FORMATS)}."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        aggregate = request.query_params.get('aggregate', 'last')
+        if aggregate not in MATRIX_AGGREGATIONS:
+            return Response(
+                {'aggregate': f"Expected one of {', '.join(MATRIX_AGGREGATIONS)}."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        year = request.query_params.get('year')
+        if year is not None and not year.isdigit():
+            return Response({'year': 'year must be an integer.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        matrix = phenotype_matrix(trial, year=year and int(year), aggregate=aggregate)
+        if file_format == 'json':
+            return ApiResponse(data=matrix.to_dicts(), status=status.HTTP_200_OK)
+
+        export = EXPORT_FORMATS[file_format]
+        response = HttpResponse(write_frame(matrix, file_format), content_type=export['content_type'])
+        response['Content-Disposition'] = content_disposition_header(True, f"{trial.name}_phenotypes.{export['extension']}")
+
+        return response
+
+class TrialSummaryList(APIView):
+    """
+    Get the precomputed observation summaries of a trial
+    """
+
+    @table_versions_condition(Trial, TrialSummary)
+    def get(self, request, db_id, format=None):
+        """ GET the summary rows of a trial, optionally for one year and variable """
+        trial = get_object_or_404(Trial, db_id=db_id)
+
+        year = request.query_params.get('year')
+        if year is not None and not year.isdigit():
+            return Response({'year': 'year must be an integer.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        summaries = trial_summaries(trial, year=year and int(year), variable=request.query_params.get('variable_id'))
+        serializer = TrialSummarySerializer(summaries, many=True)
+
+        return ApiResponse(data=serializer.data, status=status.HTTP_200_OK)
+
+class TrialAnalysis(APIView):
+    """
+    Get the ANOVA tables and least squares means of a trial year
+    """
+
+    @table_versions_condition(Trial, Plot, PlotCrop, PlotTreatment, Observation, Treatment, TreatmentLevel)
+    def get(self, request, db_id, format=None):
+        """ GET the analysis of every numeric variable of a trial for the required ?year= """
+        trial = get_object_or_404(Trial, db_id=db_id)
+
+        year = request.query_params.get('year')
+        if year is None or not year.isdigit():
+            return Response({'year': 'year is required and must be an integer.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        return ApiResponse(data=trial_analysis(trial, int(year)), status=status.HTTP_200_OK)
+
+class GermplasmResolve(APIView):
+    """
+    Resolve germplasm names as spelled on field sheets to germplasm records
+    """
+    max_names = 50000
+
+    def get(self, request, format=None):
+        """ GET the matches of one or more ?name= params """
+        return self.resolve(request.query_params.getlist('name'), request.query_params.get('fuzzy', 'true'))
+
+    def post(self, request, format=None):
+        """ POST a list of names, or {"names": [...], "fuzzy": bool}, and get one match per name in order """
+        data = request.data
+        fuzzy = True
+        if isinstance(data, dict):
+            fuzzy = data.get('fuzzy', True)
+            data = data.get('names')
+        return self.resolve(data, fuzzy)
+
+    def resolve(self, names, fuzzy):
+        if not isinstance(names, list) or not all(isinstance(name, str) for name in names):
+            return Response({'detail': 'Expected a list of names.'}, status=status.HTTP_400_BAD_REQUEST)
+        if len(names) > self.max_names:
+            return Response(
+                {'detail': f"A request cannot contain more than {self.max_names} names."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if isinstance(fuzzy, str):
+            fuzzy = fuzzy.lower() not in ('false', '0', 'no')
+
+        return ApiResponse(data=resolve_germplasm(names, fuzzy=bool(fuzzy)), status=status.HTTP_200_OK)
+
+class ObservationBatch(APIView):
+    """
+    Bulk ingest of observation records
+    """
+    max_rows = 50000
+
+    def post(self, request, format=None):
+        """ POST a list of observations, inserting the valid rows and reporting the rest """
+        rows = request.data
+        if not isinstance(rows, list):
+            return Response({'detail': 'Expected a list of observations.'}, status=status.HTTP_400_BAD_REQUEST)
+        if len(rows) > self.max_rows:
+            return Response(
+                {'detail': f"A batch cannot contain more than {self.max_rows} observations."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        created, errors = ingest_observations(rows)
+        report = {'created': created, 'rejected': len(errors), 'errors': errors}
 
+        if not errors:
+            return Response(report, status=status.HTTP_201_CREATED)
+        if created:
+            return Response(report, status=status.HTTP_207_MULTI_STATUS)
+        return Response(report, status=status.HTTP_400_BAD_REQUEST)
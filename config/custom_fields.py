@@ -12,4 +12,117 @@ KsuidField = partial(
     default=Ksuid,
     max_length=50,
     help_text='ksuid formatter for this entity.'
-)
\ No newline at end of file
+)
+
+class BinaryCharIDField(CharIDField):
+    """
+    Prefixed KSUID stored as its raw 20 bytes (bytea) instead of the prefixed base62 text.
+    Python, forms and the API keep seeing 'prefix_<27 chars>', foreign keys to it are bytea too.
+    KSUIDs are big endian timestamp first, so the bytes sort in the same order as the text.
+    """
+    description = 'Prefixed KSUID stored as 20 bytes'
+
+    def db_type(self, connection):
+        return 'bytea'
+
+    def rel_db_type(self, connection):
+        return 'bytea'
+
+    def cast_db_type(self, connection):
+        return 'bytea'
+
+    def to_bytes(self, value):
+        """ Raw bytes of a prefixed KSUID string, ids that can't be a KSUID of this field map to bytes no KSUID has """
+        if isinstance(value, (bytes, memoryview)):
+            return bytes(value)
+        value = str(value)
+        if self.prefix and value.startswith(self.prefix):
+            value = value[len(self.prefix):]
+        if len(value) == Ksuid.BASE62_LENGTH:
+            try:
+                return bytes(Ksuid.from_base62(value))
+            except (ValueError, OverflowError):
+                pass
+        return value.encode()
+
+    def to_string(self, value):
+        """ Prefixed base62 form of the raw bytes """
+        return f"{self.prefix}{Ksuid.from_bytes(bytes(value))}"
+
+    def from_db_value(self, value, expression, connection):
+        if value is None:
+            return None
+        return self.to_string(value)
+
+    def to_python(self, value):
+        if isinstance(value, (bytes, memoryview)):
+            return self.to_string(value)
+        return super().to_python(value)
+
+    def get_db_prep_value(self, value, connection, prepared=False):
+        value = super().get_db_prep_value(value, connection, prepared)
+        if value is None:
+            return None
+        return self.to_bytes(value)
+
+BinaryKsuidField = partial(
+    BinaryCharIDField,
+    default=Ksuid,
+    max_length=50,
+    help_text='ksuid formatter for this entity, stored as 20 bytes.'
+)
+
+""" Binary KSUID migration SQL """
+BASE62_ALPHABET = '0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz'
+
+# Session scoped conversion functions, created by the migrations moving a column between the two forms
+KSUID_SQL_FUNCTIONS = f"""
+    CREATE FUNCTION pg_temp.ksuid_to_bytes(id text) RETURNS bytea LANGUAGE plpgsql IMMUTABLE AS $$
+    DECLARE
+        n numeric := 0;
+        result bytea := '\\x0000000000000000000000000000000000000000';
+    BEGIN
+        FOR i IN 1..length(id) LOOP
+            n := n * 62 + strpos('{BASE62_ALPHABET}', substr(id, i, 1)) - 1;
+        END LOOP;
+        FOR i IN REVERSE 19..0 LOOP
+            result := set_byte(result, i, mod(n, 256)::int);
+            n := div(n, 256);
+        END LOOP;
+        RETURN result;
+    END $$;
+
+    CREATE FUNCTION pg_temp.ksuid_to_text(id bytea) RETURNS text LANGUAGE plpgsql IMMUTABLE AS $$
+    DECLARE
+        n numeric := 0;
+        result text := '';
+    BEGIN
+        FOR i IN 0..length(id) - 1 LOOP
+            n := n * 256 + get_byte(id, i);
+        END LOOP;
+        FOR i IN 1..27 LOOP
+            result := substr('{BASE62_ALPHABET}', mod(n, 62)::int + 1, 1) || result;
+            n := div(n, 62);
+        END LOOP;
+        RETURN result;
+    END $$;
+"""
+
+def ksuid_to_binary_sql(table, column, prefix):
+    """ ALTER a prefixed KSUID varchar column to BinaryKsuidField's bytea, needs KSUID_SQL_FUNCTIONS """
+    return (
+        f"ALTER TABLE {table} ALTER COLUMN {column} TYPE bytea "
+        f"USING pg_temp.ksuid_to_bytes(substr({column}, {len(prefix) + 1}))"
+    )
+
+def ksuid_to_text_sql(table, column, prefix, max_length=50):
+    """ ALTER a BinaryKsuidField bytea column back to the prefixed KSUID varchar, needs KSUID_SQL_FUNCTIONS """
+    return (
+        f"ALTER TABLE {table} ALTER COLUMN {column} TYPE varchar({max_length}) "
+        f"USING '{prefix}' || pg_temp.ksuid_to_text({column})"
+    )
+
+# A new BinaryKsuidField value generated in SQL, for set based inserts: the KSUID timestamp
+# (seconds since the KSUID epoch, 2014-05-13) followed by 16 random bytes
+KSUID_EPOCH = 1400000000
+NEW_BINARY_KSUID_SQL = f"int4send((extract(epoch FROM clock_timestamp()) - {KSUID_EPOCH})::int) || uuid_send(gen_random_uuid())"
@@ -20,6 +20,18 @@ class VariableType(models.TextChoices):
     WEED = 'weed', 'Weed'
     SOIL = 'soil', 'Soil'
     
+class ScaleDataType(models.TextChoices):
+    """
+    Enumerate the data types a variable scale can hold
+    """
+    NUMERICAL = 'numerical', 'Numerical'
+    ORDINAL = 'ordinal', 'Ordinal'      # ordered numeric codes
+    NOMINAL = 'nominal', 'Nominal'      # unordered categories
+    DATE = 'date', 'Date'
+    TEXT = 'text', 'Text'
+
+NUMERIC_SCALE_TYPES = [ScaleDataType.NUMERICAL, ScaleDataType.ORDINAL]
+
 class StatusType(models.TextChoices):
     """
     Enumerate all status types
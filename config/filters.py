@@ -8,7 +8,7 @@ from django.db.models.query import QuerySet
 from django.utils.translation import gettext_lazy as _
 from resources.models import Person
 from data_storage.models import Trial, TrialYear
-from data_storage.models import PlotCrop
+from data_storage.models import Plot, PlotCrop
 
 class ManagerFilter(admin.SimpleListFilter):
     title = _('Manager')
@@ -51,4 +51,32 @@ class PlotCropFilter(admin.SimpleListFilter):
     def queryset(self, request: Any, queryset: QuerySet[Any]) -> QuerySet[Any] | None:
         if self.value():
             return queryset.filter(plot_year=self.value())
-        return queryset
\ No newline at end of file
+        return queryset
+
+class SelectRelatedFieldListFilter(admin.RelatedFieldListFilter):
+    """
+    Related field filter whose choice labels follow foreign keys, which are loaded with the
+    choices in one query instead of one query per choice
+    """
+    select_related = []
+
+    def field_choices(self, field, request, model_admin):
+        ordering = self.field_admin_ordering(field, request, model_admin)
+        choices = field.related_model._default_manager.select_related(*self.select_related)
+        if ordering:
+            choices = choices.order_by(*ordering)
+        return [(choice.pk, str(choice)) for choice in choices]
+
+class ParentPlotFilter(SelectRelatedFieldListFilter):
+    select_related = ['trial_id']
+
+    def field_choices(self, field, request, model_admin):
+        # Only plots that have split plots can be parents
+        parents = Plot.objects.filter(parent_plot_id__isnull=False).values('parent_plot_id')
+        return [
+            (plot.pk, str(plot))
+            for plot in Plot.objects.filter(pk__in=parents).select_related(*self.select_related).order_by('trial_id__name', 'label')
+        ]
+
+class GermplasmFilter(SelectRelatedFieldListFilter):
+    select_related = ['common_name_id']
@@ -0,0 +1,55 @@
+"""
+Versioned Process Caches
+
+In memory snapshots of tables that rarely change (the ontology, the germplasm names), loaded once per
+process and keyed on the TableVersion counters of their tables, the shared version key every process
+can see. A process re-reads the counters at most every VERSION_CHECK_INTERVAL seconds and reloads when
+they moved. Saves in the same process invalidate the snapshot right away through signal receivers.
+"""
+
+# Standard imports
+import threading
+import time
+
+VERSION_CHECK_INTERVAL = 5.0
+
+class VersionedCache:
+    """
+    Process local value built by loader(version) from the given models' tables
+    """
+
+    def __init__(self, loader, *models, check_interval=VERSION_CHECK_INTERVAL):
+        self.loader = loader
+        self.models = models
+        self.check_interval = check_interval
+
+        self._value = None
+        self._version = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def version(self):
+        """ Shared version key, built from the TableVersion counters of the models' tables """
+        from data_storage.models import get_table_versions
+
+        return tuple(sorted((table, version) for table, (version, _) in get_table_versions(*self.models).items()))
+
+    def get(self):
+        """ Return the cached value, loading or reloading it when the shared version moved """
+        value = self._value
+        if value is not None and time.monotonic() - self._checked_at < self.check_interval:
+            return value
+
+        with self._lock:
+            version = self.version()
+            value = self._value
+            if value is None or self._version != version:
+                value = self._value = self.loader(version)
+                self._version = version
+            self._checked_at = time.monotonic()
+
+        return value
+
+    def invalidate(self, **kwargs):
+        """ Drop the cached value, accepts the keyword arguments of the save and delete signals """
+        self._value = None
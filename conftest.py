@@ -0,0 +1,23 @@
+"""
+pytest bootstrap
+
+Configures Django and runs the session against a throwaway test database, the way manage.py test does,
+so the apps' TestCase classes (the benchmark budgets among them) run under plain pytest as well.
+"""
+import os
+
+import django
+import pytest
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+django.setup()
+
+@pytest.fixture(scope='session', autouse=True)
+def django_test_database():
+    from django.test.utils import setup_databases, setup_test_environment, teardown_databases, teardown_test_environment
+
+    setup_test_environment()
+    databases = setup_databases(verbosity=0, interactive=False)
+    yield
+    teardown_databases(databases, verbosity=0)
+    teardown_test_environment()
@@ -7,7 +7,7 @@ from .models import CommonName, Germplasm, GermplasmAlias
 from .models import Plot, PlotCrop, PlotTreatment
 from .models import Observation
 
-from config.filters import ManagerFilter, TrialYearFilter, PlotCropFilter
+from config.filters import ManagerFilter, TrialYearFilter, PlotCropFilter, ParentPlotFilter, GermplasmFilter
 
 """ Trial Models """
 @admin.register(Trial)
@@ -18,6 +18,7 @@ class TrialAdmin(admin.ModelAdmin):
 @admin.register(TrialYear)
 class TrialYearAdmin(admin.ModelAdmin):
     list_display = ['trial_id', 'year']
+    list_select_related = ['trial_id']
     list_filter = ['trial_id', TrialYearFilter]
     ordering = ['trial_id', 'year']
     search_fields = ['trial_id', 'year']
@@ -55,14 +56,16 @@ admin.site.register(GermplasmAlias)
 @admin.register(Plot)
 class PlotAdmin(admin.ModelAdmin):
     list_display = ['label', 'trial_id', 'block', 'type', 'width_m', 'length_m', 'parent_plot_id', 'location_id']
-    list_filter = ['trial_id', 'block', 'type', 'parent_plot_id']
+    list_select_related = ['trial_id', 'parent_plot_id__trial_id', 'location_id']
+    list_filter = ['trial_id', 'block', 'type', ('parent_plot_id', ParentPlotFilter)]
     search_fields = ['trial_id', 'label', 'location_id']
     ordering = ['trial_id', 'label', 'type']
 
 @admin.register(PlotCrop)
 class PlotCropAdmin(admin.ModelAdmin):
     list_display = ['plot_id', 'plot_year', 'germplasm_id']
-    list_filter = ['germplasm_id', PlotCropFilter]
+    list_select_related = ['plot_id__trial_id', 'germplasm_id__common_name_id']
+    list_filter = [('germplasm_id', GermplasmFilter), PlotCropFilter]
     search_fields = ['plot_year', 'plot_id', 'germplasm_id']
     ordering = ['plot_year', 'plot_id']
 
@@ -0,0 +1,310 @@
+"""
+Data Storage Trial Analysis
+
+ANOVA tables and least squares means for every numeric variable of a trial year.
+
+The design comes from one plot crop query: the plot block, the main plot owning each plot (from the
+materialized path) and the treatment levels assigned to the plot crop or inherited from the plot crops
+of its ancestor plots. Factors that are constant within every main plot are whole plot factors, the rest
+split plot factors. When main plots hold more than one analysed unit the table gets a whole plot error
+stratum (block x whole plot factors) that the block and whole plot terms are tested against, otherwise
+it is a randomized complete block factorial.
+
+Sums of squares are sequential (type I). Variables observed on the same units share one design,
+so the projections run once for all of them as a single matrix.
+"""
+
+# Standard imports
+import itertools
+import math
+from collections import defaultdict
+
+# Django imports
+from django.core.cache import cache
+from django.db.models import Avg
+
+# External imports
+import numpy as np
+
+# App imports
+from .models import Plot, PlotCrop, PlotTreatment, Observation, Treatment, TreatmentLevel, table_versions_key
+
+ANALYSIS_CACHE_TIMEOUT = 60 * 60 * 24
+
+WHOLE_PLOT_ERROR = 'Whole plot error'
+RESIDUAL = 'Residual'
+
+""" F distribution """
+def beta_fraction(x, a, b, iterations=300, eps=3e-14):
+    """ Continued fraction of the incomplete beta function (modified Lentz) """
+    tiny = 1e-300
+    c = 1.0
+    d = 1 - (a + b) * x / (a + 1)
+    d = 1 / (d if abs(d) > tiny else tiny)
+    h = d
+    for m in range(1, iterations + 1):
+        for aa in (
+            m * (b - m) * x / ((a + 2 * m - 1) * (a + 2 * m)),
+            -(a + m) * (a + b + m) * x / ((a + 2 * m) * (a + 2 * m + 1))
+        ):
+            d = 1 + aa * d
+            d = 1 / (d if abs(d) > tiny else tiny)
+            c = 1 + aa / c
+            c = c if abs(c) > tiny else tiny
+            h *= d * c
+        if abs(d * c - 1) < eps:
+            break
+    return h
+
+def regularized_beta(x, a, b):
+    """ Regularized incomplete beta function I_x(a, b) """
+    if x <= 0:
+        return 0.0
+    if x >= 1:
+        return 1.0
+    front = math.exp(math.lgamma(a + b) - math.lgamma(a) - math.lgamma(b) + a * math.log(x) + b * math.log1p(-x))
+    if x < (a + 1) / (a + b + 2):
+        return front * beta_fraction(x, a, b) / a
+    return 1 - front * beta_fraction(1 - x, b, a) / b
+
+def f_pvalue(f, df1, df2):
+    """ Upper tail probability of an F statistic """
+    if f is None or not math.isfinite(f) or df1 <= 0 or df2 <= 0:
+        return None
+    if f <= 0:
+        return 1.0
+    return regularized_beta(df2 / (df2 + df1 * f), df2 / 2, df1 / 2)
+
+""" Design """
+def load_design(trial, year):
+    """
+    Return {plot_crop_id: {'block', 'main_plot', 'levels': {treatment: level}}} for the plot crops of a trial year,
+    from one query. Plot crops inherit the treatment levels of the plot crops of their ancestor plots.
+    """
+    rows = PlotCrop.objects.filter(plot_id__trial_id=trial, plot_year=year).values_list(
+        'db_id', 'plot_id', 'plot_id__block', 'plot_id__path',
+        'plottreatment__treatment_level_id__treatment_id__name', 'plottreatment__treatment_level_id__level'
+    )
+
+    units = {}
+    plot_levels = defaultdict(dict)
+    for plot_crop_id, plot_id, block, path, treatment, level in rows:
+        units.setdefault(plot_crop_id, {'block': block or '', 'path': path})
+        if treatment is not None:
+            plot_levels[plot_id][treatment] = level
+
+    for unit in units.values():
+        plot_ids = unit.pop('path').strip('/').split('/')
+        unit['main_plot'] = plot_ids[0]
+        # Top down, so levels set on a subplot override the ones of its main plot
+        unit['levels'] = {}
+        for plot_id in plot_ids:
+            unit['levels'].update(plot_levels.get(plot_id, {}))
+
+    return units
+
+def load_responses(trial, year):
+    """
+    Return the plot crop ids, variable labels and a (plot crop x variable) array of the mean numeric value,
+    NaN where a variable was not measured on a plot crop. Repeated measurements are averaged.
+    """
+    rows = list(
+        Observation.objects.filter(
+            plot_crop_id__plot_id__trial_id=trial, plot_crop_id__plot_year=year, value_num__isnull=False
+        ).values_list('plot_crop_id', 'variable_id').annotate(value=Avg('value_num')).order_by()
+    )
+    plot_crop_ids = sorted({row[0] for row in rows})
+    variables = sorted({row[1] for row in rows})
+
+    unit_index = {pk: i for i, pk in enumerate(plot_crop_ids)}
+    variable_index = {label: j for j, label in enumerate(variables)}
+    values = np.full((len(plot_crop_ids), len(variables)), np.nan)
+    for plot_crop_id, variable, value in rows:
+        values[unit_index[plot_crop_id], variable_index[variable]] = value
+
+    return plot_crop_ids, variables, values
+
+def dummies(values, levels):
+    """ Treatment coded indicator columns, the first level is the reference """
+    values = np.asarray(values, dtype=object)
+    if len(levels) < 2:
+        return np.empty((len(values), 0))
+    return np.column_stack([values == level for level in levels[1:]]).astype(float)
+
+def interaction(columns):
+    """ Row wise products of the indicator columns of several factors """
+    result = columns[0]
+    for other in columns[1:]:
+        result = (result[:, :, None] * other[:, None, :]).reshape(len(result), -1)
+    return result
+
+def build_terms(factors, levels, whole, sub, blocks, block_levels, main_plots=None):
+    """
+    Ordered (name, columns) model terms: block, the whole plot terms, the whole plot error when
+    main_plots are given and there is more than one, then every term involving a split plot factor
+    """
+    terms = []
+    if len(block_levels) > 1:
+        terms.append(('Block', dummies(blocks, block_levels)))
+
+    def factorial(names):
+        for size in range(1, len(names) + 1):
+            for combo in itertools.combinations(names, size):
+                yield combo
+
+    encoded = {name: dummies(factors[name], levels[name]) for name in whole + sub}
+    for combo in factorial(whole):
+        terms.append((' x '.join(combo), interaction([encoded[name] for name in combo])))
+    if main_plots is not None and len(set(main_plots)) > 1:
+        terms.append((WHOLE_PLOT_ERROR, dummies(main_plots, sorted(set(main_plots)))))
+    for combo in factorial(whole + sub):
+        if any(name in sub for name in combo):
+            terms.append((' x '.join(combo), interaction([encoded[name] for name in combo])))
+
+    return terms
+
+def sequential_bases(terms, n):
+    """
+    Orthonormal basis of each term, orthogonal to the intercept and every term before it.
+    The squared projections of a response on these give its sequential sums of squares.
+    """
+    basis = np.full((n, 1), 1 / math.sqrt(n))
+    bases = []
+    for name, columns in terms:
+        residual = columns - basis @ (basis.T @ columns)
+        if residual.size:
+            u, s, _ = np.linalg.svd(residual, full_matrices=False)
+            q = u[:, s > 1e-9 * max(1.0, s[0] if s.size else 0)]
+        else:
+            q = np.empty((n, 0))
+        bases.append((name, q))
+        basis = np.hstack([basis, q])
+
+    return bases
+
+""" Analysis """
+def analyze_units(units, variables, values):
+    """
+    ANOVA tables and least squares means of the variables measured on the same units.
+    values is a (unit x variable) array without missing values.
+    """
+    n, m = values.shape
+    results = {variable: {'variable': variable, 'n': n, 'anova': [], 'lsmeans': {}} for variable in variables}
+
+    blocks = [unit['block'] for unit in units]
+    block_levels = sorted(set(blocks))
+    main_plots = [unit['main_plot'] for unit in units]
+
+    # Factors with a level on every unit and more than one level
+    names = sorted(set.intersection(*(set(unit['levels']) for unit in units))) if units else []
+    factors = {name: [unit['levels'][name] for unit in units] for name in names}
+    levels = {name: sorted(set(factors[name])) for name in names}
+    names = [name for name in names if len(levels[name]) > 1]
+
+    split = len(set(main_plots)) < n
+    if split:
+        whole = [name for name in names if len(set(zip(main_plots, factors[name]))) == len(set(main_plots))]
+    else:
+        whole = list(names)
+    sub = [name for name in names if name not in whole]
+
+    for result in results.values():
+        result.update({
+            'design': 'split plot' if split and sub else 'randomized complete block',
+            'whole_plot_factors': whole,
+            'split_plot_factors': sub,
+        })
+    if n < 3 or not names:
+        return results
+
+    terms = build_terms(factors, levels, whole, sub, blocks, block_levels, main_plots if split and sub else None)
+    bases = sequential_bases(terms, n)
+
+    # Every sum of squares for every variable in one pass
+    centered = values - values.mean(axis=0)
+    total_ss = (centered ** 2).sum(axis=0)
+    term_ss = [(name, q.shape[1], ((q.T @ values) ** 2).sum(axis=0)) for name, q in bases]
+    residual_df = n - 1 - sum(df for _, df, _ in term_ss)
+    residual_ss = np.maximum(total_ss - sum(ss for _, _, ss in term_ss), 0)
+
+    error = {RESIDUAL: (residual_df, residual_ss)}
+    for name, df, ss in term_ss:
+        if name == WHOLE_PLOT_ERROR:
+            error[WHOLE_PLOT_ERROR] = (df, ss)
+    whole_terms = {'Block'} | {name for name, _ in terms[:next(
+        (i for i, (name, _) in enumerate(terms) if name == WHOLE_PLOT_ERROR), 0
+    )]}
+
+    for j, variable in enumerate(variables):
+        table = []
+        for name, df, ss in term_ss + [(RESIDUAL, residual_df, residual_ss)]:
+            row = {'source': name, 'df': df, 'ss': float(ss[j]), 'ms': None, 'f': None, 'p': None}
+            if df > 0:
+                row['ms'] = row['ss'] / df
+            if name not in (WHOLE_PLOT_ERROR, RESIDUAL) and df > 0:
+                error_df, error_ss = error[WHOLE_PLOT_ERROR if name in whole_terms and WHOLE_PLOT_ERROR in error else RESIDUAL]
+                if error_df > 0 and error_ss[j] > 0:
+                    row['f'] = float(row['ms'] / (error_ss[j] / error_df))
+                    row['p'] = f_pvalue(row['f'], df, error_df)
+            table.append(row)
+        results[variable]['anova'] = table
+
+    # Least squares means, predictions of the fixed effects model averaged over an equally weighted grid
+    fixed = [(name, columns) for name, columns in terms if name != WHOLE_PLOT_ERROR]
+    design = np.hstack([np.ones((n, 1))] + [columns for _, columns in fixed])
+    coefficients = np.linalg.lstsq(design, values, rcond=None)[0]
+
+    grid = list(itertools.product(block_levels, *(levels[name] for name in whole + sub)))
+    grid_factors = {name: [row[i + 1] for row in grid] for i, name in enumerate(whole + sub)}
+    grid_terms = build_terms(grid_factors, levels, whole, sub, [row[0] for row in grid], block_levels)
+    predictions = np.hstack([np.ones((len(grid), 1))] + [columns for _, columns in grid_terms]) @ coefficients
+
+    for name in whole + sub:
+        column = np.asarray(grid_factors[name], dtype=object)
+        means = {level: predictions[column == level].mean(axis=0) for level in levels[name]}
+        for j, variable in enumerate(variables):
+            results[variable]['lsmeans'][name] = [
+                {'level': level, 'lsmean': float(means[level][j])} for level in levels[name]
+            ]
+
+    return results
+
+def analyze_trial(trial, year):
+    """
+    Run the analysis of every numeric variable of a trial year, returns one result per variable
+    """
+    design = load_design(trial, year)
+    plot_crop_ids, variables, values = load_responses(trial, year)
+
+    keep = [i for i, pk in enumerate(plot_crop_ids) if pk in design]
+    units = [design[plot_crop_ids[i]] for i in keep]
+    values = values[keep]
+
+    # Variables measured on the same plot crops share one design
+    groups = defaultdict(list)
+    observed = ~np.isnan(values)
+    for j in range(len(variables)):
+        groups[observed[:, j].tobytes()].append(j)
+
+    results = {}
+    for columns in groups.values():
+        rows = np.flatnonzero(observed[:, columns[0]])
+        results.update(analyze_units(
+            [units[i] for i in rows], [variables[j] for j in columns], values[np.ix_(rows, columns)]
+        ))
+
+    return [results[variable] for variable in variables]
+
+def trial_analysis(trial, year):
+    """
+    Cached analyze_trial, recomputed whenever the observations, plots or treatment assignments change
+    """
+    version = table_versions_key(Plot, PlotCrop, PlotTreatment, Observation, Treatment, TreatmentLevel)
+    key = f"trial_analysis:{trial.pk}:{year}:{version}"
+
+    analysis = cache.get(key)
+    if analysis is None:
+        analysis = analyze_trial(trial, year)
+        cache.set(key, analysis, ANALYSIS_CACHE_TIMEOUT)
+
+    return analysis
@@ -1,5 +1,5 @@
 from django.apps import AppConfig
-from django.db.models.signals import post_migrate
+from django.db.models.signals import post_migrate, pre_save, post_save, pre_delete, post_delete
 
 
 class DataStorageConfig(AppConfig):
@@ -7,8 +7,34 @@ class DataStorageConfig(AppConfig):
     name = 'data_storage'
 
     def ready(self):
+        from . import summaries
+        from .models import tracked_models, track_table_change
+        from .germplasm import GERMPLASM_MODELS, invalidate_germplasm_resolver
+
+        # Connected per sender, a receiver without one would turn off fast deletes for every model
+        for model in tracked_models():
+            post_save.connect(track_table_change, sender=model)
+            post_delete.connect(track_table_change, sender=model)
+
         post_migrate.connect(run_initial_data_population, sender=self)
+        post_migrate.connect(create_observation_partitions, sender=self)
+        pre_save.connect(summaries.observation_pre_save, sender='data_storage.Observation')
+        post_save.connect(summaries.observation_post_save, sender='data_storage.Observation')
+        post_delete.connect(summaries.observation_post_delete, sender='data_storage.Observation')
+        for model in ['data_storage.PlotCrop', 'data_storage.PlotTreatment']:
+            pre_save.connect(summaries.layout_pre_save, sender=model)
+            post_save.connect(summaries.layout_post_save, sender=model)
+            pre_delete.connect(summaries.layout_pre_delete, sender=model)
+            post_delete.connect(summaries.layout_post_delete, sender=model)
+        for model in GERMPLASM_MODELS:
+            post_save.connect(invalidate_germplasm_resolver, sender=model)
+            post_delete.connect(invalidate_germplasm_resolver, sender=model)
 
 def run_initial_data_population(sender, **kwargs):
     from django.core.management import call_command
     call_command('populate_initial_db')
+
+def create_observation_partitions(sender, **kwargs):
+    from .partitions import forget_partitions, ensure_observation_partitions
+    forget_partitions()
+    ensure_observation_partitions()
@@ -0,0 +1,234 @@
+"""
+Data Storage Benchmark Suite
+
+Seeds a fixed size synthetic dataset on top of the initial data, then times the hot read paths
+(api lists, admin changelists, exports) and the populate_initial_db stages. Every case records its
+latency percentiles and the number of SQL queries it ran, and carries a query budget so a new per row
+lookup fails the suite instead of slipping into a release.
+
+Shared by the run_benchmarks command, which writes the report as JSON for comparison across
+commits, and by the BenchmarkTests test case, which asserts the budgets.
+"""
+
+# Standard imports
+import io
+import subprocess
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+# Third party imports
+import numpy as np
+
+# Django imports
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+
+# App imports
+from resources.models import State, Address, Organization, Person, Project, Location
+from ontology.models import SopDocument
+from .models import Trial, TrialYear, Treatment, TreatmentLevel, TrialTreatment, CommonName
+from .models import Plot, PlotCrop, Observation, ImportSource
+from .management.commands import populate_initial_db
+
+# The generate_synthetic options of the benchmark dataset, two trials of 96 main plots split in two,
+# 3 years, 4 variables and 2 observations per plot crop and variable: 864 plots, 2304 plot crops, 9216 observations
+DATASET = {
+    'trials': 2, 'blocks': 4, 'plots': 12, 'split_levels': 1, 'splits': 2, 'years': 3,
+    'variables': 4, 'germplasm': 4, 'observations': 2, 'seed': 2024
+}
+
+PERCENTILES = [50, 90, 95, 99]
+
+# Tables populate_initial_db fills, emptied before every timed populate run. The import ledger goes
+# too, the seed files would be skipped as unchanged otherwise
+POPULATE_MODELS = [
+    User, State, Address, Organization, Person, Project, Location, Trial, TrialYear,
+    Treatment, TreatmentLevel, TrialTreatment, Plot, SopDocument, CommonName, ImportSource
+]
+
+# Largest number of queries each case may run, the session and user lookups of the logged in client included.
+# Pages and changelists have to stay constant in the number of rows shown, so these only move when a feature
+# adds a query, never with the size of the data.
+QUERY_BUDGETS = {
+    'api people': 4,
+    'api people expanded': 4,
+    'api plots': 5,
+    'api plots expanded': 5,
+    'api plots stream': 5,
+    'admin plot changelist': 8,
+    'admin plotcrop changelist': 7,
+    'admin trialyear changelist': 13,
+    'export parquet': 6,
+    'export arrow': 6,
+    'export csv': 6,
+    'populate admin user': 2,
+    'populate states': 3,
+    'populate addresses': 3,
+    'populate organizations': 3,
+    'populate people': 3,
+    'populate projects': 3,
+    'populate locations': 3,
+    'populate trials': 3,
+    'populate trial years': 2,
+    'populate treatments': 5,
+    'populate trial treatments': 2,
+    'populate plots': 12,
+    'populate sop documents': 12,
+    'populate common names': 2,
+    'populate table versions': 14,
+}
+
+def seed_dataset():
+    """ Generate the benchmark dataset, returning the synthetic trials """
+    prefix = f"synthetic_{DATASET['seed']}_"
+    if not Trial.objects.filter(name__startswith=prefix).exists():
+        call_command('generate_synthetic', **DATASET, stdout=io.StringIO())
+    return list(Trial.objects.filter(name__startswith=prefix).order_by('name'))
+
+def dataset_sizes():
+    """ Row counts of the seeded dataset, recorded with the results """
+    return {
+        'people': Person.objects.count(),
+        'trials': Trial.objects.count(),
+        'plots': Plot.objects.count(),
+        'plot_crops': PlotCrop.objects.count(),
+        'observations': Observation.objects.count(),
+    }
+
+def fetch(client, url):
+    """ Request a url and read the whole body, streamed or not """
+    response = client.get(url)
+    assert response.status_code == 200, f'{url} returned {response.status_code}'
+    if response.streaming:
+        return b''.join(response.streaming_content)
+    return response.content
+
+def request_cases(trial):
+    """ The read paths to time, as (name, url) pairs """
+    export = f'/api/trials/{trial.db_id}/observations/export'
+    return [
+        ('api people', '/api/people'),
+        ('api people expanded', '/api/people?expand=affiliation_id'),
+        ('api plots', '/api/plots'),
+        ('api plots expanded', '/api/plots?expand=trial_id,location_id,parent_plot_id,children'),
+        ('api plots stream', '/api/plots?stream=true'),
+        ('admin plot changelist', '/admin/data_storage/plot/'),
+        ('admin plotcrop changelist', '/admin/data_storage/plotcrop/'),
+        ('admin trialyear changelist', '/admin/data_storage/trialyear/'),
+        ('export parquet', f'{export}?fileFormat=parquet'),
+        ('export arrow', f'{export}?fileFormat=arrow'),
+        ('export csv', f'{export}?fileFormat=csv'),
+    ]
+
+def summarize(seconds, queries):
+    """ Latency percentiles in milliseconds and the largest query count of a case's runs """
+    ms = np.array(seconds) * 1000
+    result = {'runs': len(ms), 'mean_ms': round(float(ms.mean()), 3), 'min_ms': round(float(ms.min()), 3)}
+    for percentile, value in zip(PERCENTILES, np.percentile(ms, PERCENTILES)):
+        result[f'p{percentile}_ms'] = round(float(value), 3)
+    result['max_ms'] = round(float(ms.max()), 3)
+    result['queries'] = max(queries)
+    return result
+
+def time_requests(trial, iterations):
+    """ Time every request case after one warm up request, as {name: result} """
+    client = Client()
+    client.force_login(User.objects.filter(is_superuser=True).first())
+
+    results = {}
+    for name, url in request_cases(trial):
+        fetch(client, url)
+        seconds, queries = [], []
+        for _ in range(iterations):
+            with CaptureQueriesContext(connection) as captured:
+                started = time.perf_counter()
+                fetch(client, url)
+                seconds.append(time.perf_counter() - started)
+            queries.append(len(captured))
+        results[name] = summarize(seconds, queries)
+
+    return results
+
+class PopulateStages(populate_initial_db.Command):
+    """ populate_initial_db counting the queries of each stage next to its timing """
+
+    @contextmanager
+    def stage(self, name):
+        with CaptureQueriesContext(connection) as captured:
+            with super().stage(name):
+                yield
+        self.queries.append((name, len(captured)))
+
+def time_populate(iterations):
+    """
+    Time the populate_initial_db stages on empty tables. Every run truncates the tables and
+    populates them again inside a transaction that is rolled back, leaving the data as it was.
+    """
+    tables = ', '.join(connection.ops.quote_name(model._meta.db_table) for model in POPULATE_MODELS)
+    seconds, queries = {}, {}
+    for _ in range(iterations):
+        with transaction.atomic():
+            with connection.cursor() as cursor:
+                # Deferred foreign key checks still pending in an enclosing transaction (a test case) block TRUNCATE
+                cursor.execute('SET CONSTRAINTS ALL IMMEDIATE')
+                cursor.execute(f'TRUNCATE {tables} CASCADE')
+            command = PopulateStages(stdout=io.StringIO())
+            command.queries = []
+            command.handle()
+            transaction.set_rollback(True)
+
+        for (name, elapsed), (_, count) in zip(command.timings, command.queries):
+            seconds.setdefault(f'populate {name}', []).append(elapsed)
+            queries.setdefault(f'populate {name}', []).append(count)
+
+    return {name: summarize(seconds[name], queries[name]) for name in seconds}
+
+def current_commit():
+    """ The git commit the suite ran on, when run from a checkout """
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def run_benchmarks(iterations=20, populate_iterations=5):
+    """
+    Seed the dataset and run every case, returning the report:
+    {'commit', 'created', 'iterations', 'dataset', 'results': {name: {..._ms, 'queries', 'budget'}}}
+    """
+    trials = seed_dataset()
+    results = time_requests(trials[0], iterations)
+    results.update(time_populate(populate_iterations))
+    for name, result in results.items():
+        result['budget'] = QUERY_BUDGETS.get(name)
+
+    return {
+        'commit': current_commit(),
+        'created': datetime.now(timezone.utc).isoformat(),
+        'iterations': iterations,
+        'populate_iterations': populate_iterations,
+        'dataset': dataset_sizes(),
+        'results': results,
+    }
+
+def over_budget(report):
+    """ {name: (queries, budget)} of the cases that ran more queries than their budget """
+    return {
+        name: (result['queries'], result['budget'])
+        for name, result in report['results'].items()
+        if result['budget'] is not None and result['queries'] > result['budget']
+    }
+
+def compare(report, baseline, metric='p50_ms'):
+    """ {name: (baseline, current, ratio)} of a metric for the cases present in both reports """
+    changes = {}
+    for name, result in report['results'].items():
+        previous = baseline.get('results', {}).get(name)
+        if previous is not None and previous.get(metric):
+            changes[name] = (previous[metric], result[metric], result[metric] / previous[metric])
+    return changes
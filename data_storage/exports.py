@@ -0,0 +1,265 @@
+"""
+Data Storage Columnar Exports
+"""
+
+# Standard imports
+import asyncio
+import io
+from itertools import islice
+
+# Django imports
+from asgiref.sync import sync_to_async
+
+# External imports
+import polars as pl
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+# App imports
+from .models import Observation, PlotTreatment
+
+EXPORT_FORMATS = {
+    'parquet': {'content_type': 'application/vnd.apache.parquet', 'extension': 'parquet'},
+    'arrow': {'content_type': 'application/vnd.apache.arrow.file', 'extension': 'arrow'},
+    'csv': {'content_type': 'text/csv', 'extension': 'csv'},
+}
+
+OBSERVATION_COLUMNS = {
+    'db_id': 'observation_id',
+    'date_time': 'date_time',
+    'plot_crop_id__plot_year': 'year',
+    'plot_crop_id__plot_id__label': 'plot',
+    'plot_crop_id__plot_id__block': 'block',
+    'plot_crop_id__plot_id__row': 'row',
+    'plot_crop_id__plot_id__column': 'column',
+    'plot_crop_id__plot_id__type': 'plot_type',
+    'plot_crop_id__germplasm_id__name': 'germplasm',
+    'variable_id': 'variable',
+    'value': 'value',
+    'value_num': 'value_num',
+    'observer_id': 'observer_id',
+    'plot_crop_id': 'plot_crop_id',
+}
+
+OBSERVATION_SCHEMA = {
+    'observation_id': pl.String,
+    'date_time': pl.Datetime(time_zone='UTC'),
+    'year': pl.Int32,
+    'plot': pl.String,
+    'block': pl.String,
+    'row': pl.String,
+    'column': pl.String,
+    'plot_type': pl.String,
+    'germplasm': pl.String,
+    'variable': pl.String,
+    'value': pl.String,
+    'value_num': pl.Float64,
+    'observer_id': pl.String,
+    'plot_crop_id': pl.String,
+}
+
+def observation_querysets(trial, year=None):
+    """
+    Return the observation rows and plot treatment level rows of a trial as values_list querysets
+    """
+    observations = Observation.objects.filter(plot_crop_id__plot_id__trial_id=trial)
+    treatments = PlotTreatment.objects.filter(plot_crop_id__plot_id__trial_id=trial)
+    if year is not None:
+        observations = observations.filter(plot_crop_id__plot_year=year)
+        treatments = treatments.filter(plot_crop_id__plot_year=year)
+
+    observations = observations.order_by('plot_crop_id', 'variable_id', 'date_time').values_list(*OBSERVATION_COLUMNS)
+    treatments = treatments.values_list('plot_crop_id', 'treatment_level_id__treatment_id__name', 'treatment_level_id__level')
+
+    return observations, treatments
+
+def treatment_levels(treatment_rows):
+    """
+    One row per plot crop with one column per treatment holding its level, None when there are no treatments
+    """
+    levels = pl.DataFrame(
+        treatment_rows,
+        schema={'plot_crop_id': pl.String, 'treatment': pl.String, 'level': pl.String},
+        orient='row'
+    )
+    if not levels.height:
+        return None
+    return levels.pivot(on='treatment', index='plot_crop_id', values='level', aggregate_function='first')
+
+def add_treatments(df, levels):
+    """ Add the treatment_levels columns to a frame of plot crop rows """
+    return df if levels is None else df.join(levels, on='plot_crop_id', how='left')
+
+def join_treatments(frames, treatment_rows):
+    """
+    Concatenate the observation frames and add one column per treatment holding the plot crop's level
+    """
+    df = pl.concat(frames) if frames else pl.DataFrame(schema=OBSERVATION_SCHEMA)
+
+    return add_treatments(df, treatment_levels(treatment_rows))
+
+def iter_observation_chunks(observations, chunk_size=50000):
+    """
+    Read an observation values_list queryset in chunks straight into columnar frames, one frame at a time.
+    Always yields at least one, possibly empty, frame
+    """
+    chunk = []
+    for row in observations.iterator(chunk_size=chunk_size):
+        chunk.append(row)
+        if len(chunk) == chunk_size:
+            yield pl.DataFrame(chunk, schema=OBSERVATION_SCHEMA, orient='row')
+            chunk = []
+    yield pl.DataFrame(chunk, schema=OBSERVATION_SCHEMA, orient='row')
+
+def read_observation_frames(observations, chunk_size=50000):
+    """
+    Read an observation values_list queryset in chunks straight into columnar frames
+    """
+    return list(iter_observation_chunks(observations, chunk_size))
+
+def observation_frame(trial, year=None, chunk_size=50000):
+    """
+    Build a long format polars DataFrame of a trial's observations, one row per observation,
+    joined out to the plot, germplasm, variable and one column per treatment.
+    """
+    observations, treatments = observation_querysets(trial, year)
+
+    return join_treatments(read_observation_frames(observations, chunk_size), list(treatments))
+
+def iter_observation_frames(trial, year=None, chunk_size=50000):
+    """
+    observation_frame one chunk at a time, so exports can be encoded and sent while the rest is still read
+    """
+    observations, treatments = observation_querysets(trial, year)
+    levels = treatment_levels(list(treatments))
+
+    for frame in iter_observation_chunks(observations, chunk_size):
+        yield add_treatments(frame, levels)
+
+async def aiter_observation_frames(trial, year=None, chunk_size=50000):
+    """
+    Async version of iter_observation_frames, reading the rows with the async ORM
+    """
+    observations, treatments = observation_querysets(trial, year)
+    # aiterator() runs a values_list query on the event loop (the iterable isn't a generator), so the
+    # chunks are read in the sync thread instead, one await per chunk
+    levels = treatment_levels(await sync_to_async(list)(treatments))
+
+    rows = observations.iterator(chunk_size=chunk_size)
+    next_chunk = sync_to_async(lambda: list(islice(rows, chunk_size)))
+    while True:
+        chunk = await next_chunk()
+        yield add_treatments(pl.DataFrame(chunk, schema=OBSERVATION_SCHEMA, orient='row'), levels)
+        if len(chunk) < chunk_size:
+            break
+
+async def aobservation_frame(trial, year=None, chunk_size=50000):
+    """
+    Async version of observation_frame, reading the rows with the async ORM
+    """
+    return pl.concat([frame async for frame in aiter_observation_frames(trial, year, chunk_size)])
+
+def write_frame(df, file_format, target=None):
+    """
+    Write a DataFrame as Parquet, an Arrow IPC file or CSV to a path or file object.
+    Returns the bytes when no target is given.
+    """
+    if file_format not in EXPORT_FORMATS:
+        raise ValueError(f"Unknown export format '{file_format}', expected one of {', '.join(EXPORT_FORMATS)}")
+
+    buffer = io.BytesIO() if target is None else target
+    if file_format == 'parquet':
+        df.write_parquet(buffer)
+    elif file_format == 'csv':
+        df.write_csv(buffer)
+    else:
+        df.write_ipc(buffer)
+
+    if target is None:
+        return buffer.getvalue()
+
+class ChunkSink(io.RawIOBase):
+    """
+    Write only file object keeping what was written until it is drained. tell() keeps counting across
+    drains, the Parquet and Arrow writers record file offsets in their footers.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.chunks = []
+        self.position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def drain(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+class FrameStreamWriter:
+    """
+    Encode frames sharing a schema into one Parquet, Arrow IPC or CSV file a frame at a time.
+    write() and close() return the bytes that are ready, only the Parquet and Arrow footers wait for close().
+    """
+
+    def __init__(self, file_format):
+        if file_format not in EXPORT_FORMATS:
+            raise ValueError(f"Unknown export format '{file_format}', expected one of {', '.join(EXPORT_FORMATS)}")
+        self.file_format = file_format
+        self.sink = ChunkSink()
+        self.writer = None
+        self.started = False
+
+    def write(self, df):
+        if self.file_format == 'csv':
+            data = df.write_csv(include_header=not self.started).encode()
+            self.started = True
+            return data
+
+        table = df.to_arrow()
+        if not self.started:
+            if self.file_format == 'parquet':
+                self.writer = pq.ParquetWriter(self.sink, table.schema)
+            else:
+                self.writer = pa.ipc.new_file(self.sink, table.schema)
+            self.started = True
+        if df.height:
+            self.writer.write_table(table)
+        return self.sink.drain()
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+        return self.sink.drain()
+
+def iter_encoded(frames, file_format):
+    """
+    Encode an iterable of frames sharing a schema as one file, yielding its bytes as each frame is written
+    """
+    writer = FrameStreamWriter(file_format)
+    for df in frames:
+        data = writer.write(df)
+        if data:
+            yield data
+    yield writer.close()
+
+async def aiter_encoded(frames, file_format):
+    """
+    Async version of iter_encoded for an async iterable of frames, encoding off the event loop
+    """
+    writer = FrameStreamWriter(file_format)
+    async for df in frames:
+        # Encoding is CPU bound, keep it off the event loop
+        data = await asyncio.to_thread(writer.write, df)
+        if data:
+            yield data
+    yield await asyncio.to_thread(writer.close)
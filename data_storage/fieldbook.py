@@ -0,0 +1,382 @@
+"""
+Data Storage Field Book Import
+
+Loads season field books (CSV or ODS) of observations without going through the ORM row by row.
+The file is read in fixed size batches, plot labels, plot crops, variables and observers are mapped
+through lookup frames built once up front, germplasm names are resolved per batch, and every check
+runs as a column expression. Each batch's accepted rows are COPYed into a temporary staging table as
+soon as they are checked, and merged into Observation with a single INSERT ... SELECT at the end.
+Rejected rows are appended to a side file with the reason.
+
+Field books are long (plot, variable, value, date_time columns) or wide (plot, date_time and one
+column per variable label or abbreviation). year, germplasm and observer columns are optional: the
+year defaults to the year of date_time, germplasm is only needed when a plot carries several plot
+crops in a year, and a default observer can be given for files without an observer column.
+"""
+
+# Standard imports
+import io
+import time
+from contextlib import ExitStack
+from pathlib import Path
+
+# Django imports
+from django.db import connection, transaction
+
+# External imports
+import polars as pl
+
+# App imports
+from config.custom_fields import NEW_BINARY_KSUID_SQL
+from config.enumerations import ScaleDataType, NUMERIC_SCALE_TYPES
+from resources.models import Person
+from ontology.registry import get_ontology
+from .models import Plot, PlotCrop, Observation, bump_table_version
+from .germplasm import get_germplasm_resolver
+from .summaries import add_staged_observations
+from .partitions import ensure_observation_partitions
+
+REQUIRED_COLUMNS = ['plot', 'date_time']
+
+# Column names matched case insensitively, anything else may be a variable label or abbreviation
+FIELDBOOK_COLUMNS = ['plot', 'date_time', 'variable', 'value', 'year', 'germplasm', 'observer']
+
+# Accepted date_time layouts, naive times are taken as UTC like the batch ingest API does
+DATE_TIME_FORMATS = ['%Y-%m-%dT%H:%M:%S%#z', '%Y-%m-%dT%H:%M:%S', '%Y-%m-%dT%H:%M', '%Y-%m-%d %H:%M:%S', '%Y-%m-%d %H:%M']
+
+STAGING_TABLE = 'observation_staging'
+
+STAGING_COLUMNS = ['date_time', 'observer_id_id', 'plot_crop_id_id', 'variable_id_id', 'value', 'value_num', 'value_date']
+
+STAGING_SQL = f"""
+    CREATE TEMPORARY TABLE {STAGING_TABLE} (
+        date_time timestamptz NOT NULL,
+        observer_id_id varchar(50) NOT NULL,
+        plot_crop_id_id varchar(50) NOT NULL,
+        variable_id_id varchar(255) NOT NULL,
+        value varchar(255) NOT NULL,
+        value_num double precision,
+        value_date date
+    ) ON COMMIT DROP
+"""
+
+MERGE_SQL = f"""
+    INSERT INTO {Observation._meta.db_table} (db_id, {', '.join(STAGING_COLUMNS)})
+    SELECT {NEW_BINARY_KSUID_SQL}, {', '.join(STAGING_COLUMNS)} FROM {STAGING_TABLE}
+"""
+
+class FieldBookError(ValueError):
+    """ The field book can't be imported at all, as opposed to single rejected rows """
+
+def read_ods(path):
+    """ Read an ODS field book whole with every column as text, spreadsheets can't be read in batches """
+    try:
+        return pl.read_ods(path, infer_schema_length=0)
+    except ModuleNotFoundError as e:
+        raise FieldBookError(f'Reading ODS field books needs the {e.name} package, or export the sheet as CSV') from e
+
+def normalize_columns(frame):
+    """ Strip the column names and lower case the known ones """
+    return frame.rename({
+        column: column.strip().lower() if column.strip().lower() in FIELDBOOK_COLUMNS else column.strip()
+        for column in frame.collect_schema().names()
+    })
+
+def scan_fieldbook(path):
+    """
+    Lazily read a field book with every column as text, the known column names lower cased and a 1 based row number
+    """
+    path = Path(path)
+    if path.suffix.lower() == '.ods':
+        frame = read_ods(path).lazy()
+    else:
+        frame = pl.scan_csv(path, infer_schema=False)
+
+    return normalize_columns(frame).with_row_index('row', offset=1)
+
+def read_fieldbook(path, batch_size):
+    """
+    Read a field book about batch_size rows at a time, as scan_fieldbook does: text columns, the known
+    column names lower cased and the row numbers of the whole file
+    """
+    path = Path(path)
+    if path.suffix.lower() == '.ods':
+        batches = read_ods(path).iter_slices(batch_size)
+    else:
+        reader = pl.read_csv_batched(path, infer_schema_length=0, batch_size=batch_size)
+        batches = (batch for batches in iter(lambda: reader.next_batches(1), None) for batch in batches)
+
+    offset = 1
+    for batch in batches:
+        yield normalize_columns(batch).with_row_index('row', offset=offset)
+        offset += batch.height
+
+def variable_frame():
+    """ Lookup frame of every variable label and abbreviation with the variable's type and bounds """
+    rows = []
+    for variable in get_ontology().variables.values():
+        data_type = variable.scale_id.data_type
+        for key in {variable.label, variable.abbreviation} - {None, ''}:
+            rows.append({
+                'variable': key,
+                'variable_id_id': variable.label,
+                'numeric': data_type in NUMERIC_SCALE_TYPES,
+                'dated': data_type == ScaleDataType.DATE,
+                'min_value': variable.min_value,
+                'max_value': variable.max_value,
+            })
+
+    return pl.DataFrame(rows, schema={
+        'variable': pl.String, 'variable_id_id': pl.String, 'numeric': pl.Boolean, 'dated': pl.Boolean,
+        'min_value': pl.Float64, 'max_value': pl.Float64,
+    })
+
+def observer_frame():
+    """ Lookup frame of every person by db_id and by email """
+    rows = []
+    for db_id, email in Person.objects.values_list('db_id', 'email'):
+        rows.append((db_id, db_id))
+        if email:
+            rows.append((email.lower(), db_id))
+
+    return pl.DataFrame(rows, schema={'observer_key': pl.String, 'observer_id_id': pl.String}, orient='row')
+
+def plot_crop_frames(trial):
+    """
+    Lookup frames of the trial's plots by label, and of its plot crops by plot, year and germplasm.
+    The second frame also holds the number of plot crops sharing the plot and year.
+    """
+    plots = pl.DataFrame(
+        list(Plot.objects.filter(trial_id=trial).values_list('label', 'db_id')),
+        schema={'plot': pl.String, 'plot_id': pl.String},
+        orient='row'
+    )
+    plot_crops = pl.DataFrame(
+        list(PlotCrop.objects.filter(plot_id__trial_id=trial).values_list('plot_id', 'plot_year', 'germplasm_id', 'db_id')),
+        schema={'plot_id': pl.String, 'year': pl.Int32, 'germplasm_id': pl.String, 'plot_crop_id_id': pl.String},
+        orient='row'
+    ).with_columns(crops=pl.len().over('plot_id', 'year'))
+
+    return plots, plot_crops
+
+def germplasm_frame(names):
+    """ Lookup frame of the germplasm names used in the file, resolved in one call """
+    lookup = get_germplasm_resolver().lookup(names)
+    return pl.DataFrame(
+        list(lookup.items()), schema={'germplasm': pl.String, 'germplasm_id': pl.String}, orient='row'
+    )
+
+def fieldbook_lookups(trial):
+    """ The lookup frames check_fieldbook joins, built once per import and shared by its batches """
+    plots, plot_crops = plot_crop_frames(trial)
+    return {'variables': variable_frame(), 'observers': observer_frame(), 'plots': plots, 'plot_crops': plot_crops}
+
+def to_long(frame, variables):
+    """ Unpivot a wide field book, one column per variable, into one row per plot and variable """
+    columns = frame.collect_schema().names()
+    if 'variable' in columns:
+        if 'value' not in columns:
+            raise FieldBookError("A field book with a 'variable' column needs a 'value' column")
+        return frame
+
+    value_columns = [column for column in columns if column in set(variables['variable'])]
+    if not value_columns:
+        raise FieldBookError("The field book has neither a 'variable' column nor any column named after a variable")
+
+    index = [column for column in columns if column not in value_columns]
+    return frame.unpivot(on=value_columns, index=index, variable_name='variable', value_name='value')
+
+def parse_date_time(column):
+    """ Timestamp expression trying every accepted layout, then a plain date """
+    text = pl.col(column).str.strip_chars()
+    attempts = [
+        text.str.to_datetime(DATE_TIME_FORMATS[0], time_zone='UTC', strict=False)
+    ] + [
+        text.str.to_datetime(layout, strict=False).dt.replace_time_zone('UTC') for layout in DATE_TIME_FORMATS[1:]
+    ] + [
+        text.str.to_date('%Y-%m-%d', strict=False).cast(pl.Datetime('us')).dt.replace_time_zone('UTC')
+    ]
+    return pl.coalesce(attempts)
+
+def is_blank(column):
+    """ Empty or whitespace only cell, the CSV reader leaves empty cells null """
+    return pl.col(column).is_null() | (pl.col(column).str.strip_chars() == '')
+
+def check_fieldbook(frame, trial, default_observer=None, lookups=None):
+    """
+    Map a scanned field book, or a batch of one, onto observation columns and validate every row.
+    Returns the accepted rows (STAGING_COLUMNS) and the rejected rows (the file's columns plus reason).
+    """
+    frame = frame.lazy()
+    columns = frame.collect_schema().names()
+    missing = [column for column in REQUIRED_COLUMNS if column not in columns]
+    if 'observer' not in columns and default_observer is None:
+        missing.append('observer')
+    if missing:
+        raise FieldBookError(f"The field book is missing the {', '.join(missing)} column(s)")
+
+    lookups = lookups or fieldbook_lookups(trial)
+    variables, plots, plot_crops = lookups['variables'], lookups['plots'], lookups['plot_crops']
+    frame = to_long(frame, variables)
+    source_columns = frame.collect_schema().names()
+
+    if 'observer' not in source_columns:
+        frame = frame.with_columns(observer=pl.lit(default_observer))
+    frame = frame.with_columns(
+        value=pl.col('value').str.strip_chars(),
+        # Emails match case insensitively, db_ids exactly
+        observer_key=pl.when(pl.col('observer').str.contains('@'))
+            .then(pl.col('observer').str.strip_chars().str.to_lowercase())
+            .otherwise(pl.col('observer').str.strip_chars()),
+        plot=pl.col('plot').str.strip_chars(),
+        variable=pl.col('variable').str.strip_chars(),
+        date_time_parsed=parse_date_time('date_time'),
+    )
+    # Blank cells of a wide field book are simply not measured
+    if 'variable' not in columns:
+        frame = frame.filter(pl.col('value').is_not_null() & (pl.col('value') != ''))
+
+    year = pl.col('date_time_parsed').dt.year().cast(pl.Int32)
+    if 'year' in source_columns:
+        year = pl.coalesce(pl.col('year').str.strip_chars().cast(pl.Int32, strict=False), year)
+    frame = frame.with_columns(year_parsed=year)
+
+    frame = frame.join(plots.lazy(), on='plot', how='left')
+    frame = frame.join(variables.lazy(), on='variable', how='left')
+    frame = frame.join(lookups['observers'].lazy(), on='observer_key', how='left')
+
+    # Rows without a germplasm take the plot's plot crop that year, ambiguous when it has several
+    plot_crops = plot_crops.lazy().rename({'year': 'year_parsed'})
+    frame = frame.join(
+        plot_crops.group_by('plot_id', 'year_parsed').agg(pl.col('plot_crop_id_id').first(), pl.col('crops').first()),
+        on=['plot_id', 'year_parsed'], how='left'
+    )
+    if 'germplasm' in source_columns:
+        germplasm = pl.col('germplasm').str.strip_chars()
+        frame = frame.with_columns(germplasm=pl.when(germplasm != '').then(germplasm))
+
+        # Null keys never join, so only rows naming a germplasm get the plot crop of that germplasm
+        names = frame.select(pl.col('germplasm').drop_nulls().unique()).collect()['germplasm'].to_list()
+        frame = frame.join(germplasm_frame(names).lazy(), on='germplasm', how='left')
+        frame = frame.join(
+            plot_crops.select('plot_id', 'year_parsed', 'germplasm_id', pl.col('plot_crop_id_id').alias('germplasm_crop_id')),
+            on=['plot_id', 'year_parsed', 'germplasm_id'], how='left'
+        )
+        frame = frame.with_columns(
+            plot_crop_id_id=pl.when(pl.col('germplasm').is_null()).then('plot_crop_id_id').otherwise('germplasm_crop_id')
+        )
+        unresolved = pl.col('germplasm').is_not_null() & pl.col('germplasm_id').is_null()
+    else:
+        frame = frame.with_columns(germplasm=pl.lit(None, dtype=pl.String))
+        unresolved = pl.lit(False)
+    ambiguous = pl.col('germplasm').is_null() & (pl.col('crops') > 1)
+
+    value_num = pl.col('value').cast(pl.Float64, strict=False)
+    value_date = pl.col('value').str.slice(0, 10).str.to_date('%Y-%m-%d', strict=False)
+    bounded = pl.col('min_value').is_not_null() | pl.col('max_value').is_not_null()
+
+    # The first failing check of a row is its reason. pl.format gives null on a null cell, which would
+    # accept the row, so blank cells are caught before any message quotes them
+    reason = (
+        pl.when(is_blank('plot')).then(pl.lit('Missing plot.'))
+        .when(pl.col('plot_id').is_null()).then(pl.format("Unknown plot '{}'.", 'plot'))
+        .when(is_blank('variable')).then(pl.lit('Missing variable.'))
+        .when(pl.col('variable_id_id').is_null()).then(pl.format("Unknown variable '{}'.", 'variable'))
+        .when(is_blank('observer_key')).then(pl.lit('Missing observer.'))
+        .when(pl.col('observer_id_id').is_null()).then(pl.format("Unknown observer '{}'.", 'observer'))
+        .when(is_blank('date_time')).then(pl.lit('Missing date_time.'))
+        .when(pl.col('date_time_parsed').is_null()).then(pl.format("Invalid date_time '{}'.", 'date_time'))
+        .when(is_blank('value')).then(pl.lit('Missing value.'))
+        .when(pl.col('value').str.len_chars() > 255).then(pl.lit('The value is longer than 255 characters.'))
+        .when(unresolved).then(pl.format("Unknown germplasm '{}'.", 'germplasm'))
+        .when(ambiguous).then(pl.lit('The plot has several plot crops that year, add a germplasm column.'))
+        .when(pl.col('plot_crop_id_id').is_null()).then(pl.format("No plot crop for plot '{}' in {}.", 'plot', 'year_parsed'))
+        .when((pl.col('numeric') | bounded) & value_num.is_null()).then(pl.lit('The observation value must be numeric for this variable.'))
+        .when(pl.col('dated') & value_date.is_null()).then(pl.lit('The observation value must be an ISO date (YYYY-MM-DD) for this variable.'))
+        .when(value_num < pl.col('min_value')).then(pl.format("The observation value cannot be less than the variable's minimum allowed value ({}).", 'min_value'))
+        .when(value_num > pl.col('max_value')).then(pl.format("The observation value cannot be greater than the variable's maximum allowed value ({}).", 'max_value'))
+    )
+
+    checked = frame.with_columns(
+        reason=reason,
+        value_num=pl.when(pl.col('numeric')).then(value_num),
+        value_date=pl.when(pl.col('dated')).then(value_date),
+    ).collect()
+
+    accepted = checked.filter(pl.col('reason').is_null()).select(
+        pl.col('date_time_parsed').alias('date_time'), 'observer_id_id', 'plot_crop_id_id', 'variable_id_id',
+        'value', 'value_num', 'value_date'
+    )
+    rejected = checked.filter(pl.col('reason').is_not_null()).select(*source_columns, 'reason').sort('row')
+
+    return accepted, rejected
+
+def copy_frame(cursor, frame, table, batch_size):
+    """ Stream a DataFrame into a table with COPY FROM STDIN, batch_size rows per COPY """
+    sql = f"COPY {table} ({', '.join(frame.columns)}) FROM STDIN WITH (FORMAT csv)"
+    for batch in frame.iter_slices(batch_size):
+        buffer = io.BytesIO()
+        batch.write_csv(buffer, include_header=False)
+        buffer.seek(0)
+        cursor.copy_expert(sql, buffer)
+
+def import_fieldbook(path, trial, default_observer=None, batch_size=100000, rejected_path=None, dry_run=False):
+    """
+    Import a field book into Observation, batch_size rows read, checked and copied at a time.
+    Returns a report dict with the row counts and timings.
+    Rejected rows are written to rejected_path when given and there are any.
+    """
+    timings = {'check': 0.0, 'copy': 0.0}
+    started = time.perf_counter()
+    lookups = fieldbook_lookups(trial)
+    accepted_rows = rejected_rows = 0
+    years = set()
+
+    with transaction.atomic(), connection.cursor() as cursor, ExitStack() as files:
+        if not dry_run:
+            cursor.execute(STAGING_SQL)
+
+        rejected_file = None
+        for batch in read_fieldbook(path, batch_size):
+            stage = time.perf_counter()
+            accepted, rejected = check_fieldbook(batch, trial, default_observer, lookups)
+            timings['check'] += time.perf_counter() - stage
+            accepted_rows += accepted.height
+            rejected_rows += rejected.height
+
+            if rejected_path is not None and rejected.height:
+                if rejected_file is None:
+                    rejected_file = files.enter_context(open(rejected_path, 'wb'))
+                    rejected.write_csv(rejected_file)
+                else:
+                    rejected.write_csv(rejected_file, include_header=False)
+
+            if accepted.height and not dry_run:
+                stage = time.perf_counter()
+                years.update(accepted['date_time'].dt.year().unique().to_list())
+                copy_frame(cursor, accepted, STAGING_TABLE, batch_size)
+                timings['copy'] += time.perf_counter() - stage
+
+        if accepted_rows and not dry_run:
+            stage = time.perf_counter()
+            ensure_observation_partitions(years=years, years_ahead=0)
+            cursor.execute(MERGE_SQL)
+            timings['merge'] = time.perf_counter() - stage
+
+            # The set based insert skips the signals that keep these up to date
+            stage = time.perf_counter()
+            bump_table_version(Observation)
+            add_staged_observations(STAGING_TABLE)
+            timings['summaries'] = time.perf_counter() - stage
+
+    elapsed = time.perf_counter() - started
+    rows = accepted_rows + rejected_rows
+
+    return {
+        'rows': rows,
+        'created': 0 if dry_run else accepted_rows,
+        'rejected': rejected_rows,
+        'seconds': elapsed,
+        'rows_per_second': rows / elapsed if elapsed else None,
+        'timings': timings,
+    }
@@ -0,0 +1,140 @@
+"""
+Data Storage Germplasm Resolver
+
+Field sheets spell germplasm many ways ("H-1", "h1", "Hybrid One"). The resolver keeps every germplasm
+name and alias in memory, keyed by a normalized form, plus a trigram index over those keys for near
+matches, so a whole sheet column resolves without a query per row.
+
+Like the ontology registry it is kept in a config.versioned_cache.VersionedCache, invalidated on save
+through the receivers connected in DataStorageConfig.ready.
+"""
+
+# Standard imports
+import re
+import unicodedata
+from collections import defaultdict
+
+# App imports
+from config.versioned_cache import VersionedCache
+from .models import Germplasm, GermplasmAlias
+
+GERMPLASM_MODELS = [Germplasm, GermplasmAlias]
+
+# Smallest trigram similarity (Dice coefficient) accepted as a near match
+MATCH_THRESHOLD = 0.6
+
+class MatchType:
+    EXACT = 'exact'
+    NEAR = 'near'
+    AMBIGUOUS = 'ambiguous'
+
+def normalize_name(name):
+    """ Case, accent, whitespace and punctuation insensitive form of a germplasm name """
+    name = unicodedata.normalize('NFKD', str(name)).encode('ascii', 'ignore').decode()
+    return re.sub(r'[^0-9a-z]+', '', name.casefold())
+
+def trigrams(key):
+    """ Character trigrams of a normalized name, padded so short names still get some """
+    padded = f'  {key} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+class GermplasmResolver:
+    """
+    Snapshot of the germplasm names and aliases, indexed by normalized name and by trigram
+    """
+
+    def __init__(self, version=None):
+        self.version = version
+
+        self.germplasm = dict(Germplasm.objects.values_list('db_id', 'name'))
+        names = [(name, db_id) for db_id, name in self.germplasm.items()]
+        names += list(GermplasmAlias.objects.values_list('alias', 'germplasm_id'))
+
+        # A normalized key naming two different germplasm is ambiguous and never resolves on its own
+        candidates = defaultdict(set)
+        for name, db_id in names:
+            key = normalize_name(name)
+            if key:
+                candidates[key].add(db_id)
+        self.keys = {key: next(iter(ids)) for key, ids in candidates.items() if len(ids) == 1}
+        self.ambiguous = {key: sorted(ids) for key, ids in candidates.items() if len(ids) > 1}
+
+        self.grams = {key: trigrams(key) for key in candidates}
+        self.index = defaultdict(set)
+        for key, grams in self.grams.items():
+            for gram in grams:
+                self.index[gram].add(key)
+
+    def near(self, key, threshold=MATCH_THRESHOLD):
+        """ Best scoring known key sharing trigrams with key, as (key, score), or (None, 0) """
+        grams = trigrams(key)
+        shared = defaultdict(int)
+        for gram in grams:
+            for candidate in self.index.get(gram, ()):
+                shared[candidate] += 1
+
+        best, best_score = None, 0.0
+        for candidate, count in shared.items():
+            score = 2 * count / (len(grams) + len(self.grams[candidate]))
+            if score > best_score or (score == best_score and best is not None and candidate < best):
+                best, best_score = candidate, score
+
+        if best_score < threshold:
+            return None, 0.0
+        return best, best_score
+
+    def match(self, name, fuzzy=True, threshold=MATCH_THRESHOLD):
+        """ Resolve one name, see resolve """
+        key = normalize_name(name) if name is not None else ''
+        result = {'name': name, 'germplasm_id': None, 'germplasm': None, 'match': None, 'score': None, 'candidates': []}
+        if not key:
+            return result
+
+        score = 1.0
+        match = MatchType.EXACT
+        if key not in self.keys and key not in self.ambiguous and fuzzy:
+            key, score = self.near(key, threshold)
+            match = MatchType.NEAR
+
+        if key in self.keys:
+            db_id = self.keys[key]
+            result.update({'germplasm_id': db_id, 'germplasm': self.germplasm[db_id], 'match': match, 'score': score})
+        elif key in self.ambiguous:
+            result.update({'match': MatchType.AMBIGUOUS, 'score': score, 'candidates': self.ambiguous[key]})
+
+        return result
+
+    def resolve(self, names, fuzzy=True, threshold=MATCH_THRESHOLD):
+        """
+        Resolve a column of names in one call, returning one result per name in order:
+        {'name', 'germplasm_id', 'germplasm', 'match', 'score', 'candidates'}.
+        match is 'exact', 'near', 'ambiguous' (see candidates) or None when nothing matched.
+        """
+        unique = {}
+        for name in names:
+            if name not in unique:
+                unique[name] = self.match(name, fuzzy=fuzzy, threshold=threshold)
+
+        return [dict(unique[name]) for name in names]
+
+    def lookup(self, names, fuzzy=False, threshold=MATCH_THRESHOLD):
+        """ {name: germplasm db_id} of the names that resolved, for importers building foreign keys """
+        return {
+            result['name']: result['germplasm_id']
+            for result in self.resolve(set(names), fuzzy=fuzzy, threshold=threshold)
+            if result['germplasm_id'] is not None
+        }
+
+_resolver = VersionedCache(GermplasmResolver, *GERMPLASM_MODELS)
+
+def get_germplasm_resolver():
+    """ The process's germplasm resolver, reloaded once a germplasm or alias changed """
+    return _resolver.get()
+
+def resolve_germplasm(names, fuzzy=True, threshold=MATCH_THRESHOLD):
+    """ Resolve a column of germplasm names against the current resolver """
+    return get_germplasm_resolver().resolve(names, fuzzy=fuzzy, threshold=threshold)
+
+def invalidate_germplasm_resolver(**kwargs):
+    """ Drop the process's resolver, connected to the save and delete signals of the germplasm models """
+    _resolver.invalidate()
@@ -0,0 +1,84 @@
+"""
+Plot Hierarchy Helpers
+"""
+
+# Django imports
+from django.db import connection
+from django.db.models import CharField, Count, Avg, Min, Max, Func, Value
+
+# App imports
+from .models import Plot
+
+# Recompute every materialized path top down, optionally for the plots of one trial
+PLOT_PATH_SQL = """
+    WITH RECURSIVE tree (db_id, path) AS (
+        SELECT db_id, '/' || db_id || '/'
+        FROM data_storage_plot
+        WHERE parent_plot_id_id IS NULL {trial_filter}
+        UNION ALL
+        SELECT child.db_id, tree.path || child.db_id || '/'
+        FROM data_storage_plot child
+        JOIN tree ON child.parent_plot_id_id = tree.db_id
+    )
+    UPDATE data_storage_plot plot
+    SET path = tree.path
+    FROM tree
+    WHERE plot.db_id = tree.db_id AND plot.path IS DISTINCT FROM tree.path
+"""
+
+class RootPlot(Func):
+    """
+    db_id of the top level plot owning a plot, read from a materialized path expression
+    """
+    function = 'SPLIT_PART'
+    output_field = CharField()
+
+    def __init__(self, path, **extra):
+        super().__init__(path, Value('/'), Value(2), **extra)
+
+def build_plot_tree(nodes, key='db_id', parent_key='parent_plot_id'):
+    """
+    Nest a flat list of plot dicts under their parent plots in one pass.
+    Returns the root plots (main plots, or plots whose parent is not in the list),
+    each with a 'children' list of its subplots.
+    """
+    by_id = {node[key]: node for node in nodes}
+    roots = []
+
+    for node in nodes:
+        node.setdefault('children', [])
+        parent = by_id.get(node[parent_key])
+        if parent is None:
+            roots.append(node)
+        else:
+            parent.setdefault('children', []).append(node)
+
+    return roots
+
+def rebuild_plot_paths(trial=None):
+    """
+    Recompute Plot.path for every plot, or the plots of one trial, in one statement.
+    Needed after writes that skip Plot.save, such as bulk_create or queryset updates of parent_plot_id.
+    Returns the number of plots whose path changed.
+    """
+    params = []
+    trial_filter = ''
+    if trial is not None:
+        trial_filter = 'AND trial_id_id = %s'
+        params.append(getattr(trial, 'pk', trial))
+
+    with connection.cursor() as cursor:
+        cursor.execute(PLOT_PATH_SQL.format(trial_filter=trial_filter), params)
+        return cursor.rowcount
+
+def rollup_to_main_plots(observations, path='plot_crop_id__plot_id__path'):
+    """
+    Group an Observation queryset by the top level plot that owns each observation's plot,
+    returning one row per main plot and variable with the count, mean, min and max numeric value.
+    """
+    return observations.annotate(main_plot_id=RootPlot(path)).values('main_plot_id', 'variable_id').annotate(
+        n=Count('pk'),
+        mean=Avg('value_num'),
+        min_value=Min('value_num'),
+        max_value=Max('value_num')
+    ).order_by('main_plot_id', 'variable_id')
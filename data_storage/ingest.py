@@ -0,0 +1,126 @@
+"""
+Data Storage Bulk Ingest
+"""
+
+# Standard imports
+from collections import defaultdict
+
+# Django imports
+from django.db import transaction
+
+# External imports
+import numpy as np
+import pandas as pd
+
+# App imports
+from config.enumerations import ScaleDataType, NUMERIC_SCALE_TYPES
+from resources.models import Person
+from ontology.registry import get_ontology
+from .models import PlotCrop, Observation, bump_table_version
+from .summaries import add_observations
+from .partitions import ensure_observation_partitions
+
+OBSERVATION_FIELDS = ['date_time', 'observer_id', 'plot_crop_id', 'variable_id', 'value']
+
+def ingest_observations(rows, batch_size=5000):
+    """
+    Validate a batch of observation rows as a whole and bulk insert the valid ones.
+    Returns the number of created observations and a per-row error report.
+    """
+    errors = defaultdict(dict)
+
+    # Rows that are not objects can't be validated any further
+    is_object = np.array([isinstance(row, dict) for row in rows], dtype=bool)
+    for i in np.flatnonzero(~is_object):
+        errors[i]['non_field_errors'] = ['Expected an object.']
+    records = [row if isinstance(row, dict) else {} for row in rows]
+
+    df = pd.DataFrame.from_records(records, columns=OBSERVATION_FIELDS, index=range(len(records)))
+
+    # Required fields
+    for field in OBSERVATION_FIELDS:
+        missing = is_object & (df[field].isna() | (df[field].astype(str).str.strip() == '')).to_numpy()
+        for i in np.flatnonzero(missing):
+            errors[i][field] = ['This field is required.']
+
+    # Timestamps
+    date_times = pd.to_datetime(df['date_time'], errors='coerce', utc=True, format='ISO8601')
+    bad_dates = date_times.isna() & df['date_time'].notna()
+    for i in np.flatnonzero(bad_dates.to_numpy()):
+        errors[i]['date_time'] = ['Enter a valid ISO 8601 date/time.']
+
+    # Foreign keys, one query per related table
+    observer_ids = set(Person.objects.filter(
+        db_id__in=df['observer_id'].dropna().unique().tolist()
+    ).values_list('db_id', flat=True))
+    plot_crop_ids = set(PlotCrop.objects.filter(
+        db_id__in=df['plot_crop_id'].dropna().unique().tolist()
+    ).values_list('db_id', flat=True))
+    # Variables come from the in memory ontology registry
+    variables = {
+        variable.label: (variable.min_value, variable.max_value, variable.scale_id.data_type)
+        for variable in get_ontology().variables.values()
+    }
+
+    for field, known in [('observer_id', observer_ids), ('plot_crop_id', plot_crop_ids), ('variable_id', variables)]:
+        unknown = df[field].notna() & ~df[field].isin(list(known))
+        for i in np.flatnonzero(unknown.to_numpy()):
+            errors[i][field] = [f"Unknown {field} '{df.at[i, field]}'."]
+
+    # Typed values and variable bounds, checked for the whole batch at once
+    variable = df['variable_id'].map(variables)
+    min_values = variable.map(lambda v: v[0] if isinstance(v, tuple) and v[0] is not None else np.nan).to_numpy(dtype=float)
+    max_values = variable.map(lambda v: v[1] if isinstance(v, tuple) and v[1] is not None else np.nan).to_numpy(dtype=float)
+    data_types = variable.map(lambda v: v[2] if isinstance(v, tuple) else None)
+
+    numeric = data_types.isin(NUMERIC_SCALE_TYPES).to_numpy()
+    dated = (data_types == ScaleDataType.DATE).to_numpy()
+    present = df['value'].notna().to_numpy()
+
+    values = pd.to_numeric(df['value'], errors='coerce').to_numpy(dtype=float)
+    values = np.where(np.isfinite(values), values, np.nan)
+    dates = pd.to_datetime(df['value'].astype(str).str.strip().str[:10], errors='coerce', format='%Y-%m-%d')
+
+    bounded = ~np.isnan(min_values) | ~np.isnan(max_values)
+    not_numeric = (numeric | bounded) & np.isnan(values) & present
+    not_date = dated & dates.isna().to_numpy() & present
+    too_small = values < min_values
+    too_large = values > max_values
+
+    for i in np.flatnonzero(not_numeric):
+        errors[i]['value'] = ['The observation value must be numeric for this variable.']
+    for i in np.flatnonzero(not_date):
+        errors[i]['value'] = ['The observation value must be an ISO date (YYYY-MM-DD) for this variable.']
+    for i in np.flatnonzero(too_small):
+        errors[i]['value'] = [f"The observation value cannot be less than the variable's minimum allowed value ({min_values[i]})."]
+    for i in np.flatnonzero(too_large):
+        errors[i]['value'] = [f"The observation value cannot be greater than the variable's maximum allowed value ({max_values[i]})."]
+
+    # Insert everything that passed
+    valid = np.ones(len(df), dtype=bool)
+    valid[list(errors.keys())] = False
+
+    observations = [
+        Observation(
+            date_time=date_times.iat[i].to_pydatetime(),
+            observer_id_id=df.at[i, 'observer_id'],
+            plot_crop_id_id=df.at[i, 'plot_crop_id'],
+            variable_id_id=df.at[i, 'variable_id'],
+            value=str(df.at[i, 'value']),
+            value_num=float(values[i]) if numeric[i] else None,
+            value_date=dates.iat[i].date() if dated[i] else None
+        )
+        for i in np.flatnonzero(valid)
+    ]
+    # New seasons get their own partition instead of landing in the default one
+    ensure_observation_partitions(years={obs.date_time.year for obs in observations}, years_ahead=0)
+    with transaction.atomic():
+        Observation.objects.bulk_create(observations, batch_size=batch_size)
+        # bulk_create skips the post_save signals
+        if observations:
+            bump_table_version(Observation)
+            add_observations([(obs.plot_crop_id_id, obs.variable_id_id, obs.value_num) for obs in observations])
+
+    report = [{'row': int(i), 'errors': errors[i]} for i in sorted(errors)]
+
+    return len(observations), report
@@ -0,0 +1,195 @@
+"""
+Observation Query Benchmark
+
+Seeds synthetic observations onto the existing plot crops and numeric variables, runs the hot
+observation queries under EXPLAIN ANALYZE and reports the median timings and the indexes used.
+Run it before and after an index change so the decision is measured, not guessed.
+"""
+import json
+import statistics
+import time
+from datetime import datetime, timedelta, timezone
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from config.enumerations import NUMERIC_SCALE_TYPES
+from resources.models import Person
+from ontology.models import Variable
+from data_storage.models import PlotCrop, Observation, bump_table_version
+from data_storage.summaries import rebuild_summaries
+from data_storage.partitions import ensure_observation_partitions
+
+# Synthetic rows get KSUIDs with a zero timestamp, which no real id has, so they can be removed
+# with a primary key range scan without touching real data
+BENCHMARK_ID_END = b'\x00\x00\x00\x01'
+
+SEED_SQL = """
+    INSERT INTO data_storage_observation
+        (db_id, date_time, observer_id_id, plot_crop_id_id, variable_id_id, value, value_num)
+    SELECT
+        decode('00000000' || md5(g::text), 'hex'),
+        %(start)s::timestamptz + random() * interval '5 years',
+        %(observer)s,
+        (%(plot_crops)s::text[])[1 + floor(random() * %(n_plot_crops)s)::int],
+        (%(variables)s::text[])[1 + floor(random() * %(n_variables)s)::int],
+        v::text,
+        v
+    FROM (
+        SELECT g, round((random() * 400)::numeric, 2)::float8 AS v
+        FROM generate_series(%(first)s, %(last)s) AS g
+    ) AS series
+"""
+
+START = datetime(2020, 1, 1, tzinfo=timezone.utc)
+
+def benchmark_queries(plot_crop, variable):
+    """
+    The observation access patterns to time, as (name, queryset) pairs
+    """
+    window = (START + timedelta(days=365), START + timedelta(days=365 + 90))
+    return [
+        (
+            'plot_crop_variable_series',
+            Observation.objects.filter(plot_crop_id=plot_crop, variable_id=variable).order_by('date_time')
+                .values_list('date_time', 'value_num')
+        ),
+        (
+            'plot_crop_variable_latest',
+            Observation.objects.filter(plot_crop_id=plot_crop, variable_id=variable).order_by('-date_time')
+                .values_list('date_time', 'value_num')[:1]
+        ),
+        (
+            'variable_date_range',
+            Observation.objects.filter(variable_id=variable, date_time__range=window).values_list('date_time', 'value_num')
+        ),
+        (
+            'plot_crop_all_variables',
+            Observation.objects.filter(plot_crop_id=plot_crop).order_by('variable_id', 'date_time')
+                .values_list('variable_id', 'date_time', 'value_num')
+        ),
+        (
+            'variable_value_range',
+            Observation.objects.filter(variable_id=variable, value_num__gte=100, value_num__lt=110).values_list('value_num')
+        ),
+    ]
+
+def parent_index_names():
+    """ Map the indexes of every partition to the partitioned index they belong to """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT child.relname, parent.relname FROM pg_inherits "
+            "JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+            "JOIN pg_class parent ON parent.oid = pg_inherits.inhparent "
+            "WHERE child.relkind = 'i'"
+        )
+        return dict(cursor.fetchall())
+
+def plan_indexes(node, parents):
+    """ Every index name used anywhere in an EXPLAIN (FORMAT JSON) plan node, partition indexes reported by their parent """
+    indexes = {parents.get(node['Index Name'], node['Index Name'])} if 'Index Name' in node else set()
+    for child in node.get('Plans', []):
+        indexes |= plan_indexes(child, parents)
+    return indexes
+
+
+class Command(BaseCommand):
+    help = "Seed synthetic observations and record EXPLAIN ANALYZE timings of the hot observation queries"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=1_000_000, help='Number of observations to seed')
+        parser.add_argument('--batch-size', type=int, default=500_000, help='Observations inserted per statement')
+        parser.add_argument('--repeat', type=int, default=5, help='Runs per query, the median is reported')
+        parser.add_argument('--seed', type=float, default=0.42, help='Postgres random seed in [-1, 1]')
+        parser.add_argument('--output', default=None, help='Write the results as JSON to this path')
+        parser.add_argument('--keep', action='store_true', help='Keep the seeded observations afterwards')
+        parser.add_argument('--skip-seed', action='store_true', help='Benchmark the observations already in the table')
+
+    def handle(self, *args, **options):
+        plot_crops = list(PlotCrop.objects.values_list('db_id', flat=True))
+        variables = list(
+            Variable.objects.filter(scale_id__data_type__in=NUMERIC_SCALE_TYPES).values_list('label', flat=True)
+        )
+        observer = Person.objects.values_list('db_id', flat=True).first()
+        if not plot_crops or not variables or observer is None:
+            raise CommandError('Benchmarking needs at least one plot crop, numeric variable and person')
+
+        if not options['skip_seed']:
+            self.seed(options['rows'], options['batch_size'], options['seed'], plot_crops, variables, observer)
+
+        try:
+            results = self.run_queries(plot_crops[0], variables[0], options['repeat'])
+        finally:
+            if not options['skip_seed'] and not options['keep']:
+                self.cleanup()
+
+        if not options['skip_seed'] and options['keep']:
+            # The seed bypasses the ORM, bring the derived tables up to date
+            bump_table_version(Observation)
+            rebuild_summaries()
+
+        report = {
+            'rows': Observation.objects.count() if options['skip_seed'] or options['keep'] else options['rows'],
+            'repeat': options['repeat'],
+            'queries': results,
+        }
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(report, f, indent=2)
+            self.stdout.write(f"Wrote {options['output']}")
+
+    def seed(self, rows, batch_size, seed, plot_crops, variables, observer):
+        """ Insert synthetic observations with set based INSERT ... SELECT statements """
+        ensure_observation_partitions(years=range(START.year, START.year + 6), years_ahead=0)
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT setseed(%s)', [seed])
+            for first in range(1, rows + 1, batch_size):
+                last = min(first + batch_size - 1, rows)
+                started = time.perf_counter()
+                with transaction.atomic():
+                    cursor.execute(SEED_SQL, {
+                        'start': START,
+                        'observer': observer,
+                        'plot_crops': plot_crops,
+                        'n_plot_crops': len(plot_crops),
+                        'variables': variables,
+                        'n_variables': len(variables),
+                        'first': first,
+                        'last': last,
+                    })
+                self.stdout.write(f'Seeded {last:,} / {rows:,} observations ({time.perf_counter() - started:.1f}s)')
+            cursor.execute('ANALYZE data_storage_observation')
+
+    def cleanup(self):
+        with connection.cursor() as cursor:
+            cursor.execute('DELETE FROM data_storage_observation WHERE db_id < %s', [BENCHMARK_ID_END])
+            cursor.execute('ANALYZE data_storage_observation')
+        self.stdout.write('Removed the seeded observations')
+
+    def run_queries(self, plot_crop, variable, repeat):
+        """ EXPLAIN ANALYZE every benchmark query, returning the median timings and the indexes of the plan """
+        results = {}
+        parents = parent_index_names()
+        self.stdout.write(f"{'query':<28}{'plan ms':>10}{'exec ms':>10}{'rows':>10}  indexes")
+        for name, queryset in benchmark_queries(plot_crop, variable):
+            planning = []
+            execution = []
+            for _ in range(repeat):
+                plan = json.loads(queryset.explain(format='json', analyze=True, buffers=True))[0]
+                planning.append(plan['Planning Time'])
+                execution.append(plan['Execution Time'])
+
+            results[name] = {
+                'sql': str(queryset.query),
+                'planning_ms': statistics.median(planning),
+                'execution_ms': statistics.median(execution),
+                'rows': plan['Plan']['Actual Rows'],
+                'node': plan['Plan']['Node Type'],
+                'indexes': sorted(plan_indexes(plan['Plan'], parents)),
+            }
+            self.stdout.write(
+                f"{name:<28}{results[name]['planning_ms']:>10.3f}{results[name]['execution_ms']:>10.3f}"
+                f"{results[name]['rows']:>10}  {', '.join(results[name]['indexes']) or results[name]['node']}"
+            )
+
+        return results
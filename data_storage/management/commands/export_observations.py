@@ -0,0 +1,32 @@
+"""
+Columnar Export of Trial Observations
+"""
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Q
+
+from data_storage.models import Trial
+from data_storage.exports import EXPORT_FORMATS, observation_frame, write_frame
+
+
+class Command(BaseCommand):
+    help = "Export a trial's observations as Parquet, Arrow IPC or CSV"
+
+    def add_arguments(self, parser):
+        parser.add_argument('trial', help='Trial name or db_id')
+        parser.add_argument('--year', type=int, default=None, help='Only export this plot crop year')
+        parser.add_argument('--format', dest='file_format', choices=list(EXPORT_FORMATS), default='parquet')
+        parser.add_argument('--output', default=None, help='Output file path (defaults to <trial>.<format>)')
+
+    def handle(self, *args, **options):
+        try:
+            trial = Trial.objects.get(Q(name=options['trial']) | Q(db_id=options['trial']))
+        except Trial.DoesNotExist:
+            raise CommandError(f"Trial '{options['trial']}' does not exist")
+
+        file_format = options['file_format']
+        output = options['output'] or f"{trial.name}.{EXPORT_FORMATS[file_format]['extension']}"
+
+        df = observation_frame(trial, year=options['year'])
+        write_frame(df, file_format, output)
+
+        self.stdout.write(self.style.SUCCESS(f'Exported {df.height} observations to {output}'))
@@ -0,0 +1,370 @@
+"""
+Synthetic Load Data
+
+Generates production sized trials for profiling and load testing: nested split plot layouts,
+plot crops and treatment assignments for every year, and numeric observations drawn with NumPy
+from a block + treatment + year effects model. Everything is reproducible from --seed, ids included:
+trial rows draw their ids from the seeded generator, and the synthetic rows every seed shares (variables,
+germplasm, treatments, people and locations) derive theirs from their names. Organizations and projects
+are picked in name order from the populate_initial_db seed data, their ids are that data's.
+Metadata rows go in with bulk_create, observations are streamed into the table with COPY.
+"""
+import hashlib
+import time
+from datetime import datetime, timezone
+from decimal import Decimal
+
+import numpy as np
+import polars as pl
+from ksuid import Ksuid
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from config.custom_fields import KSUID_EPOCH
+from config.enumerations import ScaleDataType, PlotType, VariableType, GermplasmType, TreatmentType, LocationType
+from resources.models import Organization, Person, Project, Location
+from ontology.models import TraitEntity, TraitAttribute, VarTrait, VarMethod, VarScale, Variable
+from ontology.registry import invalidate_ontology
+from data_storage.models import Trial, TrialYear, TrialTreatment, Treatment, TreatmentLevel
+from data_storage.models import Germplasm, Plot, PlotCrop, PlotTreatment, Observation, bump_table_version
+from data_storage.germplasm import invalidate_germplasm_resolver
+from data_storage.fieldbook import copy_frame
+from data_storage.partitions import ensure_observation_partitions
+from data_storage.summaries import rebuild_summaries
+
+SPLIT_PLOT_TYPES = [PlotType.MAIN_PLOT, PlotType.SPLIT_PLOT, PlotType.SPLIT_SPLIT_PLOT, PlotType.SPLIT_SPLIT_SPLIT_PLOT]
+
+OBSERVATION_COLUMNS = ['db_id', 'date_time', 'observer_id_id', 'plot_crop_id_id', 'variable_id_id', 'value', 'value_num']
+
+# Main plot size, split plots divide the width of their parent
+PLOT_WIDTH_M = Decimal('6')
+PLOT_LENGTH_M = Decimal('12')
+
+# Observations are spread over a growing season starting May 1st
+SEASON_DAYS = 180
+
+# Synthetic observers and trial managers, and trial locations
+SYNTHETIC_PEOPLE = 10
+SYNTHETIC_LOCATIONS = 4
+
+HEX_BYTES = np.array([f'{i:02x}' for i in range(256)])
+
+def ksuid_timestamp(year):
+    """ KSUID timestamp bytes of January 1st of a year, so generated ids don't depend on the wall clock """
+    seconds = int(datetime(year, 1, 1, tzinfo=timezone.utc).timestamp()) - KSUID_EPOCH
+    return np.frombuffer(seconds.to_bytes(4, 'big'), dtype=np.uint8)
+
+def ksuid_bytes(rng, n, timestamp):
+    """ (n, 20) uint8 array of KSUIDs sharing a timestamp with random payloads """
+    ids = np.empty((n, 20), dtype=np.uint8)
+    ids[:, :4] = timestamp
+    ids[:, 4:] = rng.integers(0, 256, size=(n, 16), dtype=np.uint8)
+    return ids
+
+def ksuids(rng, n, prefix, timestamp):
+    """ n prefixed KSUID strings, for the primary keys of bulk created rows """
+    return [f"{prefix}{Ksuid.from_bytes(row.tobytes())}" for row in ksuid_bytes(rng, n, timestamp)]
+
+def named_ksuid(model, name):
+    """ Prefixed KSUID of a shared synthetic row, derived from its unique name so any seed or database gives the same id """
+    payload = hashlib.sha256(f'{model._meta.label}:{name}'.encode()).digest()[:16]
+    return f"{model._meta.pk.prefix}{Ksuid.from_bytes(bytes(4) + payload)}"
+
+def bytea_hex(ids):
+    """ Postgres hex bytea literals of an (n, 20) uint8 array, built without a Python loop """
+    return np.char.add('\\x', np.ascontiguousarray(HEX_BYTES[ids]).view('<U40')[:, 0])
+
+class Command(BaseCommand):
+    help = "Generate reproducible synthetic trials, plots and observations for load testing"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--trials', type=int, default=10, help='Number of trials')
+        parser.add_argument('--blocks', type=int, default=4, help='Blocks per trial')
+        parser.add_argument('--plots', type=int, default=12, help='Main plots per block')
+        parser.add_argument('--split-levels', type=int, default=1, choices=range(len(SPLIT_PLOT_TYPES)), help='Nested split plot levels under each main plot')
+        parser.add_argument('--splits', type=int, default=2, help='Subplots per plot at every split level')
+        parser.add_argument('--years', type=int, default=3, help='Consecutive years per trial')
+        parser.add_argument('--start-year', type=int, default=2022, help='First year')
+        parser.add_argument('--variables', type=int, default=5, help='Synthetic numeric variables')
+        parser.add_argument('--germplasm', type=int, default=4, help='Synthetic germplasm entries')
+        parser.add_argument('--observations', type=int, default=3, help='Observations per plot crop, variable and year')
+        parser.add_argument('--main-levels', type=int, default=3, help='Treatment levels of the main plot factor')
+        parser.add_argument('--seed', type=int, default=42, help='Random seed, the same seed gives the same database')
+        parser.add_argument('--batch-size', type=int, default=1_000_000, help='Observations per COPY batch')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        self.rng = np.random.default_rng(options['seed'])
+        self.timestamp = ksuid_timestamp(options['start_year'])
+        self.options = options
+
+        prefix = f"synthetic_{options['seed']}_"
+        if Trial.objects.filter(name__startswith=prefix).exists():
+            raise CommandError(f"Synthetic trials for seed {options['seed']} already exist, pick another --seed")
+
+        organizations = list(Organization.objects.order_by('name'))
+        projects = list(Project.objects.order_by('name'))
+        if not organizations or not projects:
+            raise CommandError('Run populate_initial_db first, synthetic trials need organizations and projects')
+
+        self.people = self.create_people(organizations)
+        locations = self.create_locations()
+
+        variables = self.create_variables(options['variables'])
+        germplasm = self.create_germplasm(options['germplasm'])
+        treatments = self.create_treatments(options['split_levels'], options['main_levels'], options['splits'])
+        years = list(range(options['start_year'], options['start_year'] + options['years']))
+        ensure_observation_partitions(years=years, years_ahead=0)
+
+        # Effects shared by every trial: variable means and noise, treatment level and year effects
+        means = self.rng.uniform(20, 200, len(variables))
+        noise = means * self.rng.uniform(0.05, 0.15, len(variables))
+        level_effects = [self.rng.normal(0, 0.1, (len(levels), len(variables))) * means for _, levels in treatments]
+        year_effects = self.rng.normal(0, 0.05, (len(years), len(variables))) * means
+
+        total = 0
+        for i in range(options['trials']):
+            # The layout of a trial goes in as one transaction, observations follow in batches
+            with transaction.atomic():
+                trial = Trial.objects.bulk_create([Trial(
+                    db_id=ksuids(self.rng, 1, 'trial_', self.timestamp)[0],
+                    name=f"{prefix}{i:03d}",
+                    location_id=locations[self.rng.integers(len(locations))],
+                    manager_id_id=self.people[self.rng.integers(len(self.people))],
+                    project_id=projects[self.rng.integers(len(projects))],
+                    affiliation_id=organizations[self.rng.integers(len(organizations))],
+                    establishment_year=years[0],
+                    multi_year=len(years) > 1
+                )])[0]
+                TrialYear.objects.bulk_create([
+                    TrialYear(db_id=db_id, trial_id=trial, year=year)
+                    for db_id, year in zip(ksuids(self.rng, len(years), 'trialYear_', self.timestamp), years)
+                ])
+                TrialTreatment.objects.bulk_create([
+                    TrialTreatment(db_id=db_id, trial_id=trial, treatment_id=treatment)
+                    for db_id, (treatment, _) in zip(ksuids(self.rng, len(treatments), 'trialTreatment_', self.timestamp), treatments)
+                ])
+
+                plots, leaves = self.create_plots(trial, treatments)
+                block_effects = self.rng.normal(0, 0.08, (options['blocks'], len(variables))) * means
+                leaf_crops = [self.create_plot_crops(plots, leaves, year, germplasm, treatments) for year in years]
+
+            for y, year in enumerate(years):
+                effects = block_effects[leaves['block']] + year_effects[y]
+                for level in range(len(treatments)):
+                    effects = effects + level_effects[level][leaves['levels'][:, level]]
+
+                step = time.perf_counter()
+                created = self.load_observations(leaf_crops[y], variables, means + effects, noise, year)
+                total += created
+                self.stdout.write(
+                    f"{trial.name} {year}: {created:,} observations ({created / (time.perf_counter() - step):,.0f} rows/s)"
+                )
+
+            rebuild_summaries(trial)
+
+        # bulk_create and COPY skip the signals
+        for model in [Trial, TrialYear, TrialTreatment, Plot, PlotCrop, PlotTreatment, Observation]:
+            bump_table_version(model)
+        invalidate_ontology()
+        invalidate_germplasm_resolver()
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"Generated {options['trials']} trials and {total:,} observations in {elapsed:.1f}s"
+        ))
+
+    def create_variables(self, count):
+        """ The synthetic numeric variables, created on first use """
+        entity, _ = TraitEntity.objects.get_or_create(
+            label='synthetic entity', defaults={'db_id': named_ksuid(TraitEntity, 'synthetic entity')}
+        )
+        attribute, _ = TraitAttribute.objects.get_or_create(
+            label='synthetic attribute', defaults={'db_id': named_ksuid(TraitAttribute, 'synthetic attribute')}
+        )
+        trait, _ = VarTrait.objects.get_or_create(label='synthetic trait', defaults={
+            'db_id': named_ksuid(VarTrait, 'synthetic trait'), 'entity_id': entity, 'attribute_id': attribute
+        })
+        method, _ = VarMethod.objects.get_or_create(label='synthetic method', defaults={
+            'db_id': named_ksuid(VarMethod, 'synthetic method'), 'description': 'Generated for load testing'
+        })
+        scale, _ = VarScale.objects.get_or_create(label='synthetic scale', defaults={
+            'db_id': named_ksuid(VarScale, 'synthetic scale'), 'description': 'Generated for load testing',
+            'data_type': ScaleDataType.NUMERICAL
+        })
+
+        labels = []
+        for k in range(count):
+            label = f'synthetic_{k:03d}'
+            variable, _ = Variable.objects.get_or_create(label=label, defaults={
+                'db_id': named_ksuid(Variable, label), 'abbreviation': f'SYN{k:03d}', 'trait_id': trait,
+                'method_id': method, 'scale_id': scale, 'min_value': 0, 'type': VariableType.CORN
+            })
+            labels.append(variable.label)
+
+        return labels
+
+    def create_germplasm(self, count):
+        """ The synthetic germplasm entries, created on first use """
+        return [
+            Germplasm.objects.get_or_create(name=f'SYN-G{k:03d}', defaults={
+                'db_id': named_ksuid(Germplasm, f'SYN-G{k:03d}'), 'type': GermplasmType.CROP, 'genus': 'Zea', 'species': 'mays'
+            })[0].db_id
+            for k in range(count)
+        ]
+
+    def create_people(self, organizations):
+        """ The synthetic observers and trial managers, created on first use """
+        people = []
+        for k in range(SYNTHETIC_PEOPLE):
+            email = f'synthetic.person{k:02d}@example.com'
+            person, _ = Person.objects.get_or_create(email=email, defaults={
+                'db_id': named_ksuid(Person, email), 'first_name': 'Synthetic', 'last_name': f'Person {k:02d}',
+                'middle_initial': 'S', 'affiliation_id': organizations[k % len(organizations)]
+            })
+            people.append(person.db_id)
+
+        return people
+
+    def create_locations(self):
+        """ The synthetic trial locations, created on first use """
+        locations = []
+        for k in range(SYNTHETIC_LOCATIONS):
+            name = f'synthetic_location_{k:02d}'
+            location, _ = Location.objects.get_or_create(name=name, defaults={
+                'db_id': named_ksuid(Location, name), 'latitude': 40 + k / 10, 'longitude': -96 - k / 10,
+                'type': LocationType.TRIAL
+            })
+            locations.append(location)
+
+        return locations
+
+    def create_treatments(self, split_levels, main_levels, splits):
+        """ One treatment per plot level, the main plot factor and a factor per split level, with their levels """
+        treatments = []
+        for level in range(split_levels + 1):
+            plot_type = SPLIT_PLOT_TYPES[level]
+            name = f'Synthetic {plot_type.label}'
+            treatment, _ = Treatment.objects.get_or_create(name=name, defaults={
+                'db_id': named_ksuid(Treatment, name), 'type': TreatmentType.PLANTING,
+                'description': f'Synthetic {plot_type.label.lower()} factor'
+            })
+            count = main_levels if level == 0 else splits
+            labels = [f'{plot_type.value[0]}{level}-{j + 1}' for j in range(count)]
+            levels = [
+                TreatmentLevel.objects.get_or_create(treatment_id=treatment, level=label, defaults={
+                    'db_id': named_ksuid(TreatmentLevel, f'{name}:{label}')
+                })[0]
+                for label in labels
+            ]
+            treatments.append((treatment, levels))
+        return treatments
+
+    def create_plots(self, trial, treatments):
+        """
+        Bulk create the nested plots of a trial, with their materialized paths.
+        Returns every plot by level and, for the leaf plots, their block and treatment level per factor.
+        """
+        options = self.options
+        main_levels = len(treatments[0][1])
+
+        # Main plots, the main plot factor randomized within each block
+        n_main = options['blocks'] * options['plots']
+        ids = ksuids(self.rng, n_main, 'plot_', self.timestamp)
+        blocks = np.repeat(np.arange(options['blocks']), options['plots'])
+        factor = np.concatenate([self.rng.permutation(options['plots']) % main_levels for _ in range(options['blocks'])])
+        plots = [[
+            Plot(
+                db_id=db_id, trial_id=trial, block=str(block + 1), label=f'b{block + 1}_p{i % options["plots"] + 1}',
+                type=PlotType.MAIN_PLOT, width_m=PLOT_WIDTH_M, length_m=PLOT_LENGTH_M, path=f'/{db_id}/'
+            )
+            for i, (db_id, block) in enumerate(zip(ids, blocks))
+        ]]
+        levels = factor[:, None]
+
+        # Every split level splits each plot of the level above, the split factor randomized within the parent
+        for level in range(1, options['split_levels'] + 1):
+            parents = plots[-1]
+            splits = options['splits']
+            ids = ksuids(self.rng, len(parents) * splits, 'plot_', self.timestamp)
+            factor = np.concatenate([self.rng.permutation(splits) for _ in parents]) % len(treatments[level][1])
+            children = []
+            for i, db_id in enumerate(ids):
+                parent = parents[i // splits]
+                children.append(Plot(
+                    db_id=db_id, trial_id=trial, block=parent.block, label=f'{parent.label}.{i % splits + 1}',
+                    type=SPLIT_PLOT_TYPES[level], width_m=parent.width_m / splits, length_m=PLOT_LENGTH_M,
+                    parent_plot_id=parent, path=f'{parent.path}{db_id}/'
+                ))
+            plots.append(children)
+            blocks = np.repeat(blocks, splits)
+            levels = np.column_stack([np.repeat(levels, splits, axis=0), factor])
+
+        Plot.objects.bulk_create([plot for level in plots for plot in level], batch_size=5000)
+
+        return plots, {'block': blocks, 'levels': levels}
+
+    def create_plot_crops(self, plots, leaves, year, germplasm, treatments):
+        """
+        Bulk create one plot crop per plot for a year, a germplasm drawn per main plot and shared by its subplots,
+        and the treatment level of each plot crop's own level. Returns the db_ids of the leaf plot crops.
+        """
+        choice = self.rng.integers(len(germplasm), size=len(plots[0]))
+        crops = []
+        assignments = []
+        for level, level_plots in enumerate(plots):
+            per_main = len(level_plots) // len(plots[0])
+            ids = ksuids(self.rng, len(level_plots), 'plotCrop_', self.timestamp)
+            level_crops = [
+                PlotCrop(db_id=db_id, plot_id=plot, germplasm_id_id=germplasm[choice[i // per_main]], plot_year=year)
+                for i, (db_id, plot) in enumerate(zip(ids, level_plots))
+            ]
+            crops.extend(level_crops)
+
+            # Leaves carry every factor, plots of a level carry their own one
+            per_leaf = len(plots[-1]) // len(level_plots)
+            level_index = leaves['levels'][::per_leaf, level]
+            _, levels = treatments[level]
+            assignments.extend(
+                (crop, levels[index]) for crop, index in zip(level_crops, level_index)
+            )
+
+        PlotCrop.objects.bulk_create(crops, batch_size=5000)
+        PlotTreatment.objects.bulk_create([
+            PlotTreatment(db_id=db_id, plot_crop_id=crop, treatment_level_id=level)
+            for db_id, (crop, level) in zip(ksuids(self.rng, len(assignments), 'plotTreatment_', self.timestamp), assignments)
+        ], batch_size=5000)
+
+        return np.array([crop.db_id for crop in crops[-len(plots[-1]):]])
+
+    def load_observations(self, plot_crops, variables, expected, noise, year):
+        """
+        Draw the observations of every leaf plot crop and variable for a year and COPY them in.
+        expected is the (plot crop x variable) mean, noise the per variable standard deviation.
+        """
+        repeats = self.options['observations']
+        n = len(plot_crops) * len(variables) * repeats
+
+        crop_index = np.repeat(np.arange(len(plot_crops)), len(variables) * repeats)
+        variable_index = np.tile(np.repeat(np.arange(len(variables)), repeats), len(plot_crops))
+        values = np.round(np.maximum(
+            expected[crop_index, variable_index] + self.rng.normal(0, 1, n) * noise[variable_index], 0
+        ), 2)
+        seconds = self.rng.integers(0, SEASON_DAYS * 86400, n)
+        season = np.datetime64(f'{year}-05-01T00:00:00', 's')
+
+        frame = pl.DataFrame({
+            'db_id': bytea_hex(ksuid_bytes(self.rng, n, self.timestamp)),
+            'date_time': pl.Series((season + seconds.astype('timedelta64[s]')).astype('datetime64[us]')).dt.replace_time_zone('UTC'),
+            'observer_id_id': np.array(self.people)[self.rng.integers(len(self.people), size=n)],
+            'plot_crop_id_id': plot_crops[crop_index],
+            'variable_id_id': np.array(variables)[variable_index],
+            'value': pl.Series(values).cast(pl.String),
+            'value_num': values,
+        }).select(OBSERVATION_COLUMNS)
+
+        with transaction.atomic(), connection.cursor() as cursor:
+            copy_frame(cursor, frame, Observation._meta.db_table, self.options['batch_size'])
+
+        return n
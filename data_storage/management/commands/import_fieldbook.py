@@ -0,0 +1,62 @@
+"""
+Streaming Field Book Import
+
+Bulk loads a season field book (CSV or ODS) of observations through a COPY staging table,
+see data_storage.fieldbook for the accepted layouts.
+"""
+import json
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Q
+
+from data_storage.models import Trial
+from data_storage.fieldbook import FieldBookError, import_fieldbook
+
+
+class Command(BaseCommand):
+    help = "Import a field book of observations for a trial, writing rejected rows to a side file"
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Field book CSV or ODS file')
+        parser.add_argument('trial', help='Trial name or db_id the plot labels belong to')
+        parser.add_argument('--observer', default=None, help='Person db_id or email for files without an observer column')
+        parser.add_argument('--batch-size', type=int, default=100_000, help='Rows read, checked and copied per batch')
+        parser.add_argument('--rejected', default=None, help='Rejected rows file (defaults to <file>.rejected.csv)')
+        parser.add_argument('--dry-run', action='store_true', help='Only check the rows and write the rejected file')
+        parser.add_argument('--json', action='store_true', help='Print the report as JSON')
+
+    def handle(self, *args, **options):
+        try:
+            trial = Trial.objects.get(Q(name=options['trial']) | Q(db_id=options['trial']))
+        except Trial.DoesNotExist:
+            raise CommandError(f"Trial '{options['trial']}' does not exist")
+
+        path = Path(options['path'])
+        if not path.exists():
+            raise CommandError(f"File '{path}' does not exist")
+        rejected_path = options['rejected'] or str(path.with_suffix('.rejected.csv'))
+
+        try:
+            report = import_fieldbook(
+                path, trial,
+                default_observer=options['observer'],
+                batch_size=options['batch_size'],
+                rejected_path=rejected_path,
+                dry_run=options['dry_run']
+            )
+        except FieldBookError as e:
+            raise CommandError(str(e))
+
+        if options['json']:
+            self.stdout.write(json.dumps(report, indent=2))
+            return
+
+        for stage, seconds in report['timings'].items():
+            self.stdout.write(f'{stage:<12}{seconds:>8.2f}s')
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {report['created']:,} of {report['rows']:,} rows "
+            f"in {report['seconds']:.2f}s ({report['rows_per_second'] or 0:,.0f} rows/s)"
+        ))
+        if report['rejected']:
+            self.stdout.write(self.style.WARNING(f"Rejected {report['rejected']:,} rows, see {rejected_path}"))
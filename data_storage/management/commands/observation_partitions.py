@@ -0,0 +1,32 @@
+"""
+Observation Partition Maintenance
+"""
+from django.core.management.base import BaseCommand, CommandError
+
+from data_storage.partitions import is_partitioned, year_partitions, ensure_observation_partitions, detach_year_partition
+
+
+class Command(BaseCommand):
+    help = "Create the upcoming yearly observation partitions, or detach an old season for archiving"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--years-ahead', type=int, default=1, help='Create partitions through this many years from now')
+        parser.add_argument('--detach', type=int, default=None, metavar='YEAR', help='Detach the partition of this season')
+
+    def handle(self, *args, **options):
+        if not is_partitioned():
+            raise CommandError('The observation table is not partitioned, run the data_storage migrations first')
+
+        if options['detach'] is not None:
+            if not detach_year_partition(options['detach']):
+                raise CommandError(f"There is no partition for {options['detach']}")
+            self.stdout.write(self.style.SUCCESS(
+                f"Detached the {options['detach']} partition, run rebuild_summaries to drop it from the summaries"
+            ))
+            return
+
+        created = ensure_observation_partitions(years_ahead=options['years_ahead'])
+        for year in created:
+            self.stdout.write(f'Created the {year} partition')
+
+        self.stdout.write(self.style.SUCCESS(f"Partitions: {', '.join(map(str, year_partitions()))}"))
@@ -1,6 +1,17 @@
 """
 Initial PostgreSQL DB Population
+
+Every table is bulk loaded: rows are built in memory, foreign keys resolved through lookup dicts
+and written with one bulk_create per table. bulk_create skips the model signals, so the table
+versions and in process registries are brought up to date at the end.
+
+The plot list and SOP documents files are synced through the import ledger instead, so re-running
+the command after editing them applies just the inserted, changed and deleted rows.
 """
+import time
+from contextlib import contextmanager
+from decimal import Decimal, InvalidOperation
+
 from django.core.management.base import BaseCommand, CommandError
 from django.db import transaction
 from django.contrib.auth.models import User
@@ -13,9 +24,13 @@ from data_storage.models import Trial, TrialYear, TrialAttribute, TrialEvent
 from data_storage.models import Treatment, TreatmentLevel, TrialTreatment
 from data_storage.models import CommonName, Germplasm, GermplasmAlias
 from data_storage.models import Plot, PlotCrop, PlotTreatment, PlotType
+from data_storage.models import bump_table_version
+from data_storage.germplasm import invalidate_germplasm_resolver
+from data_storage.ledger import LedgerError, sync_source
 
 # Ontology models
 from ontology.models import TraitEntity, TraitAttribute, VarTrait, VarScale, VarMethod, Variable, SopDocument, AgroProcess
+from ontology.registry import invalidate_ontology
 
 # Imaging Models
 from imaging.models import Image, ImageOperation, AwsModel
@@ -23,332 +38,525 @@ from imaging.models import Image, ImageOperation, AwsModel
 
 from faker import Faker
 import random
-import pandas as pd
 import polars as pl
 
 faker = Faker()
 
+US_STATES_AND_ABBREVIATIONS = [
+    ("Alabama", "AL"), ("Alaska", "AK"), ("Arizona", "AZ"), ("Arkansas", "AR"),
+    ("California", "CA"), ("Colorado", "CO"), ("Connecticut", "CT"), ("Delaware", "DE"),
+    ("Florida", "FL"), ("Georgia", "GA"), ("Hawaii", "HI"), ("Idaho", "ID"),
+    ("Illinois", "IL"), ("Indiana", "IN"), ("Iowa", "IA"), ("Kansas", "KS"),
+    ("Kentucky", "KY"), ("Louisiana", "LA"), ("Maine", "ME"), ("Maryland", "MD"),
+    ("Massachusetts", "MA"), ("Michigan", "MI"), ("Minnesota", "MN"), ("Mississippi", "MS"),
+    ("Missouri", "MO"), ("Montana", "MT"), ("Nebraska", "NE"), ("Nevada", "NV"),
+    ("New Hampshire", "NH"), ("New Jersey", "NJ"), ("New Mexico", "NM"), ("New York", "NY"),
+    ("North Carolina", "NC"), ("North Dakota", "ND"), ("Ohio", "OH"), ("Oklahoma", "OK"),
+    ("Oregon", "OR"), ("Pennsylvania", "PA"), ("Rhode Island", "RI"), ("South Carolina", "SC"),
+    ("South Dakota", "SD"), ("Tennessee", "TN"), ("Texas", "TX"), ("Utah", "UT"),
+    ("Vermont", "VT"), ("Virginia", "VA"), ("Washington", "WA"), ("West Virginia", "WV"),
+    ("Wisconsin", "WI"), ("Wyoming", "WY")
+]
+
+# Addresses with their state abbreviation
+ADDRESSES = [
+    # Corteva
+    {
+        'name': "Corteva - Johnston",
+        'address_line_1': "7000 NW 62nd Ave.",
+        'city': "Johnston",
+        'state': "IA",
+        'postal_code': "50131"
+    },
+    # TLI
+    {
+        'name': "The Land Institute - Salina",
+        'address_line_1': "2440 E. Water Well Rd.",
+        'city': "Salina",
+        'state': "KS",
+        'postal_code': "67401"
+    },
+    # ISU-abe
+    {
+        'name': "Iowa State University ABE - Ames",
+        'address_line_1': "605 Bissell Rd.",
+        'building_name': 'Elings Hall',
+        'building_suite_number': '1340',
+        'city': "Ames",
+        'state': "IA",
+        'postal_code': "50011"
+    },
+    # UNL
+    {
+        'name': "University of Nebraska - Lincoln",
+        'address_line_1': "1400 R St.",
+        'city': "Lincoln",
+        'state': "NE",
+        'postal_code': "68588"
+    },
+    # UWM
+    {
+        'name': "University of Wisconsin - Madison",
+        'address_line_1': "500 Lincoln Dr.",
+        'city': "Madison",
+        'state': "WI",
+        'postal_code': "53706"
+    },
+]
+
+# Organizations with their address name
+ORGANIZATIONS = [
+    {
+        'name': 'Corteva Agriscience',
+        'abbreviation': 'CTV',
+        'address': "Corteva - Johnston",
+        'ror_id': 'https://ror.org/02pm1jf23',
+        'logo_url': 'assets/corteva_agriscience.png'
+    },
+    {
+        'name': 'The Land Institute',
+        'abbreviation': 'TLI',
+        'address': "The Land Institute - Salina",
+        'ror_id': 'https://ror.org/00jxaym78',
+        'logo_url': 'assets/the_land_institute.png'
+    },
+    {
+        'name': 'Iowa State University',
+        'abbreviation': 'ISU',
+        'address': "Iowa State University ABE - Ames",
+        'ror_id': 'https://ror.org/04rswrd78',
+        'logo_url': 'assets/iowa_state_university.png'
+    },
+    {
+        'name': 'University of Nebraska - Lincoln',
+        'abbreviation': 'UNL',
+        'address': "University of Nebraska - Lincoln",
+        'ror_id': 'https://ror.org/043mer456',
+        'logo_url': 'assets/university_of_nebraska_lincoln.jpg'
+    },
+    {
+        'name': 'University of Wisconsin - Madison',
+        'abbreviation': 'UWM',
+        'address': "University of Wisconsin - Madison",
+        'ror_id': 'https://ror.org/01y2jtd41',
+        'logo_url': 'assets/university_of_wisconsin.jpg'
+    },
+]
+
+PROJECTS = [
+    # RegenPGC
+    {
+        'name': 'Regen PGC',
+        'description': "Regenerating America's landscape through perennial groundcovers",
+        'funding': "USDA-AFRI 123456789",
+        'website': "https://www.regenpgc.org/"
+    },
+    # Fab PGC
+    {
+        'name': 'FAB PGC',
+        'description': "A project that generates lots of data through keystone field experiments",
+        'funding': "DOE 123456789",
+        'website': ""
+    },
+]
+
+TREATMENTS = [
+    {
+        'name': 'FABPGC Crop Rotation',
+        'type': 'planting',
+        'description': 'A crop rotation treatment that consists of three levels: corn-corn, corn-soybean, and soybean-corn',
+        'levels': ['corn-corn', 'corn-soybean', 'soybean-corn']
+    },
+    {
+        'name': 'FABPGC PGC',
+        'type': 'germplasm',
+        'description': 'A PGC treatment group that consists of three levels: kbg (Kentucky Bluegrass), poa bulbosa (Radix Poa bulbosa), and no pgc (Control)',
+        'levels': ['kbg', 'poa bulbosa', 'no pgc']
+    },
+    {
+        'name': 'FABPGC Harvest',
+        'type': 'operations',
+        'description': 'A harvest treatment group that consists of two different levels: corn-harvest, and corn-stover-harvest',
+        'levels': ['corn-harvest', 'corn-stover-harvest']
+    },
+    {
+        'name': 'FABPGC Cash Crop',
+        'type': 'germplasm',
+        'description': 'A cash crop germplasm treatment group that consists of several different corn and soybean treatment levels: H1 and H2 (corn hybrids), and V1 and V2 (soybean varieties)',
+        'levels': ['H1', 'H2', 'V1', 'V2']
+    },
+]
+
+COMMON_NAMES = ['Corn', 'Soybean', 'Kentucky Bluegrass', 'Poa bulbosa', 'Kura clover']
+
+KEYSTONE_TRIAL = 'FABPGC_TLI_keystone'
+KEYSTONE_YEARS = [2024, 2025, 2026, 2027]
+
+PLOT_LIST = 'data_storage/keystone_plot_list.csv'
+SOP_DOCUMENTS = 'data_storage/sop_documents.csv'
+
+PLOT_FIELDS = ['block', 'type', 'width_m', 'length_m']
+SOP_COLUMNS = ['document_name', 'label', 'version', 'doi', 'doc_url', 'description']
+
+def build_plots(trial, rows, existing=None):
+    """
+    Build the Plot objects of a trial from plot list rows in two passes: create every plot first,
+    then point each one at its parent through a label lookup scoped to the trial.
+    Parents may appear anywhere in the list, or among the existing {label: plot} already stored.
+    The materialized paths Plot.save would maintain are filled in as well, so the rows go in
+    complete with one bulk_create.
+    """
+    existing = existing or {}
+    plots = {}
+    for row in rows:
+        plots[row['label']] = Plot(
+            trial_id=trial,
+            block=None if row['block'] is None else str(row['block']),
+            label=row['label'],
+            type=row['type'],
+            width_m=row['width_m'],
+            length_m=row['length_m']
+        )
+
+    for row in rows:
+        parent = row['parent_plot_id']
+        if parent is None:
+            continue
+        if parent not in plots and parent not in existing:
+            raise CommandError(f"Plot '{row['label']}' has an unknown parent plot '{parent}'")
+        plots[row['label']].parent_plot_id = plots.get(parent) or existing[parent]
+
+    def fill_path(plot, nested=()):
+        if not plot.path:
+            if plot.label in nested:
+                raise CommandError(f"Plot '{plot.label}' is nested under itself")
+            parent = plot.parent_plot_id
+            if parent is not None:
+                fill_path(parent, (*nested, plot.label))
+            plot.path = plot.build_path()
+
+    for plot in plots.values():
+        fill_path(plot)
+
+    return list(plots.values())
+
+def plot_rows(frame):
+    """ Typed plot list rows from a frame read as strings """
+    invalid = frame.filter(~pl.col('type').is_in(PlotType.values))
+    if invalid.height:
+        row = invalid.row(0, named=True)
+        raise CommandError(f"Plot '{row['label']}' has an unknown type '{row['type']}'")
+
+    rows = []
+    for row in frame.iter_rows(named=True):
+        try:
+            rows.append({**row, 'width_m': Decimal(row['width_m']), 'length_m': Decimal(row['length_m'])})
+        except (InvalidOperation, TypeError):
+            raise CommandError(f"Plot '{row['label']}' needs numeric width_m and length_m")
+    return rows
+
+def plot_depths(frame, labels):
+    """
+    {label: nesting depth} of some plots of a plot list, walking their parent chains one level per join.
+    Only these plots changed parents, so a plot nested under itself has one of them on its loop.
+    """
+    parents = frame.select(pl.col('label').alias('ancestor'), pl.col('parent_plot_id').alias('parent'))
+    chains = frame.filter(pl.col('label').is_in(labels)).select('label', pl.col('parent_plot_id').alias('ancestor'))
+    depths = {}
+    depth = 0
+    while chains.height:
+        looped = chains.filter(pl.col('ancestor') == pl.col('label'))
+        if looped.height:
+            raise CommandError(f"Plot '{looped['label'][0]}' is nested under itself")
+        depths.update((label, depth) for label in chains.filter(pl.col('ancestor').is_null())['label'])
+        chains = chains.filter(pl.col('ancestor').is_not_null()).join(parents, on='ancestor').select(
+            'label', pl.col('parent').alias('ancestor')
+        )
+        depth += 1
+    return depths
+
+def plot_list_applier(trial):
+    """
+    sync_source apply function of a trial's plot list, keyed by plot label. New labels are bulk created,
+    unless the trial already has the plot, which is updated in place like a changed row. Changed rows are
+    bulk updated, except re-parented plots, which are saved one by one, parents first, so Plot.save
+    rewrites the paths of their subtrees. Deleted rows delete their plot.
+    """
+    def apply(frame, inserted, changed, deleted):
+        unknown = frame.filter(pl.col('parent_plot_id').is_not_null() & ~pl.col('parent_plot_id').is_in(frame['label']))
+        if unknown.height:
+            row = unknown.row(0, named=True)
+            raise CommandError(f"Plot '{row['label']}' has an unknown parent plot '{row['parent_plot_id']}'")
+
+        rows = plot_rows(pl.concat([inserted, changed.drop('object_id')]))
+        labels = {row['label'] for row in rows} | {row['parent_plot_id'] for row in rows if row['parent_plot_id']}
+        plots = {plot.label: plot for plot in Plot.objects.filter(trial_id=trial, label__in=labels)}
+
+        created = Plot.objects.bulk_create(
+            build_plots(trial, [row for row in rows if row['label'] not in plots], plots), batch_size=5000
+        )
+        plots.update((plot.label, plot) for plot in created)
+        created = {plot.label for plot in created}
+
+        updated, moved = [], []
+        for row in rows:
+            plot = plots[row['label']]
+            if plot.label in created:
+                continue
+            plot.block = None if row['block'] is None else str(row['block'])
+            plot.type, plot.width_m, plot.length_m = row['type'], row['width_m'], row['length_m']
+            parent = plots.get(row['parent_plot_id'])
+            if plot.parent_plot_id_id != (parent.db_id if parent else None):
+                moved.append((plot, parent))
+            else:
+                updated.append(plot)
+        Plot.objects.bulk_update(updated, PLOT_FIELDS, batch_size=5000)
+
+        depths = plot_depths(frame, [plot.label for plot, _ in moved]) if moved else {}
+        for plot, parent in sorted(moved, key=lambda move: depths[move[0].label]):
+            # Paths of moved plots and parents may have been rewritten by an earlier move
+            plot.refresh_from_db(fields=['path'])
+            if parent is not None:
+                parent.refresh_from_db(fields=['path'])
+            plot.parent_plot_id = parent
+            plot.save()
+
+        if deleted.height:
+            Plot.objects.filter(trial_id=trial, db_id__in=deleted['object_id'].to_list()).delete()
+
+        return {row['label']: plots[row['label']].db_id for row in rows}
+
+    return apply
+
+def apply_sop_documents(frame, inserted, changed, deleted):
+    """
+    sync_source apply function of the SOP documents file, keyed by document name. Documents already
+    stored under a new key are updated in place, like changed rows.
+    """
+    rows = pl.concat([inserted, changed.drop('object_id')]).select(SOP_COLUMNS).to_dicts()
+    documents = {
+        document.document_name: document
+        for document in SopDocument.objects.filter(document_name__in=[row['document_name'] for row in rows])
+    }
+
+    created = SopDocument.objects.bulk_create([SopDocument(**row) for row in rows if row['document_name'] not in documents])
+    updated = []
+    for row in rows:
+        document = documents.get(row['document_name'])
+        if document is not None:
+            for field, value in row.items():
+                setattr(document, field, value)
+            updated.append(document)
+    SopDocument.objects.bulk_update(updated, SOP_COLUMNS[1:])
+
+    if deleted.height:
+        SopDocument.objects.filter(db_id__in=deleted['object_id'].to_list()).delete()
+
+    return {document.document_name: document.db_id for document in [*created, *updated]}
+
 class Command(BaseCommand):
     help = 'Populate initial data into PostgreSQL'
 
+    @contextmanager
+    def stage(self, name):
+        """ Time one loading stage """
+        started = time.perf_counter()
+        yield
+        self.timings.append((name, time.perf_counter() - started))
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--resync', action='store_true', help='Re-apply every row of the plot list and SOP files, edited or not'
+        )
+
+    def bulk_create(self, model, objects):
+        """ bulk_create the rows of a model and record the table change the skipped signals would have """
+        objects = model.objects.bulk_create(objects)
+        if objects:
+            self.changed.add(model)
+        return objects
+
+    def sync(self, path, key, apply, model):
+        """ Apply the edits of a seed file through the import ledger, recording the table change """
+        try:
+            counts = sync_source(path, path, key, apply, force=self.resync)
+        except LedgerError as e:
+            raise CommandError(f'{path}: {e}')
+        if counts['inserted'] or counts['changed'] or counts['deleted']:
+            self.changed.add(model)
+            self.stdout.write(
+                f"{path}: {counts['inserted']} inserted, {counts['changed']} changed, "
+                f"{counts['deleted']} deleted, {counts['unchanged']} unchanged"
+            )
+
     @transaction.atomic
     def handle(self, *args, **kwargs):
         # Handle the initial data creation
+        self.timings = []
+        self.changed = set()
+        self.resync = kwargs.get('resync', False)
+        # Fresh unique pools, so repeated runs in one process (e.g. test database creation) can't collide
+        faker.unique.clear()
+        started = time.perf_counter()
 
         # Create an admin user
         username = 'admin'
         password = 'password'
         email = 'admin@example.com'
 
-        if not User.objects.filter(username=username).exists():
-            User.objects.create_superuser(username=username, email=email, password=password)
-            self.stdout.write(self.style.SUCCESS(f'Successfully created admin user: {username}'))
-        
-        US_STATES_AND_ABBREVIATIONS = [
-            ("Alabama", "AL"), ("Alaska", "AK"), ("Arizona", "AZ"), ("Arkansas", "AR"),
-            ("California", "CA"), ("Colorado", "CO"), ("Connecticut", "CT"), ("Delaware", "DE"),
-            ("Florida", "FL"), ("Georgia", "GA"), ("Hawaii", "HI"), ("Idaho", "ID"),
-            ("Illinois", "IL"), ("Indiana", "IN"), ("Iowa", "IA"), ("Kansas", "KS"),
-            ("Kentucky", "KY"), ("Louisiana", "LA"), ("Maine", "ME"), ("Maryland", "MD"),
-            ("Massachusetts", "MA"), ("Michigan", "MI"), ("Minnesota", "MN"), ("Mississippi", "MS"),
-            ("Missouri", "MO"), ("Montana", "MT"), ("Nebraska", "NE"), ("Nevada", "NV"),
-            ("New Hampshire", "NH"), ("New Jersey", "NJ"), ("New Mexico", "NM"), ("New York", "NY"),
-            ("North Carolina", "NC"), ("North Dakota", "ND"), ("Ohio", "OH"), ("Oklahoma", "OK"),
-            ("Oregon", "OR"), ("Pennsylvania", "PA"), ("Rhode Island", "RI"), ("South Carolina", "SC"),
-            ("South Dakota", "SD"), ("Tennessee", "TN"), ("Texas", "TX"), ("Utah", "UT"),
-            ("Vermont", "VT"), ("Virginia", "VA"), ("Washington", "WA"), ("West Virginia", "WV"),
-            ("Wisconsin", "WI"), ("Wyoming", "WY")
-        ]
+        with self.stage('admin user'):
+            if not User.objects.filter(username=username).exists():
+                User.objects.create_superuser(username=username, email=email, password=password)
+                self.stdout.write(self.style.SUCCESS(f'Successfully created admin user: {username}'))
 
         # Creating all states
-        if not State.objects.exists():
-            for state in US_STATES_AND_ABBREVIATIONS:
-                State.objects.create(name=state[0], abbreviation=state[1])
+        with self.stage('states'):
+            if not State.objects.exists():
+                self.bulk_create(State, [State(name=name, abbreviation=abbreviation) for name, abbreviation in US_STATES_AND_ABBREVIATIONS])
+            states = {state.abbreviation: state for state in State.objects.all()}
 
         # Populate Addresses
-        if not Address.objects.exists():
-            # Corteva
-            Address.objects.create(
-                name = "Corteva - Johnston",
-                address_line_1 = "7000 NW 62nd Ave.",
-                city = "Johnston",
-                state_id = State.objects.get(abbreviation="IA"),
-                postal_code = "50131"
-            )
-
-            # TLI
-            Address.objects.create(
-                name = "The Land Institute - Salina",
-                address_line_1 = "2440 E. Water Well Rd.",
-                city = "Salina",
-                state_id = State.objects.get(abbreviation="KS"),
-                postal_code = "67401"
-            )
-
-            # ISU-abe
-            Address.objects.create(
-                name = "Iowa State University ABE - Ames",
-                address_line_1 = "605 Bissell Rd.",
-                building_name = 'Elings Hall',
-                building_suite_number = '1340',
-                city = "Ames",
-                state_id = State.objects.get(abbreviation="IA"),
-                postal_code = "50011"
-            )
-
-            # UNL
-            Address.objects.create(
-                name = "University of Nebraska - Lincoln",
-                address_line_1 = "1400 R St.",
-                city = "Lincoln",
-                state_id = State.objects.get(abbreviation="NE"),
-                postal_code = "68588"
-            )
-
-            # UWM
-            Address.objects.create(
-                name = "University of Wisconsin - Madison",
-                address_line_1 = "500 Lincoln Dr.",
-                city = "Madison",
-                state_id = State.objects.get(abbreviation="WI"),
-                postal_code = "53706"
-            )
+        with self.stage('addresses'):
+            if not Address.objects.exists():
+                self.bulk_create(Address, [
+                    Address(**{key: value for key, value in address.items() if key != 'state'}, state_id=states[address['state']])
+                    for address in ADDRESSES
+                ])
+            addresses = {address.name: address for address in Address.objects.all()}
 
         # Populate organizations
-        if not Organization.objects.exists():
-            # Corteva
-            Organization.objects.create(
-                name='Corteva Agriscience',
-                abbreviation='CTV',
-                address_id=Address.objects.get(name="Corteva - Johnston"),
-                ror_id='https://ror.org/02pm1jf23',
-                logo_url='assets/corteva_agriscience.png'
-            )
-
-            # TLI
-            Organization.objects.create(
-                name='The Land Institute',
-                abbreviation='TLI',
-                address_id=Address.objects.get(name="The Land Institute - Salina"),
-                ror_id='https://ror.org/00jxaym78',
-                logo_url='assets/the_land_institute.png'
-            )
-
-            # ISU-abe
-            Organization.objects.create(
-                name='Iowa State University',
-                abbreviation='ISU',
-                address_id=Address.objects.get(name="Iowa State University ABE - Ames"),
-                ror_id='https://ror.org/04rswrd78',
-                logo_url='assets/iowa_state_university.png'
-            )
-
-            # UNL
-            Organization.objects.create(
-                name='University of Nebraska - Lincoln',
-                abbreviation='UNL',
-                address_id=Address.objects.get(name="University of Nebraska - Lincoln"),
-                ror_id='https://ror.org/043mer456',
-                logo_url='assets/university_of_nebraska_lincoln.jpg'
-            )
+        with self.stage('organizations'):
+            if not Organization.objects.exists():
+                self.bulk_create(Organization, [
+                    Organization(**{key: value for key, value in org.items() if key != 'address'}, address_id=addresses[org['address']])
+                    for org in ORGANIZATIONS
+                ])
+            organizations = {org.name: org for org in Organization.objects.all()}
 
-            # UWM
-            Organization.objects.create(
-                name='University of Wisconsin - Madison',
-                abbreviation='UWM',
-                address_id=Address.objects.get(name="University of Wisconsin - Madison"),
-                ror_id='https://ror.org/01y2jtd41',
-                logo_url='assets/university_of_wisconsin.jpg'
-            )
-            
         # Populate Persons
-        if not Person.objects.exists():
-            for _, org in enumerate(Organization.objects.all()):
-                for _ in range(10):
-                    Person.objects.create(
+        with self.stage('people'):
+            if not Person.objects.exists():
+                self.bulk_create(Person, [
+                    Person(
                         first_name = faker.first_name(),
                         last_name = faker.last_name(),
                         middle_initial =  faker.random_uppercase_letter(),
                         affiliation_id = org,
-                        email = faker.email(),
+                        email = faker.unique.email(),
                         phone_number = faker.phone_number(),
                         orcid = '1234-1244-1233-1224'
                     )
+                    for org in organizations.values()
+                    for _ in range(10)
+                ])
+            people = {}
+            for person in Person.objects.all():
+                people.setdefault(person.affiliation_id_id, []).append(person)
 
         # Populate Project
-        if not Project.objects.exists():
-            # RegenPGC
-            Project.objects.create(
-                name = 'Regen PGC',
-                description = "Regenerating America's landscape through perennial groundcovers",
-                funding = "USDA-AFRI 123456789",
-                website = "https://www.regenpgc.org/"
-            )
-
-            # Fab PGC
-            Project.objects.create(
-                name = 'FAB PGC',
-                description = "A project that generates lots of data through keystone field experiments",
-                funding = "DOE 123456789",
-                website = ""
-            )
+        with self.stage('projects'):
+            if not Project.objects.exists():
+                self.bulk_create(Project, [Project(**project) for project in PROJECTS])
+            projects = {project.name: project for project in Project.objects.all()}
 
         # Populate Locations
-        if not Location.objects.exists():
-            for _ in range(10):
-                Location.objects.create(
-                    name = 'trial_' + faker.word(),
-                    latitude = faker.latitude(),
-                    longitude = faker.longitude(),
-                    type = 'trial'
-                )
+        with self.stage('locations'):
+            if not Location.objects.exists():
+                self.bulk_create(Location, [
+                    Location(
+                        name = 'trial_' + faker.unique.word(),
+                        latitude = faker.latitude(),
+                        longitude = faker.longitude(),
+                        type = 'trial'
+                    )
+                    for _ in range(10)
+                ])
+            locations = list(Location.objects.filter(type='trial'))
 
         # Populate FieldTrial
-        if not Trial.objects.exists():
-            for _ in range(4):
-                org = Organization.objects.order_by('?').first()
-                Trial.objects.create(
-                    name = org.abbreviation + "_trial_" + str(faker.random_number()),
-                    location_id = Location.objects.filter(type='trial').order_by('?').first(),
-                    manager_id = Person.objects.filter(affiliation_id=org).order_by('?').first(),
-                    project_id = Project.objects.order_by('?').first(),
+        with self.stage('trials'):
+            if not Trial.objects.exists():
+                trials = []
+                for _ in range(4):
+                    org = random.choice(list(organizations.values()))
+                    trials.append(Trial(
+                        name = org.abbreviation + "_trial_" + str(faker.unique.random_number()),
+                        location_id = random.choice(locations),
+                        manager_id = random.choice(people[org.pk]),
+                        project_id = random.choice(list(projects.values())),
+                        affiliation_id = org,
+                        establishment_year = faker.year(),
+                        multi_year = bool(random.randint(0, 1))
+                    ))
+
+                org = organizations['The Land Institute']
+                trials.append(Trial(
+                    name = KEYSTONE_TRIAL,
+                    location_id = random.choice(locations),
+                    manager_id = random.choice(people[org.pk]),
+                    project_id = projects['FAB PGC'],
                     affiliation_id = org,
-                    establishment_year = faker.year(),
-                    multi_year = bool(random.randint(0, 1))
-                )
-            
-            org = Organization.objects.get(name='The Land Institute')
-            project = Project.objects.get(name='FAB PGC')
-            Trial.objects.create(
-                name = 'FABPGC_TLI_keystone', 
-                location_id = Location.objects.filter(type='trial').order_by('?').first(),
-                manager_id = Person.objects.filter(affiliation_id=org).order_by('?').first(),
-                project_id = project,
-                affiliation_id = org,
-                establishment_year = 2024,
-                multi_year = True
-            )
+                    establishment_year = 2024,
+                    multi_year = True
+                ))
+                self.bulk_create(Trial, trials)
+            keystone = Trial.objects.get(name=KEYSTONE_TRIAL)
 
         # Populate Trial years
-        if not TrialYear.objects.all():
-            fab_trial = Trial.objects.get(name='FABPGC_TLI_keystone')
-            years = [2024, 2025, 2026, 2027]
-            for year in years:
-                trial_year = TrialYear(
-                    trial_id=fab_trial, 
-                    year=year)
-                trial_year.full_clean()
-                trial_year.save()
-
-        # Populate Treatment Groups
-        if not Treatment.objects.exists():
-            Treatment.objects.create(
-                name='FABPGC Crop Rotation',
-                type='planting',
-                description='A crop rotation treatment that consists of three levels: corn-corn, corn-soybean, and soybean-corn'
-            )
-            Treatment.objects.create(
-                name='FABPGC PGC',
-                type='germplasm',
-                description='A PGC treatment group that consists of three levels: kbg (Kentucky Bluegrass), poa bulbosa (Radix Poa bulbosa), and no pgc (Control)'
-            )
-            Treatment.objects.create(
-                name='FABPGC Harvest',
-                type='operations',
-                description='A harvest treatment group that consists of two different levels: corn-harvest, and corn-stover-harvest'
-            )
-            Treatment.objects.create(
-                name='FABPGC Cash Crop',
-                type='germplasm',
-                description='A cash crop germplasm treatment group that consists of several different corn and soybean treatment levels: H1 and H2 (corn hybrids), and V1 and V2 (soybean varieties)'
-            )
+        with self.stage('trial years'):
+            if not TrialYear.objects.exists():
+                trial_years = [TrialYear(trial_id=keystone, year=year) for year in KEYSTONE_YEARS]
+                # full_clean without its per row uniqueness and foreign key queries, the table is
+                # empty and the trial was just loaded
+                for trial_year in trial_years:
+                    trial_year.clean_fields(exclude=['trial_id'])
+                    trial_year.clean()
+                self.bulk_create(TrialYear, trial_years)
+
+        # Populate Treatment Groups and Levels
+        with self.stage('treatments'):
+            if not Treatment.objects.exists():
+                self.bulk_create(Treatment, [
+                    Treatment(**{key: value for key, value in treatment.items() if key != 'levels'})
+                    for treatment in TREATMENTS
+                ])
+            treatments = {treatment.name: treatment for treatment in Treatment.objects.all()}
+
+            if not TreatmentLevel.objects.exists():
+                self.bulk_create(TreatmentLevel, [
+                    TreatmentLevel(treatment_id=treatments[treatment['name']], level=level)
+                    for treatment in TREATMENTS
+                    for level in treatment['levels']
+                ])
 
-        # Populate Treatment Levels
-        if not TreatmentLevel.objects.exists():
-            # Crop Rotation
-            levels = ['corn-corn', 'corn-soybean', 'soybean-corn']
-            treatment_group = Treatment.objects.get(name='FABPGC Crop Rotation')
-            for level in levels:
-                TreatmentLevel.objects.create(
-                    treatment_id=treatment_group,
-                    level=level
-                )
-            # PGC
-            levels = ['kbg', 'poa bulbosa', 'no pgc']
-            treatment_group = Treatment.objects.get(name='FABPGC PGC')
-            for level in levels:
-                TreatmentLevel.objects.create(
-                    treatment_id=treatment_group,
-                    level=level
-                )
-            # Havest Treatment Levels
-            levels = ['corn-harvest', 'corn-stover-harvest']
-            treatment_group = Treatment.objects.get(name='FABPGC Harvest')
-            for level in levels:
-                TreatmentLevel.objects.create(
-                    treatment_id=treatment_group,
-                    level=level
-                )
-            # Cash Crop
-            levels = ['H1', 'H2', 'V1', 'V2']
-            treatment_group = Treatment.objects.get(name='FABPGC Cash Crop')
-            for level in levels:
-                TreatmentLevel.objects.create(
-                    treatment_id=treatment_group,
-                    level=level
-                )
-        
         # Populate TrialTreatments
-        if not TrialTreatment.objects.exists():
-            trial = Trial.objects.get(name='FABPGC_TLI_keystone')
-            treatments = Treatment.objects.all()
-            for tr in treatments:
-                TrialTreatment.objects.create(
-                    trial_id = trial,
-                    treatment_id = tr
-                )
+        with self.stage('trial treatments'):
+            if not TrialTreatment.objects.exists():
+                self.bulk_create(TrialTreatment, [
+                    TrialTreatment(trial_id=keystone, treatment_id=treatment) for treatment in treatments.values()
+                ])
 
         # Populate Plots
-        if not Plot.objects.exists():
-            trial = Trial.objects.get(name='FABPGC_TLI_keystone')
-            plot_list = pd.read_csv('data_storage/keystone_plot_list.csv')
-            nrow = len(plot_list)
-            for i in range(nrow):
-                row = plot_list.loc[i]
-                try:
-                    parent_plot = Plot.objects.get(label=row.parent_plot_id)
-                except Plot.DoesNotExist:
-                    parent_plot = None
-                Plot.objects.create(
-                    trial_id=trial, 
-                    block=row.block,
-                    label=row.label,
-                    type=row.type,
-                    width_m=row.width_m,
-                    length_m=row.length_m,
-                    parent_plot_id=parent_plot
-                )
-        
+        with self.stage('plots'):
+            self.sync(PLOT_LIST, 'label', plot_list_applier(keystone), Plot)
+
         # Populate SOP Table
-        if not SopDocument.objects.exists():
-            sop_df = pl.read_csv('data_storage/sop_documents.csv')
-            for i in range(len(sop_df.rows())):
-                SopDocument.objects.create(
-                    document_name = sop_df[i]['document_name'].item(),
-                    label = sop_df[i]['label'].item(),
-                    version = sop_df[i]['version'].item(),
-                    doi = sop_df[i]['doi'].item(),
-                    doc_url = sop_df[i]['doc_url'].item(),
-                    description = sop_df[i]['description'].item()
-                )
+        with self.stage('sop documents'):
+            self.sync(SOP_DOCUMENTS, 'document_name', apply_sop_documents, SopDocument)
 
         # Populate CommonName
-        if not CommonName.objects.exists():
-            names = ['Corn', 'Soybean', 'Kentucky Bluegrass', 'Poa bulbosa', 'Kura clover']
-            
-            for name in names:
-                CommonName.objects.create(
-                    name=name
-                )
-
-        self.stdout.write(self.style.SUCCESS('Successfully populated initial data'))
\ No newline at end of file
+        with self.stage('common names'):
+            if not CommonName.objects.exists():
+                self.bulk_create(CommonName, [CommonName(name=name) for name in COMMON_NAMES])
+
+        # The change tracking and registry receivers never saw the bulk inserts
+        with self.stage('table versions'):
+            for model in self.changed:
+                bump_table_version(model)
+            invalidate_ontology()
+            invalidate_germplasm_resolver()
+
+        for name, seconds in self.timings:
+            self.stdout.write(f'{name:<20}{seconds * 1000:>9.1f} ms')
+        self.stdout.write(f"{'total':<20}{(time.perf_counter() - started) * 1000:>9.1f} ms")
+        self.stdout.write(self.style.SUCCESS('Successfully populated initial data'))
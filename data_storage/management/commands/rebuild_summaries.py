@@ -0,0 +1,27 @@
+"""
+Full Rebuild of the Trial Summary Tables
+"""
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Q
+
+from data_storage.models import Trial
+from data_storage.summaries import rebuild_summaries
+
+
+class Command(BaseCommand):
+    help = "Recompute the trial summary tables from the observations"
+
+    def add_arguments(self, parser):
+        parser.add_argument('trial', nargs='?', default=None, help='Only rebuild this trial (name or db_id)')
+
+    def handle(self, *args, **options):
+        trial = None
+        if options['trial']:
+            try:
+                trial = Trial.objects.get(Q(name=options['trial']) | Q(db_id=options['trial']))
+            except Trial.DoesNotExist:
+                raise CommandError(f"Trial '{options['trial']}' does not exist")
+
+        count = rebuild_summaries(trial)
+
+        self.stdout.write(self.style.SUCCESS(f'Wrote {count} summary rows'))
@@ -0,0 +1,60 @@
+"""
+Performance Benchmark Suite
+
+Runs data_storage.benchmarks in a throwaway test database, like manage.py test, and prints the latency
+percentiles and query counts of every case. Write the report with --output and pass an older one as
+--baseline to compare commits. --check fails the command when a case runs over its query budget.
+"""
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import setup_databases, setup_test_environment, teardown_databases, teardown_test_environment
+
+from data_storage.benchmarks import run_benchmarks, over_budget, compare
+
+
+class Command(BaseCommand):
+    help = "Benchmark the api, admin, export and populate paths with latency percentiles and query budgets"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=20, help='Timed runs per request case')
+        parser.add_argument('--populate-iterations', type=int, default=5, help='Timed populate_initial_db runs')
+        parser.add_argument('--output', default=None, help='Write the report as JSON to this path')
+        parser.add_argument('--baseline', default=None, help='Compare the median latencies with an earlier report')
+        parser.add_argument('--check', action='store_true', help='Fail when a case runs over its query budget')
+        parser.add_argument('--keepdb', action='store_true', help='Keep the test database between runs')
+
+    def handle(self, *args, **options):
+        setup_test_environment()
+        databases = setup_databases(verbosity=0, interactive=False, keepdb=options['keepdb'])
+        try:
+            report = run_benchmarks(options['iterations'], options['populate_iterations'])
+        finally:
+            teardown_databases(databases, verbosity=0, keepdb=options['keepdb'])
+            teardown_test_environment()
+
+        self.stdout.write(f"{'case':<30}{'p50 ms':>10}{'p95 ms':>10}{'max ms':>10}{'queries':>9}{'budget':>8}")
+        for name, result in report['results'].items():
+            self.stdout.write(
+                f"{name:<30}{result['p50_ms']:>10.2f}{result['p95_ms']:>10.2f}{result['max_ms']:>10.2f}"
+                f"{result['queries']:>9}{result['budget'] if result['budget'] is not None else '-':>8}"
+            )
+
+        if options['baseline']:
+            with open(options['baseline']) as f:
+                baseline = json.load(f)
+            self.stdout.write(f"\nMedian latency against {baseline.get('commit') or options['baseline']}")
+            for name, (before, after, ratio) in compare(report, baseline).items():
+                self.stdout.write(f"{name:<30}{before:>10.2f}{after:>10.2f}{ratio:>9.2f}x")
+
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(report, f, indent=2)
+            self.stdout.write(f"Wrote {options['output']}")
+
+        exceeded = over_budget(report)
+        if exceeded:
+            message = ', '.join(f'{name} ({queries} > {budget})' for name, (queries, budget) in exceeded.items())
+            if options['check']:
+                raise CommandError(f'Query budget exceeded: {message}')
+            self.stdout.write(self.style.WARNING(f'Query budget exceeded: {message}'))
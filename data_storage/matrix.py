@@ -0,0 +1,122 @@
+"""
+Data Storage Phenotype Matrix
+
+Wide plot x variable matrices for a trial, one row per plot crop and one column per variable,
+pivoted from the long observation rows and cached until the underlying tables change.
+"""
+
+# Django imports
+from django.core.cache import cache
+
+# External imports
+import polars as pl
+
+# App imports
+from ontology.models import Variable
+from .models import Plot, PlotCrop, PlotTreatment, Observation, Germplasm, Treatment, TreatmentLevel, table_versions_key
+from .exports import observation_querysets, read_observation_frames, join_treatments
+
+MATRIX_AGGREGATIONS = ['last', 'mean', 'first']
+
+MATRIX_COLUMNS = {
+    'db_id': 'plot_crop_id',
+    'plot_year': 'year',
+    'plot_id__label': 'plot',
+    'plot_id__block': 'block',
+    'plot_id__row': 'row',
+    'plot_id__column': 'column',
+    'plot_id__type': 'plot_type',
+    'germplasm_id__name': 'germplasm',
+}
+
+MATRIX_SCHEMA = {
+    'plot_crop_id': pl.String,
+    'year': pl.Int32,
+    'plot': pl.String,
+    'block': pl.String,
+    'row': pl.String,
+    'column': pl.String,
+    'plot_type': pl.String,
+    'germplasm': pl.String,
+}
+
+MATRIX_CACHE_TIMEOUT = 60 * 60 * 24
+
+# Tables a matrix is built from or names its rows and columns with, any change to them invalidates it
+MATRIX_MODELS = [Plot, PlotCrop, PlotTreatment, Observation, Germplasm, Treatment, TreatmentLevel, Variable]
+
+def plot_crop_frame(trial, year=None):
+    """
+    One row per plot crop of a trial with its layout and germplasm, the row index of the matrix
+    """
+    plot_crops = PlotCrop.objects.filter(plot_id__trial_id=trial)
+    if year is not None:
+        plot_crops = plot_crops.filter(plot_year=year)
+
+    return pl.DataFrame(list(plot_crops.values_list(*MATRIX_COLUMNS)), schema=MATRIX_SCHEMA, orient='row')
+
+def pivot_observations(rows, observations, aggregate='last'):
+    """
+    Pivot long observation rows (exports.OBSERVATION_SCHEMA) into one column per variable on the plot crop rows.
+    Repeated measurements of a variable on a plot crop are reduced with the aggregate, the observations are
+    date ordered so 'first' and 'last' pick the earliest and latest one.
+    Variables with only numeric values get Float64 columns, the rest keep their raw text values.
+    """
+    if aggregate not in MATRIX_AGGREGATIONS:
+        raise ValueError(f"Unknown aggregate '{aggregate}', expected one of {', '.join(MATRIX_AGGREGATIONS)}")
+
+    matrix = rows
+    if observations.height:
+        numeric = observations.group_by('variable').agg(pl.col('value_num').is_not_null().all().alias('numeric'))
+        numeric_variables = numeric.filter(pl.col('numeric'))['variable']
+
+        numbers = observations.filter(pl.col('variable').is_in(numeric_variables))
+        if numbers.height:
+            matrix = matrix.join(
+                numbers.pivot(on='variable', index='plot_crop_id', values='value_num', aggregate_function=aggregate),
+                on='plot_crop_id', how='left'
+            )
+        text = observations.filter(~pl.col('variable').is_in(numeric_variables))
+        if text.height:
+            # Text values have no mean, fall back to the latest one
+            matrix = matrix.join(
+                text.pivot(
+                    on='variable', index='plot_crop_id', values='value',
+                    aggregate_function='first' if aggregate == 'first' else 'last'
+                ),
+                on='plot_crop_id', how='left'
+            )
+
+    return matrix.sort(['year', 'block', 'plot'], nulls_last=True)
+
+def build_phenotype_matrix(trial, year=None, aggregate='last', chunk_size=50000):
+    """
+    Build the plot crop x variable matrix of a trial, with block, row, column and one column per treatment factor
+    """
+    observations, treatments = observation_querysets(trial, year)
+    rows = join_treatments([plot_crop_frame(trial, year)], list(treatments))
+    observations = pl.concat(read_observation_frames(observations, chunk_size))
+
+    return pivot_observations(rows, observations, aggregate)
+
+def matrix_cache_key(trial, year=None, aggregate='last'):
+    """
+    Cache key of a trial's matrix, changes whenever one of the MATRIX_MODELS tables changes
+    """
+    version = table_versions_key(*MATRIX_MODELS)
+    return f"phenotype_matrix:{trial.pk}:{year}:{aggregate}:{version}"
+
+def phenotype_matrix(trial, year=None, aggregate='last'):
+    """
+    Return the plot crop x variable matrix of a trial, optionally for one year, from the cache when possible
+    """
+    if aggregate not in MATRIX_AGGREGATIONS:
+        raise ValueError(f"Unknown aggregate '{aggregate}', expected one of {', '.join(MATRIX_AGGREGATIONS)}")
+
+    key = matrix_cache_key(trial, year, aggregate)
+    matrix = cache.get(key)
+    if matrix is None:
+        matrix = build_phenotype_matrix(trial, year, aggregate)
+        cache.set(key, matrix, MATRIX_CACHE_TIMEOUT)
+
+    return matrix
@@ -0,0 +1,30 @@
+# Generated by Django 5.1 on 2026-10-18 15:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('data_storage', '0002_tableversion'),
+        ('resources', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='plot',
+            index=models.Index(fields=['trial_id', 'block'], name='plot_trial_block_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='plot',
+            index=models.Index(fields=['trial_id', 'type'], name='plot_trial_type_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='plotcrop',
+            index=models.Index(fields=['plot_year', 'germplasm_id'], name='plot_crop_year_germplasm_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='plottreatment',
+            index=models.Index(fields=['treatment_level_id', 'plot_crop_id'], name='plot_treatment_level_idx'),
+        ),
+    ]
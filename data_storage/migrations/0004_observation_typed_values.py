@@ -0,0 +1,86 @@
+# Generated by Django 5.1 on 2026-10-18 15:04
+
+from datetime import date
+
+from django.db import migrations, models
+
+NUMBER_PATTERN = r'^\s*[-+]?([0-9]+\.?[0-9]*|\.[0-9]+)([eE][-+]?[0-9]{1,2})?\s*$'
+
+# Scales default to text, only scales with observations that all parse as numbers are inferred numerical.
+# Anything else keeps text until its type is set in the admin
+INFER_NUMERIC_SCALES = rf"""
+UPDATE ontology_varscale s
+SET data_type = 'numerical'
+WHERE s.data_type = 'text'
+  AND EXISTS (
+    SELECT 1 FROM data_storage_observation o
+    JOIN ontology_variable v ON v.label = o.variable_id_id
+    WHERE v.scale_id_id = s.db_id
+  )
+  AND NOT EXISTS (
+    SELECT 1 FROM data_storage_observation o
+    JOIN ontology_variable v ON v.label = o.variable_id_id
+    WHERE v.scale_id_id = s.db_id
+      AND (o.value IS NULL OR o.value !~ '{NUMBER_PATTERN}')
+  )
+"""
+
+# Set based backfill of value_num from the variable scale data types
+BACKFILL_VALUE_NUM = rf"""
+UPDATE data_storage_observation o
+SET value_num = CAST(btrim(o.value) AS double precision)
+FROM ontology_variable v
+JOIN ontology_varscale s ON s.db_id = v.scale_id_id
+WHERE o.variable_id_id = v.label
+  AND s.data_type IN ('numerical', 'ordinal')
+  AND o.value ~ '{NUMBER_PATTERN}'
+"""
+
+def backfill_value_date(apps, schema_editor):
+    """ Parse date variables in Python, invalid dates are left empty instead of failing the migration """
+    Observation = apps.get_model('data_storage', 'Observation')
+
+    observations = Observation.objects.filter(variable_id__scale_id__data_type='date').only('db_id', 'value')
+    batch = []
+    for observation in observations.iterator(chunk_size=5000):
+        try:
+            observation.value_date = date.fromisoformat(observation.value.strip()[:10])
+        except ValueError:
+            continue
+        batch.append(observation)
+        if len(batch) == 5000:
+            Observation.objects.bulk_update(batch, ['value_date'])
+            batch = []
+    Observation.objects.bulk_update(batch, ['value_date'])
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('data_storage', '0003_plot_filter_indexes'),
+        ('ontology', '0002_varscale_data_type'),
+        ('resources', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='observation',
+            name='value_date',
+            field=models.DateField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='observation',
+            name='value_num',
+            field=models.FloatField(blank=True, editable=False, null=True),
+        ),
+        migrations.RunSQL(INFER_NUMERIC_SCALES, reverse_sql=migrations.RunSQL.noop),
+        migrations.RunSQL(BACKFILL_VALUE_NUM, reverse_sql=migrations.RunSQL.noop),
+        migrations.RunPython(backfill_value_date, reverse_code=migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='observation',
+            index=models.Index(fields=['variable_id', 'value_num'], name='observation_value_num_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='observation',
+            index=models.Index(fields=['variable_id', 'value_date'], name='observation_value_date_idx'),
+        ),
+    ]
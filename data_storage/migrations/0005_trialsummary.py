@@ -0,0 +1,68 @@
+# Generated by Django 5.1 on 2026-10-18 15:07
+
+import charidfield.fields
+import django.db.models.deletion
+import ksuid.ksuid
+from django.db import migrations, models
+from django.db.models import Count, F, Max, Min, Sum
+
+
+def build_summaries(apps, schema_editor):
+    """ Summarize the observations that already exist, same grouping as data_storage.summaries.rebuild_summaries """
+    Observation = apps.get_model('data_storage', 'Observation')
+    TrialSummary = apps.get_model('data_storage', 'TrialSummary')
+
+    groups = Observation.objects.filter(value_num__isnull=False).values(
+        'variable_id',
+        trial=F('plot_crop_id__plot_id__trial_id'),
+        year=F('plot_crop_id__plot_year'),
+        level=F('plot_crop_id__plottreatment__treatment_level_id'),
+        germplasm=F('plot_crop_id__germplasm_id')
+    ).annotate(
+        count=Count('pk'),
+        total=Sum('value_num'),
+        total_sq=Sum(F('value_num') * F('value_num')),
+        low=Min('value_num'),
+        high=Max('value_num')
+    ).order_by()
+
+    TrialSummary.objects.bulk_create([
+        TrialSummary(
+            trial_id_id=group['trial'], year=group['year'], variable_id_id=group['variable_id'],
+            treatment_level_id_id=group['level'], germplasm_id_id=group['germplasm'],
+            n=group['count'], sum_value=group['total'], sum_squares=group['total_sq'],
+            min_value=group['low'], max_value=group['high']
+        )
+        for group in groups.iterator()
+    ], batch_size=5000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('data_storage', '0004_observation_typed_values'),
+        ('ontology', '0002_varscale_data_type'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TrialSummary',
+            fields=[
+                ('db_id', charidfield.fields.CharIDField(default=ksuid.ksuid.Ksuid, editable=False, help_text='ksuid formatter for this entity.', max_length=50, prefix='summary_', primary_key=True, serialize=False, unique=True)),
+                ('year', models.IntegerField()),
+                ('n', models.BigIntegerField(default=0)),
+                ('sum_value', models.FloatField(default=0)),
+                ('sum_squares', models.FloatField(default=0)),
+                ('min_value', models.FloatField(blank=True, null=True)),
+                ('max_value', models.FloatField(blank=True, null=True)),
+                ('germplasm_id', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='data_storage.germplasm')),
+                ('treatment_level_id', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='data_storage.treatmentlevel')),
+                ('trial_id', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='data_storage.trial')),
+                ('variable_id', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='ontology.variable', to_field='label')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('trial_id', 'year', 'variable_id', 'treatment_level_id', 'germplasm_id'), name='trial_summary_composite_key', nulls_distinct=False)],
+            },
+        ),
+        migrations.RunPython(build_summaries, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.1 on 2026-10-18 15:14
+
+from django.db import migrations, models
+
+
+FILL_PLOT_PATHS = """
+    WITH RECURSIVE tree (db_id, path) AS (
+        SELECT db_id, '/' || db_id || '/'
+        FROM data_storage_plot
+        WHERE parent_plot_id_id IS NULL
+        UNION ALL
+        SELECT child.db_id, tree.path || child.db_id || '/'
+        FROM data_storage_plot child
+        JOIN tree ON child.parent_plot_id_id = tree.db_id
+    )
+    UPDATE data_storage_plot plot
+    SET path = tree.path
+    FROM tree
+    WHERE plot.db_id = tree.db_id
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('data_storage', '0005_trialsummary'),
+        ('resources', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='plot',
+            name='path',
+            field=models.CharField(default='', editable=False, max_length=1024),
+        ),
+        migrations.RunSQL(FILL_PLOT_PATHS, migrations.RunSQL.noop),
+        migrations.AddIndex(
+            model_name='plot',
+            index=models.Index(fields=['path'], name='plot_path_idx', opclasses=['varchar_pattern_ops']),
+        ),
+    ]
@@ -0,0 +1,60 @@
+# Generated by Django 5.1 on 2026-10-18 15:16
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+DROP_FK_INDEXES = """
+    DROP INDEX IF EXISTS data_storage_observation_plot_crop_id_id_cbe2e2b6;
+    DROP INDEX IF EXISTS data_storage_observation_plot_crop_id_id_cbe2e2b6_like;
+    DROP INDEX IF EXISTS data_storage_observation_variable_id_id_67edf898;
+    DROP INDEX IF EXISTS data_storage_observation_variable_id_id_67edf898_like;
+"""
+
+CREATE_FK_INDEXES = """
+    CREATE INDEX data_storage_observation_plot_crop_id_id_cbe2e2b6 ON data_storage_observation (plot_crop_id_id);
+    CREATE INDEX data_storage_observation_plot_crop_id_id_cbe2e2b6_like ON data_storage_observation (plot_crop_id_id varchar_pattern_ops);
+    CREATE INDEX data_storage_observation_variable_id_id_67edf898 ON data_storage_observation (variable_id_id);
+    CREATE INDEX data_storage_observation_variable_id_id_67edf898_like ON data_storage_observation (variable_id_id varchar_pattern_ops);
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('data_storage', '0006_plot_path'),
+        ('ontology', '0002_varscale_data_type'),
+        ('resources', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='observation',
+            index=models.Index(fields=['plot_crop_id', 'variable_id', 'date_time'], include=('value_num',), name='observation_crop_var_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='observation',
+            index=models.Index(fields=['variable_id', 'date_time'], include=('value_num',), name='observation_var_date_idx'),
+        ),
+        # Only drop the old single column FK indexes, a plain AlterField would also drop and re-validate both FK constraints
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.AlterField(
+                    model_name='observation',
+                    name='plot_crop_id',
+                    field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='data_storage.plotcrop'),
+                ),
+                migrations.AlterField(
+                    model_name='observation',
+                    name='variable_id',
+                    field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='ontology.variable', to_field='label'),
+                ),
+            ],
+            database_operations=[
+                migrations.RunSQL(
+                    sql=DROP_FK_INDEXES,
+                    reverse_sql=CREATE_FK_INDEXES,
+                ),
+            ],
+        ),
+    ]
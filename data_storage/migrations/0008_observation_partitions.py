@@ -0,0 +1,91 @@
+# Range partition data_storage_observation by date_time year
+
+from datetime import date
+
+from django.db import migrations
+
+
+TABLE = 'data_storage_observation'
+
+# Postgres requires the partition key in every unique constraint, so the primary key becomes (db_id, date_time).
+# Django keeps treating db_id as the primary key.
+PARTITIONED_PK = f'ALTER TABLE {TABLE} ADD CONSTRAINT {TABLE}_pkey PRIMARY KEY (db_id, date_time)'
+PLAIN_PK = f'ALTER TABLE {TABLE} ADD CONSTRAINT {TABLE}_pkey PRIMARY KEY (db_id)'
+
+FOREIGN_KEYS = [
+    f"""ALTER TABLE {TABLE} ADD CONSTRAINT data_storage_observa_observer_id_id_1e1cdf57_fk_resources
+        FOREIGN KEY (observer_id_id) REFERENCES resources_person (db_id) DEFERRABLE INITIALLY DEFERRED""",
+    f"""ALTER TABLE {TABLE} ADD CONSTRAINT data_storage_observa_variable_id_id_67edf898_fk_ontology_
+        FOREIGN KEY (variable_id_id) REFERENCES ontology_variable (label) DEFERRABLE INITIALLY DEFERRED""",
+    f"""ALTER TABLE {TABLE} ADD CONSTRAINT data_storage_observa_plot_crop_id_id_cbe2e2b6_fk_data_stor
+        FOREIGN KEY (plot_crop_id_id) REFERENCES data_storage_plotcrop (db_id) DEFERRABLE INITIALLY DEFERRED""",
+]
+
+INDEXES = [
+    f'CREATE INDEX {TABLE}_db_id_1b03e5ad_like ON {TABLE} (db_id varchar_pattern_ops)',
+    f'CREATE INDEX {TABLE}_observer_id_id_1e1cdf57 ON {TABLE} (observer_id_id)',
+    f'CREATE INDEX {TABLE}_observer_id_id_1e1cdf57_like ON {TABLE} (observer_id_id varchar_pattern_ops)',
+    f'CREATE INDEX observation_value_num_idx ON {TABLE} (variable_id_id, value_num)',
+    f'CREATE INDEX observation_value_date_idx ON {TABLE} (variable_id_id, value_date)',
+    f'CREATE INDEX observation_crop_var_date_idx ON {TABLE} (plot_crop_id_id, variable_id_id, date_time) INCLUDE (value_num)',
+    f'CREATE INDEX observation_var_date_idx ON {TABLE} (variable_id_id, date_time) INCLUDE (value_num)',
+]
+
+
+def rebuild_table(schema_editor, partitioned):
+    """
+    Copy the observation table into a new partitioned (or plain) table of the same name,
+    then put the primary key, foreign keys and indexes back under their Django names
+    """
+    execute = schema_editor.execute
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(
+            f"SELECT extract(year FROM min(date_time) AT TIME ZONE 'UTC'), "
+            f"extract(year FROM max(date_time) AT TIME ZONE 'UTC') FROM {TABLE}"
+        )
+        first, last = cursor.fetchone()
+
+    execute(f'ALTER TABLE {TABLE} RENAME TO {TABLE}_old')
+    if partitioned:
+        execute(f'CREATE TABLE {TABLE} (LIKE {TABLE}_old INCLUDING DEFAULTS) PARTITION BY RANGE (date_time)')
+        # One partition per year with data, through next year, and a default partition for anything else
+        this_year = date.today().year
+        first = min(int(first or this_year), this_year)
+        last = max(int(last or this_year), this_year + 1)
+        for year in range(first, last + 1):
+            execute(
+                f"CREATE TABLE {TABLE}_y{year} PARTITION OF {TABLE} "
+                f"FOR VALUES FROM ('{year}-01-01 00:00:00+00') TO ('{year + 1}-01-01 00:00:00+00')"
+            )
+        execute(f'CREATE TABLE {TABLE}_default PARTITION OF {TABLE} DEFAULT')
+    else:
+        execute(f'CREATE TABLE {TABLE} (LIKE {TABLE}_old INCLUDING DEFAULTS)')
+
+    execute(f'INSERT INTO {TABLE} SELECT * FROM {TABLE}_old')
+    execute(f'DROP TABLE {TABLE}_old')
+
+    execute(PARTITIONED_PK if partitioned else PLAIN_PK)
+    for statement in FOREIGN_KEYS + INDEXES:
+        execute(statement)
+    execute(f'ANALYZE {TABLE}')
+
+
+def partition_observations(apps, schema_editor):
+    rebuild_table(schema_editor, partitioned=True)
+
+
+def unpartition_observations(apps, schema_editor):
+    rebuild_table(schema_editor, partitioned=False)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('data_storage', '0007_observation_access_indexes'),
+        # The image -> observation foreign key constraint has to go first
+        ('imaging', '0002_image_observation_no_constraint'),
+    ]
+
+    operations = [
+        migrations.RunPython(partition_observations, unpartition_observations),
+    ]
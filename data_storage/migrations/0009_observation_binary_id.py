@@ -0,0 +1,59 @@
+# Store Observation.db_id, and the image foreign key pointing at it, as the raw 20 KSUID bytes
+
+import config.custom_fields
+import ksuid.ksuid
+from django.db import migrations
+
+from config.custom_fields import KSUID_SQL_FUNCTIONS, ksuid_to_binary_sql, ksuid_to_text_sql
+
+
+PREFIX = 'observation_'
+
+COLUMNS = [
+    ('data_storage_observation', 'db_id'),
+    ('imaging_image', 'observation_id_id'),
+]
+
+# varchar_pattern_ops indexes only exist for text columns
+LIKE_INDEXES = [
+    ('data_storage_observation_db_id_1b03e5ad_like', 'data_storage_observation', 'db_id'),
+    ('imaging_image_observation_id_id_78ed9659_like', 'imaging_image', 'observation_id_id'),
+]
+
+TO_BINARY = (
+    [KSUID_SQL_FUNCTIONS]
+    + [f'DROP INDEX IF EXISTS {name}' for name, _, _ in LIKE_INDEXES]
+    + [ksuid_to_binary_sql(table, column, PREFIX) for table, column in COLUMNS]
+    + ['DROP FUNCTION pg_temp.ksuid_to_bytes(text)', 'DROP FUNCTION pg_temp.ksuid_to_text(bytea)']
+)
+
+TO_TEXT = (
+    [KSUID_SQL_FUNCTIONS]
+    + [ksuid_to_text_sql(table, column, PREFIX) for table, column in COLUMNS]
+    + [f'CREATE INDEX {name} ON {table} ({column} varchar_pattern_ops)' for name, table, column in LIKE_INDEXES]
+    + ['DROP FUNCTION pg_temp.ksuid_to_bytes(text)', 'DROP FUNCTION pg_temp.ksuid_to_text(bytea)']
+)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('data_storage', '0008_observation_partitions'),
+        ('imaging', '0002_image_observation_no_constraint'),
+    ]
+
+    operations = [
+        # Django's AlterField would rebuild the (db_id, date_time) primary key of the partitioned table
+        migrations.SeparateDatabaseAndState(
+            database_operations=[
+                migrations.RunSQL(TO_BINARY, TO_TEXT),
+            ],
+            state_operations=[
+                migrations.AlterField(
+                    model_name='observation',
+                    name='db_id',
+                    field=config.custom_fields.BinaryCharIDField(default=ksuid.ksuid.Ksuid, editable=False, help_text='ksuid formatter for this entity, stored as 20 bytes.', max_length=50, prefix='observation_', primary_key=True, serialize=False, unique=True),
+                ),
+            ],
+        ),
+    ]
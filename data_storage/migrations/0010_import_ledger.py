@@ -0,0 +1,43 @@
+# Generated by Django 5.1 on 2026-10-18 15:50
+
+import charidfield.fields
+import django.db.models.deletion
+import django.utils.timezone
+import ksuid.ksuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('data_storage', '0009_observation_binary_id'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImportSource',
+            fields=[
+                ('name', models.CharField(max_length=255, primary_key=True, serialize=False)),
+                ('digest', models.CharField(max_length=64)),
+                ('hasher', models.CharField(max_length=100)),
+                ('buckets', models.BinaryField(default=bytes)),
+                ('rows', models.IntegerField(default=0)),
+                ('modified', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ImportRow',
+            fields=[
+                ('db_id', charidfield.fields.CharIDField(default=ksuid.ksuid.Ksuid, editable=False, help_text='ksuid formatter for this entity.', max_length=50, prefix='importRow_', primary_key=True, serialize=False, unique=True)),
+                ('key', models.CharField(max_length=255)),
+                ('bucket', models.IntegerField()),
+                ('digest', models.BigIntegerField()),
+                ('object_id', models.CharField(max_length=255)),
+                ('source_id', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='data_storage.importsource')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['source_id', 'bucket'], name='import_row_source_bucket_idx')],
+                'constraints': [models.UniqueConstraint(fields=('source_id', 'key'), name='import_row_source_key')],
+            },
+        ),
+    ]
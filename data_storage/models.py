@@ -3,16 +3,19 @@ Data Storage Models
 """
 
 # Standard imports
+import hashlib
+import math
 from datetime import date
 
 # Django imports
 from django.contrib.auth.models import User
-from django.db import models
-from django.db.models.signals import post_save
-from django.dispatch import receiver
+from django.db import models, transaction
+from django.db.models import F, Value
+from django.db.models.functions import Concat, Substr
 from django.urls import reverse
 from django.core.validators import RegexValidator, MaxValueValidator, MinValueValidator, validate_image_file_extension
 from django.core.exceptions import ValidationError
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 from django.utils.html import format_html
 
@@ -21,7 +24,9 @@ from phonenumber_field.modelfields import PhoneNumberField
 
 # App imports
 from config.enumerations import AttributeDomainType, PlotType, TreatmentType, LocationType, GermplasmType, YearEnum
-from config.custom_fields import KsuidField
+from config.enumerations import ScaleDataType, NUMERIC_SCALE_TYPES
+from config.custom_fields import KsuidField, BinaryKsuidField
+from ontology.registry import get_ontology
 
 """ Trial Models """
 class Trial(models.Model):
@@ -250,11 +255,83 @@ class Plot(models.Model):
         null=True,
         blank=True
     )
+    # Materialized path of db_ids from the top level plot down to this one, '/<main>/<split>/.../<self>/'
+    path = models.CharField(max_length=1024, editable=False, default='')
 
     class Meta:
         constraints = [
             models.UniqueConstraint(fields=['trial_id', 'label'], name='plot_trial_unique_constraint')
         ]
+        indexes = [
+            models.Index(fields=['trial_id', 'block'], name='plot_trial_block_idx'),
+            models.Index(fields=['trial_id', 'type'], name='plot_trial_type_idx'),
+            # Pattern ops so path__startswith subtree lookups are index range scans
+            models.Index(fields=['path'], name='plot_path_idx', opclasses=['varchar_pattern_ops'])
+        ]
+
+    @property
+    def ancestor_ids(self):
+        """ db_ids of the plots above this one, top level plot first """
+        return self.path.strip('/').split('/')[:-1]
+
+    @property
+    def root_id(self):
+        """ db_id of the top level (main) plot owning this plot """
+        return self.path.strip('/').split('/')[0]
+
+    @property
+    def depth(self):
+        return self.path.count('/') - 2
+
+    def get_ancestors(self):
+        """ Plots above this one, in one primary key lookup """
+        return Plot.objects.filter(db_id__in=self.ancestor_ids)
+
+    def get_descendants(self, include_self=False):
+        """ Every plot nested under this one, at any depth, in one index range scan """
+        descendants = Plot.objects.filter(path__startswith=self.path)
+        if not include_self:
+            descendants = descendants.exclude(db_id=self.db_id)
+        return descendants
+
+    def build_path(self, _seen=None):
+        """
+        Materialized path of this plot under its current parent. A parent without a path, e.g. one
+        bulk created, has its own path built first instead of this plot being rooted at ''.
+        """
+        parent = self.parent_plot_id
+        if parent is None:
+            return f"/{self.db_id}/"
+        if parent.path:
+            return parent.path + f"{self.db_id}/"
+
+        seen = (_seen or set()) | {self.db_id}
+        if parent.db_id in seen:
+            raise ValidationError({'parent_plot_id': _("A plot cannot be nested under itself or one of its own subplots.")})
+        return parent.build_path(seen) + f"{self.db_id}/"
+
+    def clean(self):
+        super().clean()
+
+        parent = self.parent_plot_id
+        if parent is not None and self.path and parent.path.startswith(self.path):
+            raise ValidationError({'parent_plot_id': _("A plot cannot be nested under itself or one of its own subplots.")})
+
+    def save(self, *args, **kwargs):
+        old_path = self.path
+        self.path = self.build_path()
+        if old_path and old_path != self.path and self.path.startswith(old_path):
+            raise ValidationError({'parent_plot_id': _("A plot cannot be nested under itself or one of its own subplots.")})
+        if kwargs.get('update_fields') is not None:
+            kwargs['update_fields'] = {*kwargs['update_fields'], 'path'}
+
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            if old_path and old_path != self.path:
+                # Moved, re-root the whole subtree in one statement
+                Plot.objects.filter(path__startswith=old_path).exclude(db_id=self.db_id).update(
+                    path=Concat(Value(self.path), Substr('path', len(old_path) + 1))
+                )
 
     def __str__(self):
         return f"{self.trial_id.name} - {self.label} "
@@ -286,6 +363,9 @@ class PlotCrop(models.Model):
         constraints = [
             models.UniqueConstraint(fields=['plot_id', 'germplasm_id', 'plot_year'], name='plot_crop_composite_key')
         ]
+        indexes = [
+            models.Index(fields=['plot_year', 'germplasm_id'], name='plot_crop_year_germplasm_idx')
+        ]
 
     def __str__(self):
         return f"{self.plot_id.label} - {self.plot_year} - {self.germplasm_id.name}"
@@ -300,6 +380,11 @@ class PlotTreatment(models.Model):
     plot_crop_id = models.ForeignKey(PlotCrop, on_delete=models.CASCADE, blank=False, null=False)
     treatment_level_id = models.ForeignKey(TreatmentLevel, on_delete=models.CASCADE, blank=False, null=False)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['treatment_level_id', 'plot_crop_id'], name='plot_treatment_level_idx')
+        ]
+
     def __str__(self):
         return f"{self.plot_crop_id.plot_id.label} - {self.plot_crop_id.plot_year}: {self.treatment_level_id.level}"
 
@@ -311,29 +396,238 @@ class Observation(models.Model):
     FK2 on PlotCrop
     FK3 on Variable
     """
-    db_id = KsuidField(primary_key=True, editable=False, prefix='observation_')
+    db_id = BinaryKsuidField(primary_key=True, editable=False, prefix='observation_')
     date_time = models.DateTimeField(blank=False, null=False)
     observer_id = models.ForeignKey('resources.Person', on_delete=models.CASCADE, blank=False, null=False)
-    plot_crop_id = models.ForeignKey(PlotCrop, on_delete=models.CASCADE, blank=False, null=False)
-    variable_id = models.ForeignKey('ontology.Variable', to_field='label', on_delete=models.CASCADE)
+    # Both FKs lead the composite indexes below, so their own single column indexes are dropped
+    plot_crop_id = models.ForeignKey(PlotCrop, on_delete=models.CASCADE, blank=False, null=False, db_index=False)
+    variable_id = models.ForeignKey('ontology.Variable', to_field='label', on_delete=models.CASCADE, db_index=False)
     value = models.CharField(max_length=255, null=False)
+    # Typed copies of value, filled on write from the variable's scale data type
+    value_num = models.FloatField(blank=True, null=True, editable=False)
+    value_date = models.DateField(blank=True, null=True, editable=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['variable_id', 'value_num'], name='observation_value_num_idx'),
+            models.Index(fields=['variable_id', 'value_date'], name='observation_value_date_idx'),
+            # Covering indexes for the hot time series reads, value_num is carried so numeric reads are index only.
+            # Measured with `manage.py benchmark_observations`
+            models.Index(
+                fields=['plot_crop_id', 'variable_id', 'date_time'], include=['value_num'],
+                name='observation_crop_var_date_idx'
+            ),
+            models.Index(fields=['variable_id', 'date_time'], include=['value_num'], name='observation_var_date_idx')
+        ]
+
+    @staticmethod
+    def parse_value(value, data_type):
+        """ Return the (value_num, value_date) pair for a raw value of the given scale data type """
+        if data_type in NUMERIC_SCALE_TYPES:
+            try:
+                number = float(value)
+            except (TypeError, ValueError):
+                return None, None
+            return (number if math.isfinite(number) else None), None
+        if data_type == ScaleDataType.DATE:
+            try:
+                return None, date.fromisoformat(str(value)[:10])
+            except ValueError:
+                return None, None
+        return None, None
+
+    def get_variable(self):
+        """ The observation's variable with its scale, from the ontology registry when it knows the label """
+        return get_ontology().variables_by_label.get(self.variable_id_id) or self.variable_id
+
+    def fill_typed_value(self):
+        """ Fill value_num / value_date from value """
+        self.value_num, self.value_date = self.parse_value(self.value, self.get_variable().scale_id.data_type)
 
     def clean(self):
         super().clean()
 
-        variable = self.variable_id
+        variable = self.get_variable()
+        self.fill_typed_value()
+
+        if variable.scale_id.data_type in NUMERIC_SCALE_TYPES and self.value_num is None:
+            raise ValidationError({'value': _(f"The observation value must be numeric for the variable {variable}")})
+        if variable.scale_id.data_type == ScaleDataType.DATE and self.value_date is None:
+            raise ValidationError({'value': _(f"The observation value must be an ISO date (YYYY-MM-DD) for the variable {variable}")})
 
-        if variable.min_value:
-            if self.value < variable.min_value:
+        if variable.min_value is not None and self.value_num is not None:
+            if self.value_num < variable.min_value:
                 raise ValidationError(
                     {'value': _(f"The observation value cannot be less than the variable {variable}'s minimum allowed value ({variable.min_value})")}
                 )
-        if variable.max_value:
-            if self.value > variable.max_value:
+        if variable.max_value is not None and self.value_num is not None:
+            if self.value_num > variable.max_value:
                 raise ValidationError(
-                    {'value': _(f"The observation value cannot be less than the variable {variable}'s maximum allowed value ({variable.max_value})")}
+                    {'value': _(f"The observation value cannot be greater than the variable {variable}'s maximum allowed value ({variable.max_value})")}
                 )
 
+    def save(self, *args, **kwargs):
+        self.fill_typed_value()
+        super().save(*args, **kwargs)
+
     def __str__(self):
-        return f"{self.plotId} - {self.variable}: {self.value}"
+        return f"{self.plot_crop_id_id} - {self.variable_id_id}: {self.value}"
 
+""" Summary Models """
+class TrialSummary(models.Model):
+    """
+    Running aggregates of the numeric observation values per trial, year, variable, treatment level and germplasm.
+    Kept up to date incrementally by data_storage.summaries; rebuild with `manage.py rebuild_summaries`.
+    """
+    db_id = KsuidField(primary_key=True, editable=False, prefix='summary_')
+    trial_id = models.ForeignKey(Trial, on_delete=models.CASCADE)
+    year = models.IntegerField()
+    variable_id = models.ForeignKey('ontology.Variable', to_field='label', on_delete=models.CASCADE)
+    # Null for plot crops without any treatment
+    treatment_level_id = models.ForeignKey(TreatmentLevel, on_delete=models.CASCADE, blank=True, null=True)
+    germplasm_id = models.ForeignKey(Germplasm, on_delete=models.CASCADE)
+    n = models.BigIntegerField(default=0)
+    sum_value = models.FloatField(default=0)
+    sum_squares = models.FloatField(default=0)
+    min_value = models.FloatField(blank=True, null=True)
+    max_value = models.FloatField(blank=True, null=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['trial_id', 'year', 'variable_id', 'treatment_level_id', 'germplasm_id'],
+                name='trial_summary_composite_key',
+                nulls_distinct=False
+            )
+        ]
+
+    @property
+    def mean(self):
+        return self.sum_value / self.n if self.n else None
+
+    @property
+    def variance(self):
+        """ Sample variance """
+        if self.n < 2:
+            return None
+        return max(self.sum_squares - self.sum_value ** 2 / self.n, 0) / (self.n - 1)
+
+    @property
+    def std(self):
+        variance = self.variance
+        return math.sqrt(variance) if variance is not None else None
+
+    def __str__(self):
+        return f"{self.trial_id_id} - {self.year} - {self.variable_id_id}: n={self.n}"
+
+""" Change Tracking Models """
+class TableVersion(models.Model):
+    """
+    Per table change counter, bumped whenever a row in the table is saved or deleted.
+    Used to build cheap ETags and cache keys without touching the tracked tables.
+    """
+    table = models.CharField(max_length=100, primary_key=True)
+    version = models.BigIntegerField(default=0)
+    modified = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"{self.table}: {self.version}"
+
+TRACKED_APPS = ['data_storage', 'resources', 'ontology', 'imaging']
+
+def bump_table_version(model):
+    """ Increment the change counter of a model's table """
+    table = model._meta.label_lower
+    updated = TableVersion.objects.filter(table=table).update(version=F('version') + 1, modified=timezone.now())
+    if not updated:
+        TableVersion.objects.get_or_create(table=table, defaults={'version': 1})
+
+def get_table_versions(*models):
+    """ Return a {table: (version, modified)} dict for the given models """
+    tables = [model._meta.label_lower for model in models]
+    return {
+        table: (version, modified)
+        for table, version, modified in TableVersion.objects.filter(table__in=tables).values_list('table', 'version', 'modified')
+    }
+
+def table_versions_key(*models):
+    """ Short hash of the table versions of the given models, for cache keys that change with the data """
+    versions = get_table_versions(*models)
+    return hashlib.md5(repr(sorted(versions.items())).encode()).hexdigest()
+
+class TableBump:
+    """ on_commit callback bumping the table version of one model """
+
+    def __init__(self, model):
+        self.model = model
+        self.done = False
+
+    def __call__(self):
+        bump_table_version(self.model)
+        self.done = True
+
+def mark_table_changed(model, using=None):
+    """
+    Bump a model's table version when the current transaction commits, once however many of its rows
+    changed, so a cascade or a bulk save doesn't queue on the counter row once per row.
+    Outside a transaction the bump runs right away.
+    """
+    connection = transaction.get_connection(using)
+    savepoints = set(connection.savepoint_ids)
+    for savepoint_ids, func, _ in connection.run_on_commit:
+        # A bump queued inside a savepoint this change doesn't share could still be rolled back without it
+        if isinstance(func, TableBump) and func.model is model and not func.done and set(savepoint_ids) <= savepoints:
+            return
+    transaction.on_commit(TableBump(model), using=using)
+
+def tracked_models():
+    """ Models of the tracked apps whose changes bump their table version, the counters and the import ledger aside """
+    from django.apps import apps
+
+    return [
+        model for label in TRACKED_APPS for model in apps.get_app_config(label).get_models()
+        if model not in (TableVersion, ImportSource, ImportRow)
+    ]
+
+def track_table_change(sender, using=None, **kwargs):
+    """ Save and delete receiver of the tracked models, connected per model in DataStorageConfig.ready """
+    mark_table_changed(sender, using)
+
+""" Import Ledger Models """
+class ImportSource(models.Model):
+    """
+    A seed or import file applied incrementally. digest covers the whole file, so an unchanged file is
+    skipped without reading it, and buckets packs one int64 digest per key bucket of its rows, so an edited
+    one only compares the rows of the buckets that moved. hasher names the scheme of both, see data_storage.ledger.
+    """
+    name = models.CharField(max_length=255, primary_key=True)
+    digest = models.CharField(max_length=64)
+    hasher = models.CharField(max_length=100)
+    buckets = models.BinaryField(default=bytes)
+    rows = models.IntegerField(default=0)
+    modified = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"{self.name}: {self.rows} rows"
+
+class ImportRow(models.Model):
+    """
+    Content hash of one row of an import source by its row key, and the db_id of the row it was applied to
+    """
+    db_id = KsuidField(primary_key=True, editable=False, prefix='importRow_')
+    source_id = models.ForeignKey(ImportSource, on_delete=models.CASCADE)
+    key = models.CharField(max_length=255)
+    bucket = models.IntegerField()
+    digest = models.BigIntegerField()
+    object_id = models.CharField(max_length=255)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['source_id', 'key'], name='import_row_source_key')
+        ]
+        indexes = [
+            models.Index(fields=['source_id', 'bucket'], name='import_row_source_bucket_idx')
+        ]
+
+    def __str__(self):
+        return f"{self.source_id_id} - {self.key}"
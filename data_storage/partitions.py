@@ -0,0 +1,113 @@
+"""
+Data Storage Observation Partitions
+
+The observation table is range partitioned by date_time year (see migration 0008), one
+data_storage_observation_y<year> partition per season plus a default partition catching anything else.
+These helpers create upcoming partitions ahead of time and detach old seasons for archiving.
+
+Every ingest and import makes sure its seasons have partitions, so the years known to have one are
+cached per process and only unknown years reach the catalog. A partition detached by another process
+stays known here, its season's new rows then land in the default partition, which takes any date.
+"""
+
+# Standard imports
+from datetime import date
+
+# Django imports
+from django.db import connection, transaction
+
+# App imports
+from .models import Observation
+
+TABLE = Observation._meta.db_table
+DEFAULT_PARTITION = f'{TABLE}_default'
+
+# Years this process has seen a partition of
+_known_years = set()
+
+def partition_name(year):
+    return f'{TABLE}_y{year}'
+
+def year_bounds(year):
+    """ Partition bounds of a season, in UTC """
+    return f'{year}-01-01 00:00:00+00', f'{year + 1}-01-01 00:00:00+00'
+
+def is_partitioned():
+    with connection.cursor() as cursor:
+        # to_regclass is null instead of an error when the table doesn't exist, e.g. migrated back to zero
+        cursor.execute('SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(%s)', [TABLE])
+        return cursor.fetchone() is not None
+
+def year_partitions():
+    """ Years that currently have their own partition """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT child.relname FROM pg_inherits JOIN pg_class child ON child.oid = pg_inherits.inhrelid '
+            'WHERE pg_inherits.inhparent = to_regclass(%s)',
+            [TABLE]
+        )
+        names = [row[0] for row in cursor.fetchall()]
+
+    prefix = f'{TABLE}_y'
+    return sorted(int(name[len(prefix):]) for name in names if name.startswith(prefix))
+
+def create_year_partition(year):
+    """
+    Create the partition of one season, moving any of its rows out of the default partition first.
+    Returns False when the partition already exists.
+    """
+    if year in year_partitions():
+        return False
+
+    name = partition_name(year)
+    start, end = year_bounds(year)
+    with transaction.atomic(), connection.cursor() as cursor:
+        # Attaching checks that the default partition holds no rows of the new range
+        cursor.execute(f'CREATE TABLE {name} (LIKE {TABLE} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)')
+        cursor.execute(
+            f'WITH moved AS (DELETE FROM {DEFAULT_PARTITION} WHERE date_time >= %s AND date_time < %s RETURNING *) '
+            f'INSERT INTO {name} SELECT * FROM moved',
+            [start, end]
+        )
+        cursor.execute(f'ALTER TABLE {TABLE} ATTACH PARTITION {name} FOR VALUES FROM (%s) TO (%s)', [start, end])
+
+    return True
+
+def forget_partitions():
+    """ Drop the cached partition years, after migrations changed the table under them """
+    _known_years.clear()
+
+def ensure_observation_partitions(years=None, years_ahead=1):
+    """
+    Make sure the given seasons, or this season through years_ahead seasons from now, have partitions.
+    Returns the years that were created.
+    """
+    if years is None:
+        this_year = date.today().year
+        years = range(this_year, this_year + years_ahead + 1)
+
+    missing = set(years) - _known_years
+    if not missing or not is_partitioned():
+        return []
+
+    existing = set(year_partitions())
+    _known_years.update(existing)
+    created = [year for year in sorted(missing - existing) if create_year_partition(year)]
+    # Partitions created in a transaction that is rolled back are gone again, only remember committed ones
+    transaction.on_commit(lambda: _known_years.update(created))
+
+    return created
+
+def detach_year_partition(year):
+    """
+    Detach a season's partition into a standalone table, ready to be archived or dropped on its own.
+    Its observations disappear from Observation queries, rebuild the trial summaries afterwards.
+    """
+    if year not in year_partitions():
+        return False
+
+    with connection.cursor() as cursor:
+        cursor.execute(f'ALTER TABLE {TABLE} DETACH PARTITION {partition_name(year)}')
+    _known_years.discard(year)
+
+    return True
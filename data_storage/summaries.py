@@ -0,0 +1,347 @@
+"""
+Data Storage Trial Summaries
+
+Maintains TrialSummary, the running n / sum / sum of squares / min / max of the numeric
+observation values per trial, year, variable, treatment level and germplasm.
+An observation counts once toward every treatment level of its plot crop.
+Changes to plot crops and plot treatments rebuild the (trial, year, variable) slices they move observations in.
+"""
+
+# Standard imports
+from collections import defaultdict
+
+# Django imports
+from django.db import connection, transaction
+from django.db.models import Count, F, Max, Min, Sum
+
+# App imports
+from .models import PlotCrop, PlotTreatment, Observation, TrialSummary, bump_table_version
+
+def plot_crop_keys(plot_crop_ids):
+    """
+    Return {plot_crop_id: [(trial_id, year, germplasm_id, treatment_level_id), ...]} with one entry
+    per treatment level of the plot crop, or a single None level for untreated plot crops
+    """
+    keys = defaultdict(list)
+    for pk, trial_id, year, germplasm_id, level_id in PlotCrop.objects.filter(pk__in=plot_crop_ids).values_list(
+        'pk', 'plot_id__trial_id', 'plot_year', 'germplasm_id', 'plottreatment__treatment_level_id'
+    ):
+        keys[pk].append((trial_id, year, germplasm_id, level_id))
+    return keys
+
+def summary_values(observations):
+    """
+    Map (plot_crop_id, variable_id, value_num) rows onto summary keys.
+    Yields ((trial_id, year, variable_id, treatment_level_id, germplasm_id), value) pairs.
+    """
+    observations = [row for row in observations if row[2] is not None]
+    if not observations:
+        return
+
+    keys = plot_crop_keys({row[0] for row in observations})
+    for plot_crop_id, variable_id, value in observations:
+        for trial_id, year, germplasm_id, level_id in keys.get(plot_crop_id, []):
+            yield (trial_id, year, variable_id, level_id, germplasm_id), value
+
+def aggregate(pairs):
+    """ Return a {key: (n, sum, sum of squares, min, max)} dict from (key, value) pairs """
+    stats = {}
+    for key, value in pairs:
+        n, total, total_sq, low, high = stats.get(key, (0, 0.0, 0.0, value, value))
+        stats[key] = (n + 1, total + value, total_sq + value * value, min(low, value), max(high, value))
+    return stats
+
+def add_observations(observations):
+    """
+    Fold new (plot_crop_id, variable_id, value_num) rows into the summaries with one upsert
+    """
+    upsert_summaries(aggregate(summary_values(observations)))
+
+STAGED_STATS_SQL = """
+    SELECT plot.trial_id_id, crop.plot_year, staged.variable_id_id, treatment.treatment_level_id_id, crop.germplasm_id_id,
+        count(*), sum(staged.value_num), sum(staged.value_num * staged.value_num), min(staged.value_num), max(staged.value_num)
+    FROM {table} AS staged
+    JOIN data_storage_plotcrop AS crop ON crop.db_id = staged.plot_crop_id_id
+    JOIN data_storage_plot AS plot ON plot.db_id = crop.plot_id_id
+    LEFT JOIN data_storage_plottreatment AS treatment ON treatment.plot_crop_id_id = crop.db_id
+    WHERE staged.value_num IS NOT NULL
+    GROUP BY 1, 2, 3, 4, 5
+"""
+
+def add_staged_observations(table):
+    """
+    Fold the observations of a staging table (plot_crop_id_id, variable_id_id and value_num columns)
+    into the summaries, aggregated in the database so only one row per summary key comes back
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(STAGED_STATS_SQL.format(table=table))
+        upsert_summaries({tuple(row[:5]): tuple(row[5:]) for row in cursor.fetchall()})
+
+def upsert_summaries(stats):
+    """
+    Add a {key: (n, sum, sum of squares, min, max)} dict onto the summary rows, creating missing ones
+    """
+    if not stats:
+        return
+
+    opts = TrialSummary._meta
+    key_columns = [opts.get_field(name).column for name in ('trial_id', 'year', 'variable_id', 'treatment_level_id', 'germplasm_id')]
+    new_id = opts.pk.get_default
+
+    rows = []
+    params = []
+    for key, values in stats.items():
+        rows.append('(%s)' % ', '.join(['%s'] * 11))
+        params.extend([new_id(), *key, *values])
+
+    sql = f"""
+        INSERT INTO {opts.db_table} AS s
+            ({opts.pk.column}, {', '.join(key_columns)}, n, sum_value, sum_squares, min_value, max_value)
+        VALUES {', '.join(rows)}
+        ON CONFLICT ({', '.join(key_columns)}) DO UPDATE SET
+            n = s.n + EXCLUDED.n,
+            sum_value = s.sum_value + EXCLUDED.sum_value,
+            sum_squares = s.sum_squares + EXCLUDED.sum_squares,
+            min_value = LEAST(s.min_value, EXCLUDED.min_value),
+            max_value = GREATEST(s.max_value, EXCLUDED.max_value)
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+    bump_table_version(TrialSummary)
+
+def group_observations(trial_id, year, variable_id, treatment_level_id, germplasm_id):
+    """ Return the numeric observations that make up one summary row """
+    observations = Observation.objects.filter(
+        plot_crop_id__plot_id__trial_id=trial_id,
+        plot_crop_id__plot_year=year,
+        plot_crop_id__germplasm_id=germplasm_id,
+        variable_id=variable_id,
+        value_num__isnull=False
+    )
+    if treatment_level_id is None:
+        return observations.filter(plot_crop_id__plottreatment__isnull=True)
+    return observations.filter(plot_crop_id__plottreatment__treatment_level_id=treatment_level_id)
+
+def remove_observations(observations):
+    """
+    Take (plot_crop_id, variable_id, value_num) rows back out of the summaries.
+    Counts and sums are decremented in place, min and max are only recomputed when a removed value was an extreme.
+    Must run after the rows are gone from (or changed in) the Observation table.
+    """
+    stats = aggregate(summary_values(observations))
+    if not stats:
+        return
+
+    with transaction.atomic():
+        for key, (n, total, total_sq, low, high) in stats.items():
+            trial_id, year, variable_id, treatment_level_id, germplasm_id = key
+            summaries = TrialSummary.objects.filter(
+                trial_id=trial_id, year=year, variable_id=variable_id,
+                treatment_level_id=treatment_level_id, germplasm_id=germplasm_id
+            )
+            summary = summaries.select_for_update().first()
+            if summary is None:
+                continue
+            if summary.n <= n:
+                summary.delete()
+                continue
+
+            updates = {
+                'n': F('n') - n,
+                'sum_value': F('sum_value') - total,
+                'sum_squares': F('sum_squares') - total_sq
+            }
+            if low <= summary.min_value or high >= summary.max_value:
+                updates.update(group_observations(*key).aggregate(min_value=Min('value_num'), max_value=Max('value_num')))
+            summaries.update(**updates)
+    bump_table_version(TrialSummary)
+
+def refresh_summary(key):
+    """
+    Recompute one summary row from the observations, deleting it when no observations are left
+    """
+    trial_id, year, variable_id, treatment_level_id, germplasm_id = key
+    stats = group_observations(*key).aggregate(
+        n=Count('pk'),
+        sum_value=Sum('value_num'),
+        sum_squares=Sum(F('value_num') * F('value_num')),
+        min_value=Min('value_num'),
+        max_value=Max('value_num')
+    )
+    summaries = TrialSummary.objects.filter(
+        trial_id=trial_id, year=year, variable_id=variable_id,
+        treatment_level_id=treatment_level_id, germplasm_id=germplasm_id
+    )
+    if stats['n']:
+        summaries.update(**stats)
+    else:
+        summaries.delete()
+
+def rebuild_summaries(trial=None, year=None, variables=None):
+    """
+    Recompute the summaries from scratch with one grouped query, for every trial or a single one,
+    optionally narrowed to one year and a set of variables.
+    Returns the number of summary rows written.
+    """
+    observations = Observation.objects.filter(value_num__isnull=False)
+    summaries = TrialSummary.objects.all()
+    if trial is not None:
+        observations = observations.filter(plot_crop_id__plot_id__trial_id=trial)
+        summaries = summaries.filter(trial_id=trial)
+    if year is not None:
+        observations = observations.filter(plot_crop_id__plot_year=year)
+        summaries = summaries.filter(year=year)
+    if variables is not None:
+        observations = observations.filter(variable_id__in=variables)
+        summaries = summaries.filter(variable_id__in=variables)
+
+    groups = observations.values(
+        'variable_id',
+        trial=F('plot_crop_id__plot_id__trial_id'),
+        year=F('plot_crop_id__plot_year'),
+        level=F('plot_crop_id__plottreatment__treatment_level_id'),
+        germplasm=F('plot_crop_id__germplasm_id')
+    ).annotate(
+        count=Count('pk'),
+        total=Sum('value_num'),
+        total_sq=Sum(F('value_num') * F('value_num')),
+        low=Min('value_num'),
+        high=Max('value_num')
+    ).order_by()
+
+    rows = [
+        TrialSummary(
+            trial_id_id=group['trial'], year=group['year'], variable_id_id=group['variable_id'],
+            treatment_level_id_id=group['level'], germplasm_id_id=group['germplasm'],
+            n=group['count'], sum_value=group['total'], sum_squares=group['total_sq'],
+            min_value=group['low'], max_value=group['high']
+        )
+        for group in groups.iterator()
+    ]
+    with transaction.atomic():
+        summaries.delete()
+        TrialSummary.objects.bulk_create(rows, batch_size=5000)
+        bump_table_version(TrialSummary)
+
+    return len(rows)
+
+def summary_slices(**filters):
+    """ Return the (trial_id, year, variable_id) slices the numeric observations matching the filters count in """
+    return set(
+        Observation.objects.filter(value_num__isnull=False, **filters).values_list(
+            'plot_crop_id__plot_id__trial_id', 'plot_crop_id__plot_year', 'variable_id'
+        ).distinct()
+    )
+
+def rebuild_slices(slices):
+    """ Recompute the summary rows of (trial_id, year, variable_id) slices, one grouped query per trial year """
+    variables = defaultdict(set)
+    for trial_id, year, variable_id in slices:
+        variables[trial_id, year].add(variable_id)
+    for (trial_id, year), year_variables in variables.items():
+        rebuild_summaries(trial_id, year, year_variables)
+
+def trial_summaries(trial, year=None, variable=None):
+    """
+    Return the summary rows of a trial, optionally for one year and variable.
+    The filters are a prefix of the composite key, so this is one index range scan.
+    """
+    summaries = TrialSummary.objects.filter(trial_id=trial)
+    if year is not None:
+        summaries = summaries.filter(year=year)
+    if variable is not None:
+        summaries = summaries.filter(variable_id=variable)
+
+    return summaries.select_related('treatment_level_id__treatment_id', 'germplasm_id').order_by(
+        'year', 'variable_id', 'treatment_level_id', 'germplasm_id'
+    )
+
+""" Signal receivers, connected in DataStorageConfig.ready """
+def observation_pre_save(sender, instance, raw=False, **kwargs):
+    """ Remember the stored version of an observation that is about to change """
+    if raw or instance._state.adding:
+        instance._summary_previous = None
+        return
+    instance._summary_previous = Observation.objects.filter(pk=instance.pk).values_list(
+        'plot_crop_id', 'variable_id', 'value_num'
+    ).first()
+
+def observation_post_save(sender, instance, created=False, raw=False, **kwargs):
+    """ Move the observation's value from its old summary row to its new one """
+    if raw:
+        return
+    previous = getattr(instance, '_summary_previous', None)
+    if previous is not None:
+        remove_observations([previous])
+    add_observations([(instance.plot_crop_id_id, instance.variable_id_id, instance.value_num)])
+
+def delete_state(origin):
+    """ Bookkeeping shared by the delete receivers of one delete() call """
+    return origin.__dict__.setdefault(
+        '_summary_delete', {'plot_crops': {}, 'refreshed': set(), 'deleted_plot_crops': set(), 'rebuilt': set()}
+    )
+
+def observation_post_delete(sender, instance, origin=None, **kwargs):
+    """ Take a deleted observation out of its summary rows """
+    row = (instance.plot_crop_id_id, instance.variable_id_id, instance.value_num)
+    if origin is None or origin is instance:
+        remove_observations([row])
+        return
+    if row[2] is None:
+        return
+
+    # Queryset and cascading deletes send their signals once every row is already gone,
+    # so recompute each affected summary row once per delete() call instead of once per observation
+    state = delete_state(origin)
+    if row[0] in state['deleted_plot_crops']:
+        return
+    if row[0] not in state['plot_crops']:
+        state['plot_crops'].update(plot_crop_keys([row[0]]) or {row[0]: []})
+    for trial_id, year, germplasm_id, level_id in state['plot_crops'][row[0]]:
+        key = (trial_id, year, row[1], level_id, germplasm_id)
+        if key not in state['refreshed']:
+            state['refreshed'].add(key)
+            refresh_summary(key)
+            bump_table_version(TrialSummary)
+
+def layout_plot_crop(sender, instance):
+    """ The plot crop a PlotCrop or PlotTreatment row places observations for """
+    return instance.pk if sender is PlotCrop else instance.plot_crop_id_id
+
+def layout_pre_save(sender, instance, raw=False, **kwargs):
+    """ Remember the summary slices of a plot crop or plot treatment as stored, before it changes """
+    instance._summary_slices = set()
+    if raw or instance._state.adding:
+        return
+    if sender is PlotCrop:
+        instance._summary_slices = summary_slices(plot_crop_id=instance.pk)
+    else:
+        instance._summary_slices = summary_slices(plot_crop_id__plottreatment=instance.pk)
+
+def layout_post_save(sender, instance, created=False, raw=False, **kwargs):
+    """ Rebuild the slices a plot crop or plot treatment moved its observations out of and into """
+    if raw or (created and sender is PlotCrop):
+        return
+    slices = getattr(instance, '_summary_slices', set())
+    rebuild_slices(slices | summary_slices(plot_crop_id=layout_plot_crop(sender, instance)))
+
+def layout_pre_delete(sender, instance, origin=None, **kwargs):
+    """ Remember the summary slices of a plot crop or plot treatment while its observations still exist """
+    instance._summary_slices = summary_slices(plot_crop_id=layout_plot_crop(sender, instance))
+    if sender is PlotCrop and origin is not None:
+        delete_state(origin)['deleted_plot_crops'].add(instance.pk)
+
+def layout_post_delete(sender, instance, origin=None, **kwargs):
+    """ Rebuild the slices of a deleted plot crop or plot treatment, once per delete() call """
+    slices = getattr(instance, '_summary_slices', set())
+    if origin is None:
+        rebuild_slices(slices)
+        return
+
+    # A plot crop is deleted after its observations and treatments, its own receiver rebuilds the final state
+    state = delete_state(origin)
+    if sender is PlotTreatment and instance.plot_crop_id_id in state['deleted_plot_crops']:
+        return
+    slices = slices - state['rebuilt']
+    state['rebuilt'] |= slices
+    rebuild_slices(slices)
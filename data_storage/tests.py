@@ -1,3 +1,367 @@
-from django.test import TestCase
+import io
+import tempfile
+from pathlib import Path
+from datetime import datetime, timezone
+
+import numpy as np
+import polars as pl
+
+from django.core.cache import cache
+from django.test import TestCase, Client, AsyncClient
+
+from resources.models import State, Address, Organization, Person, Project, Location
+from ontology.models import TraitEntity, TraitAttribute, VarTrait, VarMethod, VarScale, Variable
+from .models import Trial, Treatment, TreatmentLevel, CommonName, Germplasm
+from .models import Plot, PlotCrop, PlotTreatment, Observation
+from .benchmarks import run_benchmarks, QUERY_BUDGETS
+from .matrix import phenotype_matrix
+from .analysis import analyze_units, WHOLE_PLOT_ERROR
+from .fieldbook import import_fieldbook, check_fieldbook, scan_fieldbook
+from .exports import EXPORT_FORMATS, observation_frame, iter_observation_frames, iter_encoded
+from .summaries import trial_summaries
 
 # Create your tests here.
+class BenchmarkTests(TestCase):
+    """
+    Query budgets of the benchmark suite, a few runs of every case on the benchmark dataset.
+    Run manage.py run_benchmarks for the timings.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.report = run_benchmarks(iterations=2, populate_iterations=1)
+
+    def test_every_case_has_a_budget(self):
+        self.assertEqual(set(self.report['results']), set(QUERY_BUDGETS))
+
+    def test_query_budgets(self):
+        for name, result in self.report['results'].items():
+            with self.subTest(case=name):
+                self.assertLessEqual(result['queries'], result['budget'], f"{name} ran {result['queries']} queries")
+
+
+class TrialLayoutTestCase(TestCase):
+    """
+    A small trial to build on: two main plots in one block, one with a single plot crop and one with two,
+    a numerical and a text variable, and a treatment with two levels
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        # Run the commit time callbacks, the table version bumps, as if the layout were committed
+        with cls.captureOnCommitCallbacks(execute=True):
+            cls.create_layout()
+
+    @classmethod
+    def create_layout(cls):
+        state = State.objects.create(name='Test State', abbreviation='TS')
+        address = Address.objects.create(
+            name='Test Address', address_line_1='1 Test Rd.', city='Test', state_id=state, postal_code='12345'
+        )
+        org = Organization.objects.create(
+            name='Test Org', abbreviation='TST', address_id=address, ror_id='https://ror.org/0test0000'
+        )
+        cls.person = Person.objects.create(first_name='Test', last_name='Person', middle_initial='T', affiliation_id=org)
+        project = Project.objects.create(name='Test Project', description='Test', funding='Test')
+        location = Location.objects.create(name='test_location', latitude=0, longitude=0, type='trial')
+        cls.trial = Trial.objects.create(
+            name='test_trial', location_id=location, manager_id=cls.person, project_id=project,
+            affiliation_id=org, establishment_year=2024
+        )
+
+        common_name = CommonName.objects.create(name='Test Crop')
+        cls.germplasm = [
+            Germplasm.objects.create(name=f'test_germ_{i}', type='crop', common_name_id=common_name, genus='Zea')
+            for i in range(2)
+        ]
+        cls.treatment = Treatment.objects.create(name='Test Treatment', type='other', description='Test')
+        cls.levels = [TreatmentLevel.objects.create(treatment_id=cls.treatment, level=f'level_{i}') for i in range(2)]
+
+        cls.plots = [
+            Plot.objects.create(
+                trial_id=cls.trial, label=f'p{i}', type='main plot', block='1', width_m=1, length_m=1
+            )
+            for i in range(1, 3)
+        ]
+        cls.plot_crops = [
+            PlotCrop.objects.create(plot_id=cls.plots[0], germplasm_id=cls.germplasm[0], plot_year=2024),
+            PlotCrop.objects.create(plot_id=cls.plots[1], germplasm_id=cls.germplasm[0], plot_year=2024),
+            PlotCrop.objects.create(plot_id=cls.plots[1], germplasm_id=cls.germplasm[1], plot_year=2024),
+        ]
+        for plot_crop, level in zip(cls.plot_crops, [0, 1, 1]):
+            PlotTreatment.objects.create(plot_crop_id=plot_crop, treatment_level_id=cls.levels[level])
+
+        entity = TraitEntity.objects.create(label='test entity')
+        attribute = TraitAttribute.objects.create(label='test attribute')
+        trait = VarTrait.objects.create(label='test trait', entity_id=entity, attribute_id=attribute)
+        method = VarMethod.objects.create(label='test method', description='Test')
+        scales = {
+            data_type: VarScale.objects.create(label=f'test {data_type}', description='Test', data_type=data_type)
+            for data_type in ['numerical', 'text']
+        }
+        cls.height = Variable.objects.create(
+            label='test_height', abbreviation='TH', trait_id=trait, method_id=method,
+            scale_id=scales['numerical'], type='corn'
+        )
+        cls.note = Variable.objects.create(
+            label='test_note', abbreviation='TN', trait_id=trait, method_id=method,
+            scale_id=scales['text'], type='corn'
+        )
+
+    def observe(self, plot_crop, variable, value, day=1):
+        return Observation.objects.create(
+            date_time=datetime(2024, 6, day, tzinfo=timezone.utc), observer_id=self.person,
+            plot_crop_id=plot_crop, variable_id=variable, value=value
+        )
+
+class PhenotypeMatrixTests(TrialLayoutTestCase):
+    """
+    The plot crop x variable pivot and its cache invalidation
+    """
+
+    def setUp(self):
+        cache.clear()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.observe(self.plot_crops[0], self.height, '10', day=1)
+            self.observe(self.plot_crops[0], self.height, '14', day=2)
+            self.observe(self.plot_crops[1], self.height, '20')
+            self.observe(self.plot_crops[0], self.note, 'lodged', day=1)
+            self.observe(self.plot_crops[0], self.note, 'upright', day=2)
+
+    def rows(self, matrix):
+        return {row['plot_crop_id']: row for row in matrix.iter_rows(named=True)}
+
+    def test_pivot(self):
+        rows = self.rows(phenotype_matrix(self.trial))
+        self.assertEqual(len(rows), 3)
+
+        first, second, third = (rows[plot_crop.db_id] for plot_crop in self.plot_crops)
+        self.assertEqual((first['plot'], first['germplasm'], first['Test Treatment']), ('p1', 'test_germ_0', 'level_0'))
+        self.assertEqual((first['test_height'], first['test_note']), (14.0, 'upright'))
+        self.assertEqual((second['test_height'], second['test_note']), (20.0, None))
+        self.assertEqual((third['germplasm'], third['test_height']), ('test_germ_1', None))
+
+        rows = self.rows(phenotype_matrix(self.trial, aggregate='mean'))
+        self.assertEqual(rows[self.plot_crops[0].db_id]['test_height'], 12.0)
+        self.assertEqual(rows[self.plot_crops[0].db_id]['test_note'], 'upright')
+
+    def test_cache_invalidation(self):
+        phenotype_matrix(self.trial)
+        with self.assertNumQueries(1):
+            phenotype_matrix(self.trial)
+
+        # Table versions move when the transaction commits
+        with self.captureOnCommitCallbacks(execute=True):
+            self.observe(self.plot_crops[2], self.height, '30')
+        self.assertEqual(self.rows(phenotype_matrix(self.trial))[self.plot_crops[2].db_id]['test_height'], 30.0)
+
+        # Renames change no observation or plot row, only the names the matrix shows
+        with self.captureOnCommitCallbacks(execute=True):
+            self.germplasm[0].name = 'renamed_germ'
+            self.germplasm[0].save()
+        self.assertEqual(self.rows(phenotype_matrix(self.trial))[self.plot_crops[0].db_id]['germplasm'], 'renamed_germ')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.levels[0].level = 'renamed_level'
+            self.levels[0].save()
+        self.assertEqual(
+            self.rows(phenotype_matrix(self.trial))[self.plot_crops[0].db_id]['Test Treatment'], 'renamed_level'
+        )
+
+class ObservationExportTests(TrialLayoutTestCase):
+    """
+    Streamed exports, read back in every format
+    """
+
+    def setUp(self):
+        for day in range(1, 6):
+            self.observe(self.plot_crops[day % 3], self.height, str(day), day=day)
+
+    def read(self, data, file_format, schema):
+        if file_format == 'parquet':
+            return pl.read_parquet(io.BytesIO(data))
+        if file_format == 'arrow':
+            return pl.read_ipc(io.BytesIO(data))
+        return pl.read_csv(io.BytesIO(data), schema=schema)
+
+    def test_chunked_encoding(self):
+        expected = observation_frame(self.trial)
+        for file_format in EXPORT_FORMATS:
+            with self.subTest(file_format=file_format):
+                chunks = list(iter_encoded(iter_observation_frames(self.trial, chunk_size=2), file_format))
+                self.assertGreater(len(chunks), 2)
+                self.assertTrue(self.read(b''.join(chunks), file_format, expected.schema).equals(expected))
+
+                # No rows still gives a readable file with the columns
+                empty = observation_frame(self.trial, year=2020)
+                data = b''.join(iter_encoded(iter_observation_frames(self.trial, year=2020), file_format))
+                self.assertTrue(self.read(data, file_format, empty.schema).equals(empty))
+
+    def test_streamed_response(self):
+        self.trial.name = 'trial "a"; b'
+        self.trial.save()
+
+        response = Client().get(f'/api/trials/{self.trial.db_id}/observations/export', {'fileFormat': 'arrow'})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="trial \\"a\\"; b.arrow"')
+        self.assertEqual(self.read(b''.join(response.streaming_content), 'arrow', None).height, 5)
+
+    async def test_async_streamed_response(self):
+        response = await AsyncClient().get(f'/api/async/trials/{self.trial.db_id}/observations/export', {'fileFormat': 'parquet'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.read(b''.join([chunk async for chunk in response.streaming_content]), 'parquet', None).height, 5)
+
+class TrialSummaryTests(TrialLayoutTestCase):
+    """
+    Summary rows kept current as observations move between treatment levels
+    """
+
+    def setUp(self):
+        self.observe(self.plot_crops[0], self.height, '10', day=1)
+        self.observe(self.plot_crops[0], self.height, '14', day=2)
+        self.observe(self.plot_crops[1], self.height, '20')
+
+    def summaries(self):
+        return {
+            (summary.treatment_level_id_id, summary.germplasm_id_id): (summary.n, summary.sum_value, summary.max_value)
+            for summary in trial_summaries(self.trial, 2024, self.height)
+        }
+
+    def test_plot_treatment_changes(self):
+        germplasm = self.germplasm[0].db_id
+        self.assertEqual(self.summaries(), {
+            (self.levels[0].db_id, germplasm): (2, 24.0, 14.0),
+            (self.levels[1].db_id, germplasm): (1, 20.0, 20.0)
+        })
+
+        plot_treatment = PlotTreatment.objects.get(plot_crop_id=self.plot_crops[0])
+        plot_treatment.treatment_level_id = self.levels[1]
+        plot_treatment.save()
+        self.assertEqual(self.summaries(), {(self.levels[1].db_id, germplasm): (3, 44.0, 20.0)})
+
+        plot_treatment.delete()
+        self.assertEqual(self.summaries(), {
+            (None, germplasm): (2, 24.0, 14.0),
+            (self.levels[1].db_id, germplasm): (1, 20.0, 20.0)
+        })
+
+        # Cascades delete the observations and treatments before the plot crop
+        self.plots[1].delete()
+        self.assertEqual(self.summaries(), {(None, germplasm): (2, 24.0, 14.0)})
+
+class AnalysisTests(TestCase):
+    """
+    ANOVA edge cases of analyze_units
+    """
+
+    def test_single_main_plot(self):
+        """ Units under one main plot still varying a split factor, no whole plot error can be estimated """
+        for blocks in (['1'] * 6, ['1', '1', '1', '2', '2', '2']):
+            with self.subTest(blocks=blocks):
+                units = [
+                    {'block': block, 'main_plot': 'main', 'levels': {'Rate': f'r{i % 3}'}}
+                    for i, block in enumerate(blocks)
+                ]
+                result = analyze_units(units, ['height'], np.array([[10.0], [12.0], [15.0], [11.0], [12.5], [16.0]]))['height']
+
+                self.assertEqual(result['split_plot_factors'], ['Rate'])
+                sources = [row['source'] for row in result['anova']]
+                self.assertNotIn(WHOLE_PLOT_ERROR, sources)
+                self.assertIn('Rate', sources)
+                self.assertEqual([row['level'] for row in result['lsmeans']['Rate']], ['r0', 'r1', 'r2'])
+
+class FieldBookImportTests(TrialLayoutTestCase):
+    """
+    Field book checks and the COPY + merge import. p1 has one plot crop in 2024, p2 has two.
+    """
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+    def write(self, text):
+        path = Path(self.directory.name) / 'fieldbook.csv'
+        path.write_text(text)
+        return path
+
+    def check(self, text):
+        accepted, rejected = check_fieldbook(scan_fieldbook(self.write(text)), self.trial, self.person.db_id)
+        return accepted, dict(zip(rejected['row'].to_list(), rejected['reason'].to_list()))
+
+    def test_long(self):
+        accepted, rejected = self.check(
+            'plot,variable,value,date_time,germplasm\n'
+            'p1,test_height,10,2024-06-01,\n'
+            'p2,test_height,11,2024-06-01,test_germ_1\n'
+            'p2,TH,12,2024-06-01T08:30:00,TEST GERM 0\n'
+            'p2,test_height,13,2024-06-01,\n'
+            'p1,test_height,14,2024-06-01,unknown\n'
+            'p1,test_height,tall,2024-06-01,\n'
+            'p3,test_note,flat,2024-06-01,\n'
+        )
+        self.assertEqual(accepted['plot_crop_id_id'].to_list(), [self.plot_crops[0].db_id, self.plot_crops[2].db_id, self.plot_crops[1].db_id])
+        self.assertEqual(accepted['value_num'].to_list(), [10.0, 11.0, 12.0])
+        self.assertEqual(rejected, {
+            4: 'The plot has several plot crops that year, add a germplasm column.',
+            5: "Unknown germplasm 'unknown'.",
+            6: 'The observation value must be numeric for this variable.',
+            7: "Unknown plot 'p3'.",
+        })
+
+    def test_blank_cells(self):
+        accepted, rejected = self.check(
+            'plot,variable,value,date_time,observer\n'
+            'p1,test_height,10,2024-06-01,{observer}\n'
+            ',test_height,10,2024-06-01,{observer}\n'
+            'p1,,10,2024-06-01,{observer}\n'
+            'p1,test_height,10,2024-06-01,\n'
+            'p1,test_height,10, ,{observer}\n'
+            'p1,test_height,,2024-06-01,{observer}\n'.format(observer=self.person.db_id)
+        )
+        self.assertEqual(accepted.height, 1)
+        self.assertEqual(rejected, {
+            2: 'Missing plot.',
+            3: 'Missing variable.',
+            4: 'Missing observer.',
+            5: 'Missing date_time.',
+            6: 'Missing value.',
+        })
+
+    def test_wide_without_germplasm(self):
+        accepted, rejected = self.check(
+            'plot,date_time,test_height,TN\n'
+            'p1,2024-06-01,10,lodged\n'
+            'p1,2024-06-02,,upright\n'
+            'p2,2024-06-01,12,\n'
+        )
+        self.assertEqual(
+            sorted(zip(accepted['variable_id_id'].to_list(), accepted['value'].to_list())),
+            [('test_height', '10'), ('test_note', 'lodged'), ('test_note', 'upright')]
+        )
+        self.assertEqual(set(accepted['plot_crop_id_id'].to_list()), {self.plot_crops[0].db_id})
+        self.assertEqual(rejected, {3: 'The plot has several plot crops that year, add a germplasm column.'})
+
+    def test_import(self):
+        rejected_path = Path(self.directory.name) / 'rejected.csv'
+        report = import_fieldbook(self.write(
+            'plot,variable,value,date_time,germplasm\n'
+            'p1,test_height,10,2024-06-01,\n'
+            'p2,test_height,12,2024-06-01,\n'
+            'p2,test_height,11.5,2024-06-01,test_germ_1\n'
+            'p2,test_note,lodged,2024-06-02,test_germ_0\n'
+            'p2,test_height,13,2024-06-01,\n'
+        ), self.trial, self.person.db_id, batch_size=2, rejected_path=rejected_path)
+
+        self.assertEqual((report['rows'], report['created'], report['rejected']), (5, 3, 2))
+        # Row numbers count through the batches, one header for the whole file
+        self.assertEqual(pl.read_csv(rejected_path)['row'].to_list(), [2, 5])
+        observations = {
+            (observation.plot_crop_id_id, observation.variable_id_id): (observation.value, observation.value_num)
+            for observation in Observation.objects.all()
+        }
+        self.assertEqual(observations, {
+            (self.plot_crops[0].db_id, 'test_height'): ('10', 10.0),
+            (self.plot_crops[2].db_id, 'test_height'): ('11.5', 11.5),
+            (self.plot_crops[1].db_id, 'test_note'): ('lodged', None),
+        })
@@ -7,12 +7,15 @@ from django.http import Http404
 from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
 from django.core.mail import send_mail
 from django.views.generic import ListView
+from django.db.models import Q
 
 from .models import Trial, TrialYear, TrialAttribute
 from .models import Treatment, TreatmentLevel, TrialTreatment
 from .models import CommonName, Germplasm, GermplasmAlias
 from .models import Plot, PlotCrop, PlotTreatment
 from .models import Observation
+from .summaries import trial_summaries
+from .analysis import trial_analysis
 
 from .forms import EmailContactForm
 
@@ -57,12 +60,38 @@ def view_data(request):
         {}
     )
 
+def summary_context(request):
+    """
+    Build the template context for the summary dashboards from the ?trial= (name or db_id), ?year= and ?variable= params
+    """
+    context = {'trials': Trial.objects.order_by('name'), 'trial': None, 'summaries': []}
+    trial = request.GET.get('trial')
+    if not trial:
+        return context
+
+    try:
+        context['trial'] = Trial.objects.get(Q(name=trial) | Q(db_id=trial))
+    except Trial.DoesNotExist:
+        raise Http404('No Trial matches the given query.')
+
+    year = request.GET.get('year')
+    if year is not None and not year.isdigit():
+        year = None
+    context['year'] = year
+    context['summaries'] = trial_summaries(context['trial'], year=year, variable=request.GET.get('variable') or None)
+
+    return context
+
 def analyze_data(request):
 
+    context = summary_context(request)
+    if context['trial'] is not None and context['year'] is not None:
+        context['analysis'] = trial_analysis(context['trial'], int(context['year']))
+
     return render(
         request, 
         'data_storage/observations/analyze_data.html',
-        {}
+        context
     )
 
 def graph_data(request):
@@ -70,7 +99,7 @@ def graph_data(request):
     return render(
         request, 
         'data_storage/observations/graph_data.html',
-        {}
+        summary_context(request)
     )
 
 def list_locations(request):
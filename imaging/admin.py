@@ -8,5 +8,8 @@ from .models import Image, ImageOperation
 admin.site.register(AwsModel)
 
 # Image Models
-admin.site.register(Image)
+@admin.register(Image)
+class ImageAdmin(admin.ModelAdmin):
+    list_select_related = ['observation_id']
+
 admin.site.register(ImageOperation)
\ No newline at end of file
@@ -51,12 +51,16 @@ class Image(models.Model):
     )
     creation_date_time = models.DateTimeField(blank=False, null=False)
     storage_url = models.URLField(blank=False, null=False)
-    observation_id = models.ForeignKey('data_storage.Observation', on_delete=models.SET_NULL, null=True, blank=False)
+    # The observation table is partitioned by year, so db_id alone is not a database level key.
+    # SET_NULL is still applied by the ORM on delete.
+    observation_id = models.ForeignKey(
+        'data_storage.Observation', on_delete=models.SET_NULL, null=True, blank=False, db_constraint=False
+    )
 
     def __str__(self):
         if self.observation_id:
-            observation = self.observation_id
-            return f"{self.filename} - {self.creation_date_time} - {self.observation_id.variable_id.label}"
+            # The foreign key holds the variable label, no need to load the variable
+            return f"{self.filename} - {self.creation_date_time} - {self.observation_id.variable_id_id}"
         else:
             return f"{self.filename} - {self.creation_date_time} - No observations linked"
 
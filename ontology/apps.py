@@ -1,6 +1,14 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_save, post_delete
 
 
 class OntologyConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'ontology'
+
+    def ready(self):
+        from .registry import ONTOLOGY_MODELS, invalidate_ontology
+
+        for model in ONTOLOGY_MODELS:
+            post_save.connect(invalidate_ontology, sender=model)
+            post_delete.connect(invalidate_ontology, sender=model)
@@ -0,0 +1,18 @@
+# Generated by Django 5.1 on 2026-10-18 15:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ontology', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='varscale',
+            name='data_type',
+            field=models.CharField(choices=[('numerical', 'Numerical'), ('ordinal', 'Ordinal'), ('nominal', 'Nominal'), ('date', 'Date'), ('text', 'Text')], default='text', max_length=50),
+        ),
+    ]
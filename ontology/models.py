@@ -6,7 +6,7 @@ from django.db import models
 from django.utils.html import format_html
 
 # App imports
-from config.enumerations import VariableType
+from config.enumerations import VariableType, ScaleDataType
 from config.custom_fields import KsuidField
 
 
@@ -69,6 +69,7 @@ class VarScale(models.Model):
     db_id = KsuidField(primary_key=True, editable=False, prefix='varScale_')
     label = models.CharField(max_length=255, unique=True, blank=False, null=False)
     description = models.TextField(max_length=500)
+    data_type = models.CharField(max_length=50, choices=ScaleDataType, default=ScaleDataType.TEXT)
     external_ontology_reference = models.URLField(null=True, blank=True)
     
     def __str__(self):
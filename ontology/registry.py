@@ -0,0 +1,58 @@
+"""
+Ontology Registry
+
+Process local, in memory copy of the ontology tables. The ontology changes maybe once a month,
+so observation validation, ingest and rendering read it from here instead of the database.
+Kept in a config.versioned_cache.VersionedCache, invalidated on save through the signal receivers
+connected in OntologyConfig.ready.
+"""
+
+# App imports
+from config.versioned_cache import VersionedCache
+from .models import TraitEntity, TraitAttribute, VarTrait, VarMethod, VarScale, Variable
+
+ONTOLOGY_MODELS = [TraitEntity, TraitAttribute, VarTrait, VarMethod, VarScale, Variable]
+
+class OntologyRegistry:
+    """
+    Snapshot of the ontology, every term indexed by db_id and label, variables also by abbreviation
+    """
+
+    def __init__(self, version=None):
+        self.version = version
+
+        self.entities = {entity.db_id: entity for entity in TraitEntity.objects.all()}
+        self.attributes = {attribute.db_id: attribute for attribute in TraitAttribute.objects.all()}
+        self.methods = {method.db_id: method for method in VarMethod.objects.all()}
+        self.scales = {scale.db_id: scale for scale in VarScale.objects.all()}
+        self.traits = {trait.db_id: trait for trait in VarTrait.objects.all()}
+        self.variables = {variable.db_id: variable for variable in Variable.objects.all()}
+
+        # Wire the related objects together so walking variable.scale_id etc. never queries
+        for trait in self.traits.values():
+            trait.entity_id = self.entities[trait.entity_id_id]
+            trait.attribute_id = self.attributes[trait.attribute_id_id]
+        for variable in self.variables.values():
+            variable.trait_id = self.traits[variable.trait_id_id]
+            variable.method_id = self.methods[variable.method_id_id]
+            variable.scale_id = self.scales[variable.scale_id_id]
+
+        self.variables_by_label = {variable.label: variable for variable in self.variables.values()}
+        self.variables_by_abbreviation = {variable.abbreviation: variable for variable in self.variables.values()}
+        self.traits_by_label = {trait.label: trait for trait in self.traits.values()}
+        self.methods_by_label = {method.label: method for method in self.methods.values()}
+        self.scales_by_label = {scale.label: scale for scale in self.scales.values()}
+
+    def variable(self, key):
+        """ Look a variable up by label, abbreviation or db_id, None when it is unknown """
+        return self.variables_by_label.get(key) or self.variables_by_abbreviation.get(key) or self.variables.get(key)
+
+_registry = VersionedCache(OntologyRegistry, *ONTOLOGY_MODELS)
+
+def get_ontology():
+    """ The process's ontology registry, reloaded once the ontology tables changed """
+    return _registry.get()
+
+def invalidate_ontology(**kwargs):
+    """ Drop the process's registry, connected to the save and delete signals of the ontology models """
+    _registry.invalidate()